@@ -6,10 +6,16 @@ When using threading mode, background tasks use standard Python threading.Thread
 for proper async handling with Flask-SocketIO.
 """
 
+import os
 import time
-from app import socketio, app
+from datetime import datetime
+from app import socketio, app, db
 import logging
 
+from app.BackgroundThreads.scheduler import LeasedScheduler
+from app.utils import emit_bus
+from app.utils.emit_coalescer import EmitCoalescer
+
 from classes.BalanceSheet.index import BalanceSheet
 from classes.Bank.index import Bank
 from classes.Player.index import Player
@@ -22,7 +28,7 @@ from classes.GameState.index import GameState
 logger = logging.getLogger(__name__)
 
 
-def _emit_to_room(socketio_instance, event, data, room, namespace=None):
+def _send_to_room(socketio_instance, event, data, room, namespace=None):
     """
     Safely emit a socket event to a room, with error handling.
 
@@ -34,18 +40,24 @@ def _emit_to_room(socketio_instance, event, data, room, namespace=None):
         namespace: Optional namespace
     """
     try:
-        # Check if room exists and has connected clients
-        # Note: This works with threading mode for Flask-SocketIO
+        # Goes through the emit bus when one is configured, so the client gets
+        # it whichever worker it is connected to
         socketio_instance.emit(
             event, data, room=room, namespace=namespace, callback=None
         )
+        emit_bus.record("emitted")
         logger.info(
             f"Emitted '{event}' to room '{room}' for user '{data.get('username', 'unknown')}'"
         )
     except Exception as e:
+        emit_bus.record("failed")
         logger.error(f"Failed to emit '{event}' to room '{room}': {str(e)}")
+        if emit_bus.SOCKETIO_MESSAGE_QUEUE:
+            # The bus itself failed; a broadcast would fail the same way
+            return
         # Still try to emit without room (broadcast) as fallback if room doesn't exist
         try:
+            emit_bus.record("broadcast_fallbacks")
             socketio_instance.emit(
                 event,
                 {
@@ -58,6 +70,101 @@ def _emit_to_room(socketio_instance, event, data, room, namespace=None):
             logger.error(f"Failed to broadcast '{event}': {str(broadcast_error)}")
 
 
+# Repeated state pushes to a room within EMIT_COALESCE_WINDOW_MS are merged
+# into one carrying the latest payload.
+emit_coalescer = EmitCoalescer(_send_to_room)
+
+
+def _emit_to_room(socketio_instance, event, data, room, namespace=None):
+    """
+    Emit a socket event to a room through the coalescer; same arguments as
+    _send_to_room.
+    """
+    emit_coalescer.emit(socketio_instance, event, data, room, namespace=namespace)
+
+
+def process_apply_and_hire(job_instance, player_instance):
+    """
+    Check the player's qualifications, hire them and emit
+    job_application_complete. Needs an application context.
+
+    Raises:
+        ValueError: The player does not meet the job's requirements.
+    """
+    # Check if the player meets the job's qualification requirements (if such requirements exist)
+    job_qualifications = getattr(job_instance, "requirements", [])
+    player_qualifications = getattr(player_instance, "qualifications", [])
+    balancesheet = BalanceSheet(player=player_instance)
+    player_instance.balancesheet = balancesheet
+
+    # Only check qualifications if there are job requirements specified
+    if job_qualifications:
+        logger.info(f"Job qualifications: {job_qualifications}")
+        # Each required qualification must be in the player's qualifications list
+        missing_qualifications = [
+            q
+            for q in job_qualifications
+            if q not in player_qualifications and q not in ["None", None]
+        ]
+        if missing_qualifications:
+            raise ValueError(
+                f"Player '{player_instance.username}' does not meet the following qualification requirements for this job: {missing_qualifications}"
+            )
+
+    job_instance.hire(player_instance)
+
+    logger.info(
+        f"[DEBUG] Player balancesheet after applyJob -- {balancesheet.to_dict()}"
+    )
+
+    # Emit success event to the player's room
+    _emit_to_room(
+        socketio,
+        "job_application_complete",
+        {
+            "username": player_instance.username,
+            "job_id": str(job_instance._id),
+            "message": f"Job application process for '{job_instance.title}' at '{job_instance.company}' complete.",
+            "payload": {
+                "job": job_instance.to_dict(),
+                "time_slots": player_instance.time_slots,
+                "balancesheet": balancesheet.to_dict(),
+            },
+        },
+        room=player_instance.username,
+    )
+
+
+def apply_and_hire_failed(job_instance, player_instance, error):
+    """Withdraw the player's application and emit the failed job_application_complete."""
+    logger.error(
+        f"Error processing job application for {player_instance.username}: {str(error)}"
+    )
+    # Remove the current player's application from the list if present
+    try:
+        job_instance.applications = [
+            a
+            for a in job_instance.applications
+            if a.get("username") != player_instance.username
+        ]
+        job_instance.save_to_db()
+    except Exception as save_error:
+        logger.error(f"Failed to clean up job application: {str(save_error)}")
+
+    # Emit error event to the player's room
+    _emit_to_room(
+        socketio,
+        "job_application_complete",
+        {
+            "username": player_instance.username,
+            "job_id": str(job_instance._id),
+            "error": str(error),
+            "success": False,
+        },
+        room=player_instance.username,
+    )
+
+
 def async_apply_and_hire(job_instance, player_instance):
     """
     Background task to process job application and hiring.
@@ -73,75 +180,58 @@ def async_apply_and_hire(job_instance, player_instance):
     # Ensure we have Flask application context for database operations
     with app.app_context():
         try:
-            # Check if the player meets the job's qualification requirements (if such requirements exist)
-            job_qualifications = getattr(job_instance, "requirements", [])
-            player_qualifications = getattr(player_instance, "qualifications", [])
-            balancesheet = BalanceSheet(player=player_instance)
-            player_instance.balancesheet = balancesheet
-
-            # Only check qualifications if there are job requirements specified
-            if job_qualifications:
-                logger.info(f"Job qualifications: {job_qualifications}")
-                # Each required qualification must be in the player's qualifications list
-                missing_qualifications = [
-                    q
-                    for q in job_qualifications
-                    if q not in player_qualifications and q not in ["None", None]
-                ]
-                if missing_qualifications:
-                    raise ValueError(
-                        f"Player '{player_instance.username}' does not meet the following qualification requirements for this job: {missing_qualifications}"
-                    )
+            process_apply_and_hire(job_instance, player_instance)
+        except Exception as e:
+            apply_and_hire_failed(job_instance, player_instance, e)
 
-            job_instance.hire(player_instance)
 
-            logger.info(
-                f"[DEBUG] Player balancesheet after applyJob -- {balancesheet.to_dict()}"
-            )
+def process_payment(bank: "Bank", player: "Player", amount, recipient, late_payment, operation_id=None):
+    """
+    Make the payment and emit payment_complete. Needs an application context.
 
-            # Emit success event to the player's room
-            _emit_to_room(
-                socketio,
-                "job_application_complete",
-                {
-                    "username": player_instance.username,
-                    "job_id": str(job_instance._id),
-                    "message": f"Job application process for '{job_instance.title}' at '{job_instance.company}' complete.",
-                    "payload": {
-                        "job": job_instance.to_dict(),
-                        "time_slots": player_instance.time_slots,
-                        "balancesheet": balancesheet.to_dict(),
-                    },
-                },
-                room=player_instance.username,
-            )
-        except Exception as e:
-            logger.error(
-                f"Error processing job application for {player_instance.username}: {str(e)}"
-            )
-            # Remove the current player's application from the list if present
-            try:
-                job_instance.applications = [
-                    a
-                    for a in job_instance.applications
-                    if a.get("username") != player_instance.username
-                ]
-                job_instance.save_to_db()
-            except Exception as save_error:
-                logger.error(f"Failed to clean up job application: {str(save_error)}")
+    Args:
+        operation_id (str): Optional; see Bank.make_payment.
 
-            # Emit error event to the player's room
-            _emit_to_room(
-                socketio,
-                "job_application_complete",
-                {
-                    "username": player_instance.username,
-                    "job_id": str(job_instance._id),
-                    "error": str(e),
-                    "success": False,
-                },
-                room=player_instance.username,
-            )
+    Raises:
+        ValueError: Business errors such as insufficient funds.
+    """
+    logger.info(
+        f"[DEBUG] Starting background payment: player={player.username}, amount={amount}, recipient={recipient}"
+    )
+    bank.make_payment(amount, recipient, late_payment, operation_id=operation_id)
+    bs = BalanceSheet(player=player)
+
+    # Emit success event to the player's room
+    _emit_to_room(
+        socketio,
+        "payment_complete",
+        {
+            "username": player.username,
+            "message": f"Payment of {amount} to {recipient} completed successfully",
+            "payload": {
+                "balancesheet": bs.to_dict(),
+                "bank": bank.to_dict(),
+            },
+        },
+        room=player.username,
+    )
+    logger.info(f"Payment completed successfully for {player.username}")
+
+
+def payment_failed(player: "Player", error):
+    """Emit the failed payment_complete of a business error (e.g., insufficient funds)."""
+    logger.warning(f"Payment failed for {player.username}: {str(error)}")
+    _emit_to_room(
+        socketio,
+        "payment_complete",
+        {
+            "username": player.username,
+            "error": str(error),
+            "success": False,
+            "message": f"Payment failed: {str(error)}",
+        },
+        room=player.username,
+    )
 
 
 def bg_payment(bank: "Bank", player: "Player", amount, recipient, late_payment):
@@ -158,43 +248,10 @@ def bg_payment(bank: "Bank", player: "Player", amount, recipient, late_payment):
     # Ensure we have Flask application context for database operations
     with app.app_context():
         try:
-            logger.info(
-                f"[DEBUG] Starting background payment: player={player.username}, amount={amount}, recipient={recipient}"
-            )
-            bank.make_payment(amount, recipient, late_payment)
-            bank.save_bank_data()
-            bs = BalanceSheet(player=player)
-
-            # Emit success event to the player's room
-            _emit_to_room(
-                socketio,
-                "payment_complete",
-                {
-                    "username": player.username,
-                    "message": f"Payment of {amount} to {recipient} completed successfully",
-                    "payload": {
-                        "balancesheet": bs.to_dict(),
-                        "bank": bank.to_dict(),
-                    },
-                },
-                room=player.username,
-            )
-            logger.info(f"Payment completed successfully for {player.username}")
-
+            process_payment(bank, player, amount, recipient, late_payment)
         except ValueError as e:
             # Business logic errors (e.g., insufficient funds)
-            logger.warning(f"Payment failed for {player.username}: {str(e)}")
-            _emit_to_room(
-                socketio,
-                "payment_complete",
-                {
-                    "username": player.username,
-                    "error": str(e),
-                    "success": False,
-                    "message": f"Payment failed: {str(e)}",
-                },
-                room=player.username,
-            )
+            payment_failed(player, e)
         except Exception as e:
             # Unexpected errors
             logger.error(
@@ -214,6 +271,51 @@ def bg_payment(bank: "Bank", player: "Player", amount, recipient, late_payment):
             )
 
 
+def process_update_liability(bs: "BalanceSheet", username, updates, player):
+    """
+    Update the liabilities and emit liabilities_offset_complete. Needs an
+    application context; raises on failure.
+    """
+    logger.info(f"Updating liabilities for {username}")
+    result = bs.update_liability_in_db(username=username, updates=updates)
+
+    # Refresh balancesheet in-memory after db update
+    player.balancesheet = result
+    # Avoid triggering another balancesheet save that could overwrite with stale data
+    player.save_to_db(skip_balancesheet=True)
+
+    # Emit success event to the player's room
+    _emit_to_room(
+        socketio,
+        "liabilities_offset_complete",
+        {
+            "username": player.username,
+            "message": "Liabilities updated successfully",
+            "payload": {"balancesheet": player.to_dict().get("balancesheet")},
+        },
+        room=player.username,
+    )
+    logger.info(f"Liabilities updated successfully for {username}")
+
+
+def update_liability_failed(username, player, error):
+    """Emit the failed liabilities_offset_complete."""
+    logger.error(
+        f"Error updating liabilities for {username}: {str(error)}", exc_info=True
+    )
+    _emit_to_room(
+        socketio,
+        "liabilities_offset_complete",
+        {
+            "username": player.username,
+            "error": str(error),
+            "success": False,
+            "message": "Failed to update liabilities",
+        },
+        room=player.username,
+    )
+
+
 def bg_update_liability(bs: "BalanceSheet", username, updates, player):
     """
     Background task to update liabilities in the balance sheet.
@@ -228,81 +330,57 @@ def bg_update_liability(bs: "BalanceSheet", username, updates, player):
     # Ensure we have Flask application context for database operations
     with app.app_context():
         try:
-            logger.info(f"Updating liabilities for {username}")
-            result = bs.update_liability_in_db(username=username, updates=updates)
-
-            # Refresh balancesheet in-memory after db update
-            player.balancesheet = result
-            # Avoid triggering another balancesheet save that could overwrite with stale data
-            player.save_to_db(skip_balancesheet=True)
+            process_update_liability(bs, username, updates, player)
+        except Exception as e:
+            update_liability_failed(username, player, e)
 
-            # Emit success event to the player's room
-            _emit_to_room(
-                socketio,
-                "liabilities_offset_complete",
-                {
-                    "username": player.username,
-                    "message": "Liabilities updated successfully",
-                    "payload": {"balancesheet": player.to_dict().get("balancesheet")},
-                },
-                room=player.username,
-            )
-            logger.info(f"Liabilities updated successfully for {username}")
 
-        except Exception as e:
-            logger.error(
-                f"Error updating liabilities for {username}: {str(e)}", exc_info=True
-            )
-            _emit_to_room(
-                socketio,
-                "liabilities_offset_complete",
-                {
-                    "username": player.username,
-                    "error": str(e),
-                    "success": False,
-                    "message": "Failed to update liabilities",
-                },
-                room=player.username,
-            )
+def process_update_asset(bs: "BalanceSheet", username, updates, player):
+    """
+    Update the assets and emit assets_update_complete. Needs an application
+    context; raises on failure.
+    """
+    bs.update_assets_in_db(username=username, updates=updates)
+    player.balancesheet = bs
+    player.save_to_db(skip_balancesheet=True)
+
+    _emit_to_room(
+        socketio,
+        "assets_update_complete",
+        {
+            "username": player.username,
+            "message": "Assets updated successfully",
+            "payload": {"balancesheet": player.to_dict().get("balancesheet")},
+        },
+        room=player.username,
+    )
+
+
+def update_asset_failed(username, player, error):
+    """Emit the failed assets_update_complete."""
+    logging.exception("Error updating assets for user %s: %s", username, str(error))
+
+    _emit_to_room(
+        socketio,
+        "assets_update_complete",
+        {
+            "username": player.username,
+            "error": str(error),
+            "success": False,
+            "message": "Failed to update assets",
+        },
+        room=player.username,
+    )
 
 
 # Use threading.Thread for background asset update (for consistency with liabilities)
 def bg_update_asset(bs:"BalanceSheet", username, updates, player):
     with app.app_context():
         try:
-            bs.update_assets_in_db(username=username, updates=updates)
-            player.balancesheet = bs
-            player.save_to_db(skip_balancesheet=True)
-
-
-            _emit_to_room(
-                socketio,
-                "assets_update_complete",
-                {
-                    "username": player.username,
-                    "message": "Assets updated successfully",
-                    "payload": {"balancesheet": player.to_dict().get("balancesheet")},
-                },
-                room=player.username,
-            )
+            process_update_asset(bs, username, updates, player)
         except Exception as e:
             # Optionally log or emit failure event
-            logging.exception("Error updating assets for user %s: %s", username, str(e))
-            
-            _emit_to_room(
-                socketio,
-                "assets_update_complete",
-                {
-                    "username": player.username,
-                    "error": str(e),
-                    "success": False,
-                    "message": "Failed to update assets",
-                },
-                room=player.username,
-            )
-            pass
-
-
+            update_asset_failed(username, player, e)
 
 
 def bg_salary_confirmation(bank, player: "Player", amount, proxy, message):
@@ -323,6 +401,44 @@ def bg_salary_confirmation(bank, player: "Player", amount, proxy, message):
             logger.error(f"Error paying salary for {player.username}: {str(e)}")
 
 
+def apply_appreciation_to_properties(player, Property, property_ids, years, update_balancesheet, task_id=None):
+    """
+    Apply appreciation to the given user-owned properties.
+
+    Loading the owned properties raises on failure; a property that fails is
+    logged and skipped. With a ``task_id`` every property is appreciated at
+    most once for that task, so running the task again does not compound it.
+    """
+    print('************************** UPDATING PROPERTY VALUE **************************************')
+    # Fetch all properties owned by the player
+    prop_instance = Property(player)
+    owned_props = prop_instance.load_all_owned_properties()
+    # Build a map for fast lookup
+    owned_props_map = {str(prop.get("id")): prop for prop in owned_props}
+    for pid in property_ids:
+        prop_data = owned_props_map.get(str(pid))
+        if not prop_data:
+            continue  # Skip properties not found
+        target_property = Property(player)
+        target_property.from_dict(prop_data)
+        # Set the property _id properly
+        if prop_data.get("id"):
+            target_property._id = prop_data["id"]
+        else:
+            target_property._id = pid
+        try:
+            if task_id is None:
+                target_property.apply_appreciation(years=years, update_balancesheet=update_balancesheet)
+                target_property.save_to_db()
+            else:
+                target_property.apply_appreciation(years=years, update_balancesheet=False)
+                price = target_property.save_appreciation(task_id)
+                if update_balancesheet:
+                    target_property.update_balancesheet_asset(price)
+        except Exception as e:
+            print(f"Failed to apply appreciation for property id {pid}: {e}")
+
+
 def update_properties_in_background(player, Property, property_ids, years, update_balancesheet):
     """
     Runs in a background thread. Applies appreciation to user-owned properties.
@@ -330,29 +446,7 @@ def update_properties_in_background(player, Property, property_ids, years, updat
     with respect to the Flask process, and use of asyncio here would add unnecessary complexity.
     """
     try:
-        print('************************** UPDATING PROPERTY VALUE **************************************')
-        # Fetch all properties owned by the player
-        prop_instance = Property(player)
-        owned_props = prop_instance.load_all_owned_properties()
-        # Build a map for fast lookup
-        owned_props_map = {str(prop.get("id")): prop for prop in owned_props}
-        for pid in property_ids:
-            prop_data = owned_props_map.get(str(pid))
-            if not prop_data:
-                continue  # Skip properties not found
-            target_property = Property(player)
-            target_property.from_dict(prop_data)
-            # Set the property _id properly
-            if prop_data.get("id"):
-                target_property._id = prop_data["id"]
-            else:
-                target_property._id = pid
-            try:
-                target_property.apply_appreciation(years=years, update_balancesheet=update_balancesheet)
-                target_property.save_to_db()
-            except Exception as e:
-                print(f"Failed to apply appreciation for property id {pid}: {e}")
-
+        apply_appreciation_to_properties(player, Property, property_ids, years, update_balancesheet)
     except Exception as e:
         print(f"Exception in update_properties_in_background: {e}")
 
@@ -405,23 +499,38 @@ def bg_process_lotto_ticket(lotto_ticket: "Lotto", player: "Player", delay_secon
     if wait_seconds > 0:
         logger.info(f"Waiting {wait_seconds} seconds before processing lotto ticket for {player.username}")
         time.sleep(wait_seconds)
-    
+
+    draw_lotto_ticket(lotto_ticket._id, player)
+
+
+def draw_lotto_ticket(ticket_id, player: "Player"):
+    """
+    Draw a pending lotto ticket, pay out any prize and emit the result.
+    Used by the lotto scheduler (and by bg_process_lotto_ticket after its delay).
+
+    Args:
+        ticket_id: MongoDB _id of the ticket
+        player: Player instance who owns the ticket
+
+    Returns:
+        bool: True if the ticket was drawn or was already drawn, False on error.
+    """
     # Ensure we have Flask application context for database operations
     with app.app_context():
         try:
             logger.info(
-                f"Processing lotto ticket for player {player.username}, ticket_id: {lotto_ticket._id}"
+                f"Processing lotto ticket for player {player.username}, ticket_id: {ticket_id}"
             )
             
-            # Reload ticket from DB to ensure we have latest data
-            ticket = Lotto.load_from_db(lotto_ticket._id, player=player)
+            # Claim the ticket, so a second draw of it (another worker, a
+            # retried task) cannot pay the prize again
+            ticket = Lotto.claim_draw(ticket_id, player=player)
             if not ticket:
-                raise ValueError(f"Ticket {lotto_ticket._id} not found")
-            
-            # Check if ticket is ready to be processed
-            if ticket.status != "pending":
-                logger.warning(f"Ticket {ticket._id} is not pending (status: {ticket.status})")
-                return
+                current = Lotto.load_from_db(ticket_id, player=player)
+                if not current:
+                    raise ValueError(f"Ticket {ticket_id} not found")
+                logger.warning(f"Ticket {ticket_id} is not pending (status: {current.status})")
+                return True
             
             # Process the ticket (check winning condition)
             result = ticket.check_winning_condition()
@@ -463,25 +572,129 @@ def bg_process_lotto_ticket(lotto_ticket: "Lotto", player: "Player", delay_secon
                 room=player.username,
             )
             logger.info(f"Lotto ticket processed successfully for {player.username}")
+            return True
             
         except Exception as e:
             logger.error(
                 f"Error processing lotto ticket for {player.username}: {str(e)}",
                 exc_info=True,
             )
+            # Still "drawing" if it failed before the result was saved
+            Lotto.release_draw(ticket_id)
             # Emit error event to the player's room
             _emit_to_room(
                 socketio,
                 "lotto_result_ready",
                 {
                     "username": player.username,
-                    "ticket_id": str(lotto_ticket._id) if lotto_ticket._id else None,
+                    "ticket_id": str(ticket_id) if ticket_id else None,
                     "error": str(e),
                     "success": False,
                     "message": "Failed to process lotto ticket",
                 },
                 room=player.username,
             )
+            return False
+
+
+class LottoScheduler(LeasedScheduler):
+    """
+    Draws lotto tickets when their result_at comes due. One instance per worker;
+    the Mongo lease makes sure only one worker draws. Pending tickets survive
+    worker restarts because they are read back from the lotto collection.
+    """
+
+    name = "lotto-scheduler"
+
+    def process_due(self, now, limit):
+        drawn = 0
+        for ticket in Lotto.load_pending_tickets(limit=limit):
+            player = Player.load_from_db(ticket.username)
+            if not player:
+                logger.error(f"Lotto ticket {ticket._id}: player '{ticket.username}' not found")
+                Lotto.defer_draw(ticket._id, "player not found")
+                continue
+            if draw_lotto_ticket(ticket._id, player):
+                drawn += 1
+            else:
+                # Move it out of the way of the tickets behind it
+                status = Lotto.defer_draw(ticket._id, "draw failed")
+                logger.warning(f"Lotto ticket {ticket._id} draw failed, now {status}")
+        return drawn
+
+    def next_due_at(self):
+        return Lotto.next_pending_result_at()
+
+
+lotto_scheduler = LottoScheduler(
+    db,
+    "lotto-draws",
+    max_sleep=float(os.getenv("LOTTO_SCHEDULER_MAX_SLEEP", 30)),
+    batch_size=int(os.getenv("LOTTO_SCHEDULER_BATCH_SIZE", 50)),
+)
+
+
+def _update_farm_and_emit(farm: "Farm", currentGameDate):
+    """
+    Run a farm's timers, emit farm_crops_ready / farm_animals_birth for what
+    changed, and save it. Must be called inside an app context.
+
+    Returns:
+        list: Names of the events emitted
+    """
+    events_emitted = []
+
+    # Store initial state to detect changes
+    initial_ready_plots = len(farm.getReadyPlots())
+    initial_animals_count = len(farm.animals)
+    
+    # Update timers
+    farm.updateTimers(currentGameDate)
+    
+    # Check for changes and emit events
+    ready_plots = farm.getReadyPlots()
+    new_ready_plots = len(ready_plots) - initial_ready_plots
+    
+    if new_ready_plots > 0:
+        # Crops are ready
+        _emit_to_room(
+            socketio,
+            "farm_crops_ready",
+            {
+                "username": farm.username,
+                "farm_id": str(farm._id),
+                "message": f"{new_ready_plots} plot(s) are ready for harvest",
+                "payload": {
+                    "ready_plots": ready_plots,
+                    "farm": farm.toDict(),
+                },
+            },
+            room=farm.username,
+        )
+        events_emitted.append(f"crops_ready_{farm.username}")
+    
+    # Check for new animals (births)
+    new_animals_count = len(farm.animals) - initial_animals_count
+    if new_animals_count > 0:
+        # Animals gave birth
+        _emit_to_room(
+            socketio,
+            "farm_animals_birth",
+            {
+                "username": farm.username,
+                "farm_id": str(farm._id),
+                "message": f"{new_animals_count} new animal(s) were born",
+                "payload": {
+                    "farm": farm.toDict(),
+                },
+            },
+            room=farm.username,
+        )
+        events_emitted.append(f"animals_birth_{farm.username}")
+    
+    # Save updated farm (also moves its nextEventAt / nextGameEventAt)
+    farm.save_to_db()
+    return events_emitted
 
 
 def bg_update_farm_timers(username=None, farm_id=None):
@@ -510,66 +723,14 @@ def bg_update_farm_timers(username=None, farm_id=None):
                 # Update all farms for a user
                 farms_to_update = Farm.load_all_by_username(username)
             else:
-                # Update all farms (use with caution - could be slow)
-                logger.warning("Updating all farms - this may be slow")
-                # For now, skip global update - require username or farm_id
-                return
+                # Global pass: only farms with a due event (see FarmTimerScheduler)
+                farms_to_update = Farm.load_due(datetime.utcnow(), currentGameDate)
             
             events_emitted = []
             
             for farm in farms_to_update:
                 try:
-                    # Store initial state to detect changes
-                    initial_ready_plots = len(farm.getReadyPlots())
-                    initial_animals_count = len(farm.animals)
-                    
-                    # Update timers
-                    farm.updateTimers(currentGameDate)
-                    
-                    # Check for changes and emit events
-                    ready_plots = farm.getReadyPlots()
-                    new_ready_plots = len(ready_plots) - initial_ready_plots
-                    
-                    if new_ready_plots > 0:
-                        # Crops are ready
-                        _emit_to_room(
-                            socketio,
-                            "farm_crops_ready",
-                            {
-                                "username": farm.username,
-                                "farm_id": str(farm._id),
-                                "message": f"{new_ready_plots} plot(s) are ready for harvest",
-                                "payload": {
-                                    "ready_plots": ready_plots,
-                                    "farm": farm.toDict(),
-                                },
-                            },
-                            room=farm.username,
-                        )
-                        events_emitted.append(f"crops_ready_{farm.username}")
-                    
-                    # Check for new animals (births)
-                    new_animals_count = len(farm.animals) - initial_animals_count
-                    if new_animals_count > 0:
-                        # Animals gave birth
-                        _emit_to_room(
-                            socketio,
-                            "farm_animals_birth",
-                            {
-                                "username": farm.username,
-                                "farm_id": str(farm._id),
-                                "message": f"{new_animals_count} new animal(s) were born",
-                                "payload": {
-                                    "farm": farm.toDict(),
-                                },
-                            },
-                            room=farm.username,
-                        )
-                        events_emitted.append(f"animals_birth_{farm.username}")
-                    
-                    # Save updated farm
-                    farm.save_to_db()
-                    
+                    events_emitted.extend(_update_farm_and_emit(farm, currentGameDate))
                 except Exception as farm_error:
                     logger.error(
                         f"Error updating farm {farm._id if farm else 'unknown'}: {str(farm_error)}",
@@ -585,4 +746,57 @@ def bg_update_farm_timers(username=None, farm_id=None):
             logger.error(
                 f"Error in bg_update_farm_timers: {str(e)}",
                 exc_info=True
-            )
\ No newline at end of file
+            )
+
+
+class FarmTimerScheduler(LeasedScheduler):
+    """
+    Updates farms when their next event comes due, instead of waiting for a
+    client to call /update-timers. Farms store their earliest harvest date
+    (nextEventAt, real clock) and earliest gestation end / expiration
+    (nextGameEventAt, game clock); both are indexed, so each pass only touches
+    due farms.
+    """
+
+    name = "farm-timer-scheduler"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Farms loaded during the current drain; each is handled once per drain
+        self._handled_ids = set()
+
+    def begin_drain(self):
+        self._handled_ids = set()
+
+    def process_due(self, now, limit):
+        updated = 0
+        with app.app_context():
+            currentGameDate = GameState.get_instance().get_current_date()
+            for farm in Farm.load_due(now, currentGameDate, limit=limit, exclude_ids=self._handled_ids):
+                self._handled_ids.add(farm._id)
+                try:
+                    _update_farm_and_emit(farm, currentGameDate)
+                except Exception as farm_error:
+                    logger.error(
+                        f"Error updating farm {farm._id}: {str(farm_error)}",
+                        exc_info=True
+                    )
+                    continue
+                if farm.isDue(now, currentGameDate):
+                    # Its next event did not move past now; do not count it so
+                    # the drain stops instead of loading it again
+                    logger.warning(f"Farm {farm._id} is still due after its timer update")
+                    continue
+                updated += 1
+        return updated
+
+    def next_due_at(self):
+        return Farm.next_event_at(GameState.get_instance().get_current_date())
+
+
+farm_timer_scheduler = FarmTimerScheduler(
+    db,
+    "farm-timers",
+    max_sleep=float(os.getenv("FARM_SCHEDULER_MAX_SLEEP", 60)),
+    batch_size=int(os.getenv("FARM_SCHEDULER_BATCH_SIZE", 50)),
+)
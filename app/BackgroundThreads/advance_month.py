@@ -0,0 +1,457 @@
+"""
+Advance one player's month in a single turn.
+
+Salary (/api/gamebank/pay), loan payments (make_payment), property
+appreciation (apply_appreciation) and farm timers (/update-timers) each load
+the Player and BalanceSheet and save them again. advance_month() loads the
+whole player aggregate with one aggregation, applies the monthly effects in
+memory in a fixed order:
+
+1. salary from the game bank (the balancesheet's "Salary: ..." income lines),
+2. the player's month close: one payment on every liability (interest/principal
+   split as in the month close; loans that are paid off go, with their expense
+   lines) plus the other income and expenses,
+3. one month of appreciation on every owned property,
+4. farm timers (crops, pregnancies, expirations) at the game date,
+5. the player's game time moves on by one month,
+
+then writes everything in one transaction and emits one
+``month_advance_complete`` event.
+
+The game time update is the claim on the turn: it only matches the
+elapsedGameMonths value that was loaded, so a second request for the same
+month (a double click, another worker) fails with MonthAlreadyAdvanced instead
+of paying twice.
+
+Salary and month close are settled at most once per calendar period (YYYY-MM,
+UTC), shared with the payroll and the month close jobs: the turn skips
+whichever of them the bank's ``last_payroll`` / ``last_month_close`` markers
+(and the balancesheet's ``last_month_close``) show as done, and sets the
+markers in the same transaction. If a job sets one while the turn is being
+applied, the turn fails with PeriodAlreadySettled (a MonthAlreadyAdvanced).
+"""
+
+import logging
+import os
+from datetime import datetime
+
+from pymongo import InsertOne, ReturnDocument, UpdateOne
+
+from app import db, mongo_client, socketio
+from app.BackgroundThreads import _emit_to_room
+from app.BackgroundThreads.month_close import current_period, salary_total, settle_liabilities
+from app.utils import identity_map
+from app.utils.db_guard import db_call_guard
+from classes.Bank.index import BANK_LOG_TAIL, Bank
+from classes.BalanceSheet.index import BalanceSheet
+from classes.Farm.index import Farm
+from classes.GameBank import shards
+from classes.GameBank.index import GameBank
+from classes.GameState.index import GameState
+from classes.GameTime.index import GameTime
+from classes.Player.index import Player
+from classes.Property.index import Property
+
+logger = logging.getLogger(__name__)
+
+# Multi-document transactions need a replica set (Atlas, or a local
+# single-node replica set). Set to false on a standalone server: the writes
+# then run one after the other without a transaction.
+ADVANCE_MONTH_TRANSACTIONS = os.getenv("ADVANCE_MONTH_TRANSACTIONS", "true").lower() == "true"
+
+GAME_BANK_NAME = "GAME BANK"
+MONTH_IN_YEARS = 1 / 12
+
+
+class MonthAlreadyAdvanced(Exception):
+    """Raised when the player's game time moved on while the turn was being applied."""
+
+
+class PeriodAlreadySettled(MonthAlreadyAdvanced):
+    """Raised when the payroll or the month close settled the period while the turn was being applied."""
+
+
+def _turn_pipeline(username):
+    # Bank documents and properties reference the player by the string form
+    # of its _id (see the player profile pipeline).
+    return [
+        {"$match": {"username": username}},
+        {"$limit": 1},
+        {"$addFields": {"_player_id": {"$toString": "$_id"}}},
+        {"$lookup": {"from": "bank-collection", "localField": "_player_id", "foreignField": "customerId", "as": "_bank"}},
+        {"$lookup": {"from": "balancesheet-collection", "localField": "username", "foreignField": "username", "as": "_balancesheet"}},
+        {"$lookup": {"from": "property-collection", "localField": "_player_id", "foreignField": "player_id", "as": "_properties"}},
+        {"$lookup": {"from": "farms-collection", "localField": "username", "foreignField": "username", "as": "_farms"}},
+        {"$lookup": {"from": "game-time-collection", "localField": "username", "foreignField": "username", "as": "_game_time"}},
+    ]
+
+
+def _first(docs):
+    return docs[0] if docs else None
+
+
+def _load_turn(doc):
+    """Build the domain objects of the turn from the joined document."""
+    username = doc["username"]
+    doc.pop("_player_id", None)
+    bank_doc = _first(doc.pop("_bank", []))
+    bs_doc = _first(doc.pop("_balancesheet", []))
+    property_docs = doc.pop("_properties", [])
+    farm_docs = doc.pop("_farms", [])
+    game_time_doc = _first(doc.pop("_game_time", []))
+
+    if bank_doc is None:
+        raise ValueError(f"Bank account for '{username}' not found.")
+
+    if bs_doc:
+        identity_map.put("balancesheet-collection", bs_doc, ("_id", bs_doc["_id"]), ("username", username))
+        bs = BalanceSheet.from_dict(bs_doc)
+        bs.id = bs_doc["_id"]
+    else:
+        bs = BalanceSheet()
+    player = Player.from_document(doc, bs)
+    bs.player = player
+
+    properties = []
+    for property_doc in property_docs:
+        prop = Property(player)
+        prop.from_dict(property_doc)
+        properties.append(prop)
+
+    farms = []
+    for farm_doc in farm_docs:
+        farm = Farm()
+        farm.load(farm_doc)
+        farm._id = farm_doc.get("_id")
+        farm.username = username
+        farm._mark_loaded(farm_doc)
+        farms.append(farm)
+
+    game_time = GameTime(game_time_doc) if game_time_doc else None
+    last_month_close = bs_doc.get("last_month_close") if bs_doc else None
+    return player, bs, bank_doc, properties, farms, game_time, last_month_close
+
+
+def _next_game_time(username, game_time):
+    advanced = GameTime(game_time.toDict() if game_time else None)
+    advanced.username = username
+    if advanced.month >= 12:
+        advanced.month = 1
+        advanced.year += 1
+    else:
+        advanced.month += 1
+    advanced.week = 1
+    advanced.day = 1
+    advanced.elapsedGameMonths = (advanced.elapsedGameMonths or 0) + 1
+    return advanced
+
+
+def _run_in_transaction(write):
+    if not ADVANCE_MONTH_TRANSACTIONS:
+        return write(None)
+    with mongo_client.start_session() as session:
+        return session.with_transaction(write)
+
+
+def advance_month(username, salary=None, game_date=None):
+    """
+    Apply one month of salary, loan payments, property appreciation and farm
+    timers to a player, persist it in one transaction and emit
+    ``month_advance_complete`` to the player's room.
+
+    Args:
+        username (str): The player.
+        salary (float): Amount the game bank pays; defaults to the total of
+            the balancesheet's "Salary: ..." income lines.
+        game_date (datetime): Date for the farm timers; defaults to the
+            global game date.
+
+    Returns:
+        dict | None: The event payload ("summary", "gameTime", "balancesheet",
+        "bank", "properties", "farms"), or None if the player does not exist.
+
+    Raises:
+        ValueError: No bank account, negative salary, or the game bank cannot
+            pay the salary.
+        MonthAlreadyAdvanced: Another request advanced the month first.
+        PeriodAlreadySettled: The payroll or the month close settled the
+            period first.
+    """
+    with db_call_guard("advance_month", key=username):
+        doc = next(db["users-collection"].aggregate(_turn_pipeline(username)), None)
+        if doc is None:
+            return None
+        player, bs, bank_doc, properties, farms, game_time, last_month_close = _load_turn(doc)
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+        # Salary and the month close happen at most once per calendar period,
+        # whichever of advance_month, the payroll and the month close runs first
+        period = current_period(now)
+        balance = bank_doc.get("balance", 0) or 0
+        closing = last_month_close != period and bank_doc.get("last_month_close") != period
+
+        # 1. Salary
+        if salary is None:
+            salary = salary_total(bs.income)
+        salary = round(float(salary), 2)
+        if salary < 0:
+            raise ValueError("Salary must not be negative.")
+        salary_paid_before = bank_doc.get("last_payroll") == period
+        if salary_paid_before:
+            salary = 0.0
+
+        # 2. Month close: one payment on every liability plus the month's
+        # other income and expenses, as the month close would settle them.
+        # The loans are paid when the bank balance (after the salary and the
+        # other cash flow) covers them, otherwise none and the month counts as
+        # late; no part of it takes the balance below zero.
+        if closing:
+            settled = settle_liabilities(
+                [{"liabilities": bs.liabilities.snapshot(), "expenses": bs.expenses.snapshot()}]
+            )[0]
+            other_income = round(bs.total_income() - salary_total(bs.income), 2)
+            other_expenses = round(bs.total_expenses() - settled["correction"] - settled["paid"], 2)
+        else:
+            settled = {"liabilities": [], "paid_off": set(), "interest": 0.0, "principal": 0.0, "paid": 0.0}
+            other_income = other_expenses = 0.0
+        other = round(other_income - other_expenses, 2)
+        paid = round(settled["paid"], 2)
+        late_payment = paid > balance + salary + other
+        if paid and not late_payment:
+            bs.liabilities = settled["liabilities"]
+            if settled["paid_off"]:
+                bs.expenses = [
+                    item for item in bs.expenses if item.get("name") not in settled["paid_off"]
+                ]
+        else:
+            paid = 0.0
+        floor = -max(balance, 0)
+        if salary + other - paid < floor:
+            late_payment = True
+            other = round(floor - salary + paid, 2)
+
+        # 3. Property appreciation
+        property_ops = []
+        for prop in properties:
+            before = prop.price
+            prop.apply_appreciation(years=MONTH_IN_YEARS, update_balancesheet=False)
+            if prop._id is not None and prop.price != before:
+                property_ops.append(UpdateOne({"_id": prop._id}, {"$set": {"price": prop.price}}))
+                bs.set_asset_value(prop.title, prop.price)
+
+        # 4. Farm timers
+        game_date = game_date or GameState.get_instance().get_current_date()
+        farm_ops, farm_documents = [], []
+        crops_ready = animals_born = 0
+        for farm in farms:
+            ready_before = len(farm.getReadyPlots())
+            animals_before = len(farm.animals)
+            farm.updateTimers(game_date)
+            crops_ready += max(len(farm.getReadyPlots()) - ready_before, 0)
+            animals_born += max(len(farm.animals) - animals_before, 0)
+            data = farm._persisted_view()
+            update = farm._tracked_update(data)
+            if update is None:
+                update = {"$set": data}
+            if update:
+                farm_ops.append(UpdateOne({"_id": farm._id}, update))
+            farm_documents.append((farm, data))
+
+        # 5. Game time
+        advanced = _next_game_time(username, game_time)
+
+        # Bank: one update for the salary, the loan payments and the other
+        # cash flow of the month
+        delta = round(salary + other - paid, 2)
+        entries = []
+        if salary:
+            GameBank()  # creates the game-bank shards on first use
+            entries.append({"type": "deposit", "amount": salary, "from": GAME_BANK_NAME, "message": "Monthly salary"})
+        if paid:
+            entries.append(
+                {
+                    "type": "payment",
+                    "amount": paid,
+                    "to": "Loan payments",
+                    "interest": round(settled["interest"], 2),
+                    "principal": round(settled["principal"], 2),
+                }
+            )
+        if other:
+            entries.append(
+                {
+                    "type": "deposit" if other > 0 else "payment",
+                    "amount": abs(other),
+                    "message": "Monthly income and expenses",
+                    "income": other_income,
+                    "expenses": other_expenses,
+                }
+            )
+        for entry in entries:
+            entry["period"] = period
+        log_entries = [
+            {**{key: {"$literal": value} for key, value in entry.items()}, "date": {"$literal": now}}
+            for entry in entries
+        ]
+        markers = {}
+        if salary:
+            markers["last_payroll"] = period
+        if closing:
+            markers["last_month_close"] = period
+        bank_filter = {"_id": bank_doc["_id"], **{field: {"$ne": period} for field in markers}}
+        bank_update = [
+            {
+                "$set": {
+                    "balance": {"$add": [{"$ifNull": ["$balance", 0]}, delta]},
+                    "late_payments": {"$add": [{"$ifNull": ["$late_payments", 0]}, 1 if late_payment else 0]},
+                    "customer": {"$literal": username},
+                    **{field: {"$literal": value} for field, value in markers.items()},
+                }
+            },
+            {
+                "$set": {
+                    "Banklog": {
+                        "$slice": [
+                            {"$concatArrays": [{"$ifNull": ["$Banklog", []]}, log_entries]},
+                            -BANK_LOG_TAIL,
+                        ]
+                    }
+                }
+            },
+        ]
+
+        new_balancesheet = bs.id is None
+
+        def write(session):
+            if game_time is None:
+                claimed = db["game-time-collection"].update_one(
+                    {"username": username},
+                    {"$setOnInsert": advanced.toDict()},
+                    upsert=True,
+                    session=session,
+                )
+                claimed = claimed.upserted_id is not None
+            else:
+                claimed = db["game-time-collection"].update_one(
+                    {"username": username, "elapsedGameMonths": game_time.elapsedGameMonths},
+                    {"$set": advanced.toDict()},
+                    session=session,
+                ).matched_count == 1
+            if not claimed:
+                raise MonthAlreadyAdvanced(f"The month of '{username}' was already advanced.")
+
+            if closing and not new_balancesheet:
+                settled_now = db["balancesheet-collection"].update_one(
+                    {"_id": bs.id, "last_month_close": {"$ne": period}},
+                    {"$set": {"last_month_close": period}},
+                    session=session,
+                )
+                if settled_now.matched_count == 0:
+                    raise PeriodAlreadySettled(f"The month close {period} of '{username}' already ran.")
+
+            if salary:
+                shards.debit(db["game-bank"], salary, session=session)
+            balance_after = balance + delta
+            if markers or entries or late_payment:
+                updated = db["bank-collection"].find_one_and_update(
+                    bank_filter,
+                    bank_update,
+                    projection={"balance": 1},
+                    return_document=ReturnDocument.AFTER,
+                    session=session,
+                )
+                if updated is None:
+                    if salary and session is None:
+                        shards.credit(db["game-bank"], salary)
+                    raise PeriodAlreadySettled(
+                        f"The salary or month close {period} of '{username}' was already paid."
+                    )
+                balance_after = updated.get("balance", 0)
+
+            # Ledger entries from the balance the update produced
+            ledger_ops = []
+            running = balance_after - delta
+            for entry in entries:
+                entry_delta = entry["amount"] if entry["type"] == "deposit" else -entry["amount"]
+                running += entry_delta
+                ledger_ops.append(
+                    InsertOne(
+                        {
+                            **entry,
+                            "customerId": bank_doc.get("customerId"),
+                            "bankId": bank_doc["_id"],
+                            "customer": username,
+                            "date": now,
+                            "delta": entry_delta,
+                            "balanceAfter": round(running, 2),
+                        }
+                    )
+                )
+            if ledger_ops:
+                db["bank-ledger-collection"].bulk_write(ledger_ops, session=session)
+            if property_ops:
+                db["property-collection"].bulk_write(property_ops, ordered=False, session=session)
+            if farm_ops:
+                db["farms-collection"].bulk_write(farm_ops, ordered=False, session=session)
+            if delta:
+                db["balancesheet-collection"].update_one(
+                    {"username": username, "bank_balance": {"$exists": True}},
+                    {"$inc": {"bank_balance": delta, "net_worth": delta}},
+                    session=session,
+                )
+            bs.bank_balance = balance_after
+            bs.save_to_db(username, session=session)
+            if closing and new_balancesheet:
+                db["balancesheet-collection"].update_one(
+                    {"username": username}, {"$set": {"last_month_close": period}}, session=session
+                )
+            return balance_after
+
+        balance_after = _run_in_transaction(write)
+
+        identity_map.evict("bank-collection")
+        identity_map.evict("balancesheet-collection")
+        for farm, data in farm_documents:
+            farm._mark_persisted(data)
+
+        bank_doc = {
+            **bank_doc,
+            "balance": balance_after,
+            "late_payments": (bank_doc.get("late_payments", 0) or 0) + (1 if late_payment else 0),
+            **markers,
+        }
+        payload = {
+            "summary": {
+                "salary": salary,
+                "salary_paid_before": salary_paid_before,
+                "month_closed": closing,
+                "other_cash_flow": other,
+                "loan_payment": paid,
+                "interest": round(settled["interest"], 2) if paid else 0.0,
+                "principal": round(settled["principal"], 2) if paid else 0.0,
+                "late_payment": late_payment,
+                "paid_off": sorted(settled["paid_off"]) if paid else [],
+                "properties_appreciated": len(property_ops),
+                "crops_ready": crops_ready,
+                "animals_born": animals_born,
+            },
+            "gameTime": advanced.toDict(),
+            "balancesheet": bs.to_dict(),
+            "bank": Bank.from_document(player, bank_doc).to_dict(),
+            "properties": [prop.to_json() for prop in properties],
+            "farms": [farm.toDict() for farm in farms],
+        }
+
+    _emit_to_room(
+        socketio,
+        "month_advance_complete",
+        {
+            "username": username,
+            "message": f"Month advanced to {advanced.year}-{advanced.month:02d}",
+            "payload": payload,
+        },
+        room=username,
+    )
+    logger.info(f"Advanced the month of {username}: {payload['summary']}")
+    return payload
@@ -0,0 +1,121 @@
+"""
+Batch credit rescoring.
+
+Scores are cached per factor on the bank documents and recomputed lazily when
+a player's inputs change (Bank.credit_score_details). After a change to the
+rules (bump CREDIT_RULES_VERSION) every cached score is stale; this job
+refreshes them all up front instead of on each player's next read.
+
+Balancesheets are streamed with one cursor and scored in chunks: one query for
+the chunk's bank documents, one for the snapshots of balancesheets that do not
+carry their snapshot totals yet, and one bulk_write for the changed scores.
+"""
+
+import logging
+import os
+import time
+from itertools import islice
+
+from pymongo import UpdateOne
+
+from classes.BalanceSheet.index import LEGACY_TOTAL_EXPRS, SNAPSHOT_FIELDS
+from classes.Bank.credit_score import factor_inputs, score_factors
+
+logger = logging.getLogger(__name__)
+
+CREDIT_RESCORE_CHUNK_SIZE = int(os.getenv("CREDIT_RESCORE_CHUNK_SIZE", 1000))
+
+
+def _source_pipeline():
+    totals = {
+        field: {"$ifNull": [f"${field}", expr]} for field, expr in LEGACY_TOTAL_EXPRS.items()
+    }
+    return [
+        {"$match": {"username": {"$exists": True}}},
+        {"$project": {"username": 1, "snapshot_totals": 1, "snapshot_deltas": 1, **totals}},
+    ]
+
+
+def _previous_totals(doc, snapshot=None):
+    if doc.get("snapshot_totals") is not None:
+        current, deltas = doc["snapshot_totals"], doc.get("snapshot_deltas") or {}
+    elif snapshot is not None:
+        current, deltas = snapshot, snapshot.get("deltas") or {}
+    else:
+        return None
+    return {
+        field: (current.get(field, 0) or 0) - (deltas.get(field, 0) or 0) for field in SNAPSHOT_FIELDS
+    }
+
+
+def _latest_snapshots(db, usernames):
+    if not usernames:
+        return {}
+    rows = db["balancesheet-snapshots-collection"].aggregate(
+        [
+            {"$match": {"username": {"$in": usernames}}},
+            {"$sort": {"username": 1, "takenAt": -1, "_id": -1}},
+            {"$group": {"_id": "$username", "snapshot": {"$first": "$$ROOT"}}},
+        ]
+    )
+    return {row["_id"]: row["snapshot"] for row in rows}
+
+
+def _rescore_chunk(db, docs, force):
+    usernames = [doc["username"] for doc in docs]
+    banks = {
+        bank["customer"]: bank
+        for bank in db["bank-collection"].find(
+            {"customer": {"$in": usernames}},
+            {"customer": 1, "late_payments": 1, "credit_score": 1},
+        )
+    }
+    snapshots = _latest_snapshots(
+        db, [doc["username"] for doc in docs if doc.get("snapshot_totals") is None]
+    )
+
+    ops, scored = [], 0
+    for doc in docs:
+        bank = banks.get(doc["username"])
+        if bank is None:
+            continue
+        inputs = factor_inputs(
+            bank.get("late_payments", 0),
+            doc,
+            _previous_totals(doc, snapshots.get(doc["username"])),
+        )
+        result, recalculated = score_factors(inputs, bank.get("credit_score"), force=force)
+        scored += 1
+        if recalculated:
+            ops.append(UpdateOne({"_id": bank["_id"]}, {"$set": {"credit_score": result}}))
+    if ops:
+        db["bank-collection"].bulk_write(ops, ordered=False)
+    return {"scored": scored, "updated": len(ops)}
+
+
+def rescore_credit(db, chunk_size=CREDIT_RESCORE_CHUNK_SIZE, force=False):
+    """
+    Refresh the cached credit score of every player with a bank account.
+
+    Args:
+        chunk_size (int): Balancesheets per chunk.
+        force (bool): Recompute every factor, not only outdated ones.
+
+    Returns:
+        dict: {"scored", "updated", "chunks", "seconds"}
+    """
+    started = time.monotonic()
+    summary = {"scored": 0, "updated": 0, "chunks": 0}
+    cursor = db["balancesheet-collection"].aggregate(_source_pipeline(), batchSize=chunk_size)
+    while True:
+        docs = list(islice(cursor, chunk_size))
+        if not docs:
+            break
+        chunk = _rescore_chunk(db, docs, force)
+        summary["scored"] += chunk["scored"]
+        summary["updated"] += chunk["updated"]
+        summary["chunks"] += 1
+        logger.info(f"Credit rescore: {summary['scored']} player(s) scored")
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    logger.info(f"Credit rescore done: {summary}")
+    return summary
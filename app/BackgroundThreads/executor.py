@@ -0,0 +1,210 @@
+"""
+Shared, bounded executor for the ``bg_*`` background tasks.
+
+Routes used to start one daemon ``threading.Thread`` per request, so a burst of
+requests meant a burst of threads (and memory). Tasks now go through a fixed
+pool of worker threads fed by a bounded queue. When the queue is full,
+``submit`` raises ``ExecutorSaturated`` and the route answers 429 instead of
+piling up more work. Per-task-type counters expose queue wait and run time.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BG_EXECUTOR_WORKERS = int(os.getenv("BG_EXECUTOR_WORKERS", 4))
+BG_EXECUTOR_QUEUE_SIZE = int(os.getenv("BG_EXECUTOR_QUEUE_SIZE", 100))
+# How long shutdown waits for queued tasks before giving up.
+BG_EXECUTOR_DRAIN_TIMEOUT = float(os.getenv("BG_EXECUTOR_DRAIN_TIMEOUT", 20))
+
+
+class ExecutorSaturated(Exception):
+    """Raised by submit() when the queue is full or the executor is shutting down."""
+
+
+class _TaskStats:
+    """Counters for one task type. Guarded by the executor's stats lock."""
+
+    __slots__ = (
+        "submitted", "rejected", "completed", "failed", "queued", "running",
+        "wait_seconds", "max_wait_seconds", "run_seconds", "max_run_seconds",
+    )
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+    def to_dict(self):
+        finished = self.completed + self.failed
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "queued": self.queued,
+            "running": self.running,
+            "avg_wait_seconds": round(self.wait_seconds / finished, 6) if finished else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 6),
+            "avg_run_seconds": round(self.run_seconds / finished, 6) if finished else 0.0,
+            "max_run_seconds": round(self.max_run_seconds, 6),
+        }
+
+
+class BackgroundExecutor:
+    """
+    Fixed pool of worker threads with a bounded queue.
+
+    Worker threads are started on the first submit, so importing the app (CLI
+    commands, scripts) does not spawn them.
+    """
+
+    def __init__(self, workers=BG_EXECUTOR_WORKERS, queue_size=BG_EXECUTOR_QUEUE_SIZE, name="bg-executor"):
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.name = name
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+        self._accepting = True
+
+    def _task_stats(self, task_type):
+        stats = self._stats.get(task_type)
+        if stats is None:
+            stats = self._stats[task_type] = _TaskStats()
+        return stats
+
+    def _ensure_workers(self):
+        if self._threads:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.shutdown)
+
+    def submit(self, fn, *args, task_type=None, **kwargs):
+        """
+        Queue ``fn(*args, **kwargs)`` to run on a worker thread.
+
+        Args:
+            fn: The task (usually one of the bg_* functions).
+            task_type (str): Metrics label, defaults to ``fn.__name__``.
+
+        Raises:
+            ExecutorSaturated: The queue is full or the executor is draining.
+        """
+        task_type = task_type or getattr(fn, "__name__", "task")
+        if not self._accepting:
+            with self._stats_lock:
+                self._task_stats(task_type).rejected += 1
+            raise ExecutorSaturated("Background executor is shutting down, try again shortly.")
+
+        self._ensure_workers()
+        # Count before enqueueing so a fast worker never sees queued go negative.
+        with self._stats_lock:
+            stats = self._task_stats(task_type)
+            stats.submitted += 1
+            stats.queued += 1
+        try:
+            self._queue.put_nowait((task_type, fn, args, kwargs, time.monotonic()))
+        except queue.Full:
+            with self._stats_lock:
+                stats.submitted -= 1
+                stats.queued -= 1
+                stats.rejected += 1
+            logger.warning(f"{self.name}: queue full, rejected '{task_type}'")
+            raise ExecutorSaturated("Too many background tasks in progress, try again shortly.")
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            task_type, fn, args, kwargs, enqueued_at = item
+            started = time.monotonic()
+            waited = started - enqueued_at
+            with self._stats_lock:
+                stats = self._task_stats(task_type)
+                stats.queued -= 1
+                stats.running += 1
+                stats.wait_seconds += waited
+                stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+
+            failed = False
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                logger.error(f"{self.name}: task '{task_type}' failed: {e}", exc_info=True)
+            finally:
+                ran = time.monotonic() - started
+                with self._stats_lock:
+                    stats.running -= 1
+                    stats.run_seconds += ran
+                    stats.max_run_seconds = max(stats.max_run_seconds, ran)
+                    if failed:
+                        stats.failed += 1
+                    else:
+                        stats.completed += 1
+                self._queue.task_done()
+
+    def shutdown(self, timeout=BG_EXECUTOR_DRAIN_TIMEOUT):
+        """
+        Stop accepting tasks and wait up to ``timeout`` seconds for the queued
+        and running ones to finish. Safe to call more than once.
+
+        Returns:
+            bool: True if everything finished.
+        """
+        self._accepting = False
+        if not self._threads:
+            return True
+
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._queue.all_tasks_done.wait(remaining)
+            drained = self._queue.unfinished_tasks == 0
+
+        if drained:
+            for _ in self._threads:
+                self._queue.put(None)
+            logger.info(f"{self.name}: drained")
+        else:
+            logger.warning(
+                f"{self.name}: {self._queue.unfinished_tasks} task(s) still pending after {timeout}s drain"
+            )
+        return drained
+
+    def stats(self):
+        """
+        Returns:
+            dict: Pool size, queue depth and per-task-type counters.
+        """
+        with self._stats_lock:
+            per_task = {task_type: stats.to_dict() for task_type, stats in self._stats.items()}
+        return {
+            "workers": self.workers,
+            "started": bool(self._threads),
+            "accepting": self._accepting,
+            "queue_size": self.queue_size,
+            "queue_depth": self._queue.qsize(),
+            "tasks": per_task,
+        }
+
+
+background_executor = BackgroundExecutor()
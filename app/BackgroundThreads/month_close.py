@@ -0,0 +1,617 @@
+"""
+Month close: settle every player's balancesheet for one period in bulk.
+
+For each balancesheet not yet closed for the period the job
+
+- credits total income and debits total expenses (liability payments are
+  expense lines) to the player's bank account, with one ledger entry; the
+  "Salary: ..." income lines are left out, the game bank pays those through
+  the payroll or advance_month (whichever runs first for the period),
+- advances every liability by one payment period, splitting the payment into
+  interest and principal; paid-off liabilities and their expense lines go,
+- records a history snapshot of the new totals (one per player and period).
+
+Like the other debits (require_funds), the close does not overdraw an account:
+when the balance plus the month's other income does not cover the loan
+payments, no loan is paid that month and it counts as a late payment; any
+other shortfall is debited only down to a zero balance, also counted late.
+
+Balancesheets are streamed with one cursor and handled in chunks: the
+liability math for a chunk is a handful of NumPy array operations, and each
+chunk is written with one bulk_write per collection. Every write is guarded by
+a ``last_month_close`` marker (ledger entries by a closeId), so a run that
+stops half way can simply be started again.
+
+A balancesheet is only written if it is still the version that was read
+(``updatedAt``, set by every save); one the player edited while its chunk was
+being settled is read and settled again, up to MONTH_CLOSE_RETRIES times,
+and otherwise left for the next run. The same write records the bank side of
+the close on the balancesheet (``month_close_bank``). The bank updates are
+applied from those records and keep the delta, lateness and balance they
+actually produced (``month_close_*``); ledger entries and the balancesheet's
+bank_balance mirror are written from those read-back values, and only for
+banks this close updated. Records a stopped run left behind are applied
+first when the close is run again.
+"""
+
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app.utils import identity_map
+from app.utils.lease import MongoLease
+from classes.Bank.index import BANK_LOG_TAIL
+from classes.BalanceSheet.amortization import batch_payments, periodic_rates
+from classes.BalanceSheet.index import LEGACY_TOTAL_EXPRS, NET_WORTH_EXPR, SNAPSHOT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+MONTH_CLOSE_CHUNK_SIZE = int(os.getenv("MONTH_CLOSE_CHUNK_SIZE", 1000))
+MONTH_CLOSE_LEASE_TTL = int(os.getenv("MONTH_CLOSE_LEASE_TTL", 300))
+# Times a chunk's balancesheets edited during the close are settled again.
+MONTH_CLOSE_RETRIES = int(os.getenv("MONTH_CLOSE_RETRIES", 3))
+RUNS_COLLECTION = "month-close-runs"
+
+# A liability whose remaining balance falls below this is paid off.
+PAID_OFF_BALANCE = 0.005
+
+# Income lines paid by the game bank (payroll / advance_month), not the close.
+SALARY_PREFIX = "Salary:"
+
+
+class MonthCloseBusy(Exception):
+    """Raised when another worker or host is already running a month close."""
+
+
+def current_period(now=None):
+    return (now or datetime.utcnow()).strftime("%Y-%m")
+
+
+def validate_period(period):
+    """
+    Raises:
+        ValueError: ``period`` is not a YYYY-MM string.
+    """
+    try:
+        datetime.strptime(period, "%Y-%m")
+    except (TypeError, ValueError):
+        raise ValueError("Invalid period, expected YYYY-MM")
+    return period
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def salary_total(income):
+    """Total of the "Salary: ..." lines among the ``income`` line items."""
+    return sum(
+        _number(item.get("amount"))
+        for item in income or []
+        if str(item.get("name", "")).startswith(SALARY_PREFIX)
+    )
+
+
+def _source_pipeline(period):
+    # Only the fields the close needs; documents saved before the totals were
+    # materialized get them computed here.
+    totals = {
+        field: {"$ifNull": [f"${field}", expr]} for field, expr in LEGACY_TOTAL_EXPRS.items()
+    }
+    totals["cashflow"] = {
+        "$ifNull": [
+            "$cashflow",
+            {"$subtract": [totals["total_income"], totals["total_expenses"]]},
+        ]
+    }
+    return [
+        {"$match": {"last_month_close": {"$ne": period}, "username": {"$exists": True}}},
+        {
+            "$project": {
+                "username": 1,
+                "liabilities": 1,
+                "income": 1,
+                "expenses": 1,
+                "snapshot_totals": 1,
+                "updatedAt": 1,
+                **totals,
+            }
+        },
+    ]
+
+
+def _chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def settle_liabilities(docs):
+    """
+    Advance every liability of the chunk by one payment period, vectorized
+    over all liabilities of all players in the chunk.
+
+    Returns:
+        list[dict]: Per document: "liabilities" (new list), "paid_off" (names),
+        "interest", "principal", "paid" (cash paid towards the loans this
+        period) and "correction": cash to add back to the
+        income-minus-expenses figure (the part of an expense line a smaller
+        final payment did not need, minus payments of loans that have no
+        expense line).
+    """
+    results = [
+        {"liabilities": [], "paid_off": set(), "interest": 0.0, "principal": 0.0, "paid": 0.0, "correction": 0.0}
+        for _ in docs
+    ]
+    owners, liabilities, expense_amounts = [], [], []
+    for i, doc in enumerate(docs):
+        expenses = {}
+        for expense in doc.get("expenses") or []:
+            expenses.setdefault(expense.get("name"), _number(expense.get("amount")))
+        for liability in doc.get("liabilities") or []:
+            if _number(liability.get("loanAmount")) > 0:
+                owners.append(i)
+                liabilities.append(liability)
+                expense_amounts.append(expenses.get(liability.get("name"), np.nan))
+            else:
+                results[i]["liabilities"].append(liability)
+    if not liabilities:
+        return results
+
+    balance = np.array([liab["loanAmount"] for liab in liabilities], dtype=float)
+    rates = [_number(liab.get("interestRate")) for liab in liabilities]
+    compounding = [liab.get("compoundingFrequency", "monthly") for liab in liabilities]
+    payment_frequency = [liab.get("paymentFrequency", "monthly") for liab in liabilities]
+
+    # The periodic payment is the liability's expense line; loans without one
+    # pay their amortized payment.
+    payment = np.array(expense_amounts, dtype=float)
+    missing = np.isnan(payment)
+    if missing.any():
+        idx = np.nonzero(missing)[0]
+        computed = batch_payments(
+            balance[idx],
+            np.asarray(rates)[idx],
+            [_number(liabilities[i].get("amortizationTerm", 1)) or 1 for i in idx],
+            [compounding[i] for i in idx],
+            [payment_frequency[i] for i in idx],
+        )["payment"]
+        payment[idx] = computed
+    expense_line = np.where(missing, 0.0, payment)
+
+    interest = balance * periodic_rates(rates, compounding, payment_frequency)
+    principal = np.clip(payment - interest, 0, balance)
+    new_balance = balance - principal
+    paid_off = new_balance <= PAID_OFF_BALANCE
+    paid = principal + np.minimum(interest, payment)
+    # A final payment smaller than the expense line leaves the rest with the
+    # player; a loan without an expense line has not been debited yet.
+    correction = np.where(
+        missing, -paid, np.where(paid_off, np.maximum(expense_line - paid, 0), 0)
+    )
+
+    owner = np.asarray(owners)
+    per_doc = {
+        "interest": np.bincount(owner, weights=interest, minlength=len(docs)),
+        "principal": np.bincount(owner, weights=principal, minlength=len(docs)),
+        "paid": np.bincount(owner, weights=paid, minlength=len(docs)),
+        "correction": np.bincount(owner, weights=correction, minlength=len(docs)),
+    }
+    for k, liability in enumerate(liabilities):
+        result = results[owners[k]]
+        if paid_off[k]:
+            result["paid_off"].add(liability.get("name"))
+            continue
+        updated = dict(liability)
+        updated["loanAmount"] = round(float(new_balance[k]), 2)
+        updated["totalPaymentsMade"] = _number(liability.get("totalPaymentsMade")) + 1
+        updated["totalAmountPaid"] = round(_number(liability.get("totalAmountPaid")) + float(paid[k]), 2)
+        result["liabilities"].append(updated)
+    for i, result in enumerate(results):
+        for field, values in per_doc.items():
+            result[field] = float(values[i])
+    return results
+
+
+def _close_chunk(db, period, docs, now):
+    usernames = [doc["username"] for doc in docs]
+    banks = {
+        bank["customer"]: bank
+        for bank in db["bank-collection"].find(
+            {"customer": {"$in": usernames}},
+            {"customer": 1, "balance": 1},
+        )
+    }
+    settled = settle_liabilities(docs)
+
+    income = np.array([_number(doc.get("total_income")) for doc in docs], dtype=float)
+    salaries = np.array([salary_total(doc.get("income")) for doc in docs], dtype=float)
+    expenses = np.array([_number(doc.get("total_expenses")) for doc in docs], dtype=float)
+    correction = np.array([result["correction"] for result in settled], dtype=float)
+    loan_payments = np.array([result["paid"] for result in settled], dtype=float)
+    # Cash flow of the month apart from the loan payments and the salaries
+    other_expenses = expenses - correction - loan_payments
+    other = income - salaries - other_expenses
+
+    plans = []
+    for i, doc in enumerate(docs):
+        result = settled[i]
+        username = doc["username"]
+        bank = banks.get(username)
+
+        late = False
+        delta = round(float(other[i] - loan_payments[i]), 2)
+        if bank is not None:
+            balance = _number(bank.get("balance"))
+            if result["paid"] and balance + other[i] < result["paid"]:
+                # Not covered: no loan payment this month
+                late = True
+                result = {
+                    "liabilities": list(doc.get("liabilities") or []),
+                    "paid_off": set(),
+                    "interest": 0.0,
+                    "principal": 0.0,
+                    "paid": 0.0,
+                    "correction": 0.0,
+                }
+                delta = round(float(other[i]), 2)
+            floor = -max(balance, 0)
+            if delta < floor:
+                late = True
+                delta = round(floor, 2)
+
+        expense_lines = [
+            expense
+            for expense in doc.get("expenses") or []
+            if expense.get("name") not in result["paid_off"]
+        ]
+        totals = {
+            "total_assets": _number(doc.get("total_assets")),
+            "total_liabilities": sum(
+                _number(liab.get("loanAmount", liab.get("amount", 0))) for liab in result["liabilities"]
+            ),
+            "total_income": float(income[i]),
+            "total_expenses": sum(_number(expense.get("amount")) for expense in expense_lines),
+        }
+        totals["cashflow"] = totals["total_income"] - totals["total_expenses"]
+        previous = doc.get("snapshot_totals") or {}
+        deltas = {
+            field: totals[field] - _number(previous.get(field, doc.get(field)))
+            for field in SNAPSHOT_FIELDS
+            if totals[field] != _number(previous.get(field, doc.get(field)))
+        }
+
+        fields = {
+            "liabilities": {"$literal": result["liabilities"]},
+            "expenses": {"$literal": expense_lines},
+            **{field: {"$literal": value} for field, value in totals.items()},
+            "snapshot_totals": {"$literal": totals},
+            "snapshot_deltas": {"$literal": deltas},
+            "snapshotAt": {"$literal": now},
+            "last_month_close": {"$literal": period},
+            "month_close_period": {"$literal": period},
+            "updatedAt": {"$literal": now},
+        }
+
+        if bank is not None and (delta != 0 or late):
+            entry = {
+                "type": "month_close",
+                "amount": abs(delta),
+                "period": period,
+                "income": round(float(income[i] - salaries[i]), 2),
+                "expenses": round(float(other_expenses[i]) + result["paid"], 2),
+                "late_payment": late,
+                "interest": round(result["interest"], 2),
+                "principal": round(result["principal"], 2),
+                "date": now,
+            }
+            # Applied to the bank once this version of the balancesheet is closed
+            fields["month_close_bank"] = {
+                "$literal": {"period": period, "bankId": bank["_id"], "delta": delta, "late": late, "entry": entry}
+            }
+        plans.append({"doc": doc, "fields": fields, "totals": totals, "deltas": deltas})
+
+    balancesheet_ops = [
+        UpdateOne(
+            # Only the version that was read: a balancesheet the player saved
+            # meanwhile is not overwritten but read and settled again
+            {
+                "_id": plan["doc"]["_id"],
+                "last_month_close": {"$ne": period},
+                "updatedAt": plan["doc"].get("updatedAt"),
+            },
+            [{"$set": plan["fields"]}, {"$set": {"net_worth": NET_WORTH_EXPR}}],
+        )
+        for plan in plans
+    ]
+    db["balancesheet-collection"].bulk_write(balancesheet_ops, ordered=False)
+    identity_map.evict("balancesheet-collection")
+
+    closed, pending, retry = set(), [], []
+    for doc in db["balancesheet-collection"].find(
+        {"_id": {"$in": [doc["_id"] for doc in docs]}},
+        {"last_month_close": 1, "month_close_period": 1, "month_close_bank": 1},
+    ):
+        if doc.get("month_close_period") == period:
+            closed.add(doc["_id"])
+            if doc.get("month_close_bank"):
+                pending.append(doc)
+        elif doc.get("last_month_close") != period:
+            retry.append(doc["_id"])
+
+    # Keyed by period, so running the close again does not add a second one
+    snapshot_ops = [
+        UpdateOne(
+            {"username": plan["doc"]["username"], "period": period},
+            {
+                "$setOnInsert": {
+                    "username": plan["doc"]["username"],
+                    "takenAt": now,
+                    **plan["totals"],
+                    "deltas": plan["deltas"],
+                    "period": period,
+                }
+            },
+            upsert=True,
+        )
+        for plan in plans
+        if plan["doc"]["_id"] in closed
+    ]
+    if snapshot_ops:
+        db["balancesheet-snapshots-collection"].bulk_write(snapshot_ops, ordered=False)
+    banks = _settle_banks(db, period, pending)
+    return {"settled": len(closed), "banks": banks}, retry
+
+
+def _settle_banks(db, period, pending):
+    """
+    Apply the bank side of the close recorded on closed balancesheets
+    (``month_close_bank``), write the ledger entries, move the balancesheets'
+    bank_balance mirrors and clear the records.
+
+    The bank updates go first and record the delta, lateness and balance they
+    actually produced (``month_close_*``); the ledger entries and mirrors are
+    written from those read-back values, and only for banks this close
+    updated (not those advance_month already closed for the period).
+
+    Args:
+        pending (list[dict]): balancesheet documents with month_close_bank.
+
+    Returns:
+        int: Number of banks updated by the close.
+    """
+    if not pending:
+        return 0
+    close_id = f"month-close:{period}"
+    bank_ids = [doc["month_close_bank"]["bankId"] for doc in pending]
+    db["bank-collection"].bulk_write(
+        [_bank_op(doc["month_close_bank"], period) for doc in pending], ordered=False
+    )
+    identity_map.evict("bank-collection")
+    applied = {
+        bank["_id"]: bank
+        for bank in db["bank-collection"].find(
+            {"_id": {"$in": bank_ids}, "month_close_period": period},
+            {
+                "customer": 1,
+                "customerId": 1,
+                "month_close_delta": 1,
+                "month_close_balance_after": 1,
+                "month_close_late": 1,
+            },
+        )
+    }
+
+    ledger_ops, balancesheet_ops = [], []
+    for doc in pending:
+        record = doc["month_close_bank"]
+        bank = applied.get(record["bankId"])
+        delta = 0
+        if bank is not None:
+            delta = round(_number(bank.get("month_close_delta")), 2)
+            ledger_ops.append(
+                UpdateOne(
+                    {"customerId": bank.get("customerId"), "closeId": close_id},
+                    {
+                        "$setOnInsert": {
+                            **record["entry"],
+                            "amount": abs(delta),
+                            "late_payment": bool(bank.get("month_close_late")),
+                            "customerId": bank.get("customerId"),
+                            "bankId": bank["_id"],
+                            "customer": bank.get("customer"),
+                            "closeId": close_id,
+                            "delta": delta,
+                            "balanceAfter": bank.get("month_close_balance_after"),
+                        }
+                    },
+                    upsert=True,
+                )
+            )
+        # Move the balancesheet's mirror of the bank balance along with it;
+        # clearing the record in the same write makes it happen once
+        balancesheet_ops.append(
+            UpdateOne(
+                {"_id": doc["_id"], "month_close_bank": {"$exists": True}},
+                [
+                    {
+                        "$set": {
+                            "bank_balance": {
+                                "$cond": [
+                                    {"$eq": [{"$ifNull": ["$bank_balance", None]}, None]},
+                                    "$bank_balance",
+                                    {"$add": ["$bank_balance", delta]},
+                                ]
+                            }
+                        }
+                    },
+                    {"$set": {"net_worth": NET_WORTH_EXPR}},
+                    {"$project": {"month_close_bank": 0}},
+                ],
+            )
+        )
+
+    # Bank, then ledger, then the records: whichever step a failed run
+    # stopped at, running again skips what is already done (the banks keep
+    # their month_close_* fields, so their ledger entries are still written).
+    if ledger_ops:
+        db["bank-ledger-collection"].bulk_write(ledger_ops, ordered=False)
+    db["balancesheet-collection"].bulk_write(balancesheet_ops, ordered=False)
+    identity_map.evict("balancesheet-collection")
+    return len(applied)
+
+
+def _bank_op(record, period):
+    # Never below zero (or below an already negative balance), even if the
+    # balance dropped since it was read; the delta and lateness actually
+    # applied are kept on the bank for the ledger entry.
+    balance = {"$ifNull": ["$balance", 0]}
+    floor = {"$min": [balance, 0]}
+    wanted = {"$add": [balance, record["delta"]]}
+    new_balance = {"$max": [wanted, floor]}
+    late_expr = {"$or": [record["late"], {"$lt": [wanted, floor]}]}
+    log_entry = {key: {"$literal": value} for key, value in record["entry"].items()}
+    log_entry["amount"] = {"$abs": "$month_close_delta"}
+    log_entry["late_payment"] = "$month_close_late"
+    log_entry["balanceAfter"] = "$balance"
+    return UpdateOne(
+        {"_id": record["bankId"], "last_month_close": {"$ne": period}},
+        [
+            {
+                "$set": {
+                    "balance": new_balance,
+                    "late_payments": {
+                        "$add": [{"$ifNull": ["$late_payments", 0]}, {"$cond": [late_expr, 1, 0]}]
+                    },
+                    "last_month_close": {"$literal": period},
+                    "month_close_period": {"$literal": period},
+                    "month_close_delta": {"$subtract": [new_balance, balance]},
+                    "month_close_late": late_expr,
+                }
+            },
+            {
+                "$set": {
+                    "month_close_balance_after": "$balance",
+                    "Banklog": {
+                        "$slice": [
+                            {"$concatArrays": [{"$ifNull": ["$Banklog", []]}, [log_entry]]},
+                            -BANK_LOG_TAIL,
+                        ]
+                    },
+                }
+            },
+        ],
+    )
+
+
+def _close_documents(db, period, docs):
+    # Settle a chunk; balancesheets edited while it was being settled are
+    # read again and settled from their new version.
+    summary = {"settled": 0, "banks": 0}
+    for attempt in range(MONTH_CLOSE_RETRIES + 1):
+        # Mongo stores datetimes with millisecond precision
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        chunk, retry = _close_chunk(db, period, docs, now)
+        summary["settled"] += chunk["settled"]
+        summary["banks"] += chunk["banks"]
+        if not retry:
+            break
+        if attempt == MONTH_CLOSE_RETRIES:
+            logger.warning(
+                f"Month close {period}: {len(retry)} balancesheet(s) kept changing, left for the next run"
+            )
+            break
+        docs = list(
+            db["balancesheet-collection"].aggregate(
+                [{"$match": {"_id": {"$in": retry}}}] + _source_pipeline(period)
+            )
+        )
+        if not docs:
+            break
+    return summary
+
+
+def run_month_close(db, period=None, chunk_size=MONTH_CLOSE_CHUNK_SIZE):
+    """
+    Close ``period`` (YYYY-MM, default the current UTC month) for every
+    balancesheet that has not been closed for it yet.
+
+    Progress is recorded in the month-close-runs collection under the period.
+    A Mongo lease keeps two workers or hosts from closing at the same time.
+
+    Returns:
+        dict: {"period", "settled", "banks", "chunks", "seconds"}
+
+    Raises:
+        ValueError: Invalid period.
+        MonthCloseBusy: Another run holds the lease.
+    """
+    period = validate_period(period or current_period())
+    lease = MongoLease(db, "month-close", ttl_seconds=MONTH_CLOSE_LEASE_TTL)
+    if not lease.acquire():
+        raise MonthCloseBusy("A month close is already running, try again later.")
+
+    runs = db[RUNS_COLLECTION]
+    started = time.monotonic()
+    summary = {"period": period, "settled": 0, "banks": 0, "chunks": 0}
+    runs.update_one(
+        {"_id": period},
+        {
+            "$set": {"status": "running", "startedAt": datetime.utcnow(), "owner": lease.owner},
+            "$unset": {"error": ""},
+        },
+        upsert=True,
+    )
+    try:
+        # Bank updates a stopped run recorded but did not apply
+        leftover = db["balancesheet-collection"].find(
+            {"month_close_bank.period": period}, {"month_close_bank": 1}
+        )
+        for docs in _chunks(leftover, chunk_size):
+            banks = _settle_banks(db, period, docs)
+            summary["banks"] += banks
+            runs.update_one({"_id": period}, {"$inc": {"banks": banks}})
+        cursor = db["balancesheet-collection"].aggregate(
+            _source_pipeline(period), batchSize=chunk_size
+        )
+        for docs in _chunks(cursor, chunk_size):
+            chunk = _close_documents(db, period, docs)
+            summary["settled"] += chunk["settled"]
+            summary["banks"] += chunk["banks"]
+            summary["chunks"] += 1
+            runs.update_one({"_id": period}, {"$inc": chunk})
+            if not lease.acquire():
+                raise MonthCloseBusy("Month close lease lost, stopping.")
+            logger.info(f"Month close {period}: {summary['settled']} balancesheet(s) settled")
+    except Exception as e:
+        runs.update_one(
+            {"_id": period},
+            {"$set": {"status": "failed", "error": str(e), "finishedAt": datetime.utcnow()}},
+        )
+        logger.error(f"Month close {period} failed: {e}", exc_info=True)
+        raise
+    finally:
+        lease.release()
+
+    summary["seconds"] = round(time.monotonic() - started, 3)
+    runs.update_one(
+        {"_id": period},
+        {"$set": {"status": "done", "finishedAt": datetime.utcnow(), "seconds": summary["seconds"]}},
+    )
+    logger.info(f"Month close {period} done: {summary}")
+    return summary
+
+
+def get_month_close_run(db, period):
+    """The month-close-runs document of a period, or None."""
+    return db[RUNS_COLLECTION].find_one({"_id": validate_period(period)})
@@ -0,0 +1,308 @@
+"""
+Payroll: pay every employed player's salary in one batch.
+
+Salaries used to go out one request at a time through /api/gamebank/pay,
+each constructing a Player, a Bank and rewriting the game-bank document.
+run_payroll() reads every staffed job once, computes all salaries together
+(``rate_per_hour * hours_per_mo`` per job, summed per player) and applies them
+with one bulk_write per collection (ledger, bank, balancesheet) plus one
+game-bank debit per run, then emits ``salary_reciept_complete`` to each paid
+player.
+
+Every write is guarded by a ``last_payroll`` marker (ledger entries by a
+payrollId, game-bank debits by a marker document per payee), so a run that
+stops half way can simply be started again without paying anyone twice.
+advance_month pays the same salary lines and sets the bank's ``last_payroll``
+as well, so a player is paid by whichever of the two runs first for the
+period; the payroll gives the game bank back the salaries it debited for
+them, and the month close leaves the salary lines out.
+
+The bank updates go first and record the balance they produced
+(``payroll_balance_after``); the ledger entries are written from those
+read-back balances, so a concurrent payment cannot make ``balanceAfter``
+wrong.
+"""
+
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import numpy as np
+from pymongo import UpdateOne
+
+from app import socketio
+from app.BackgroundThreads import _emit_to_room
+from app.BackgroundThreads.month_close import current_period, validate_period
+from app.utils import identity_map
+from app.utils.lease import MongoLease
+from classes.Bank.index import BANK_LOG_TAIL
+from classes.GameBank import shards
+from classes.GameBank.index import GameBank
+
+logger = logging.getLogger(__name__)
+
+PAYROLL_LEASE_TTL = int(os.getenv("PAYROLL_LEASE_TTL", 300))
+GAME_BANK_NAME = "GAME BANK"
+
+
+class PayrollBusy(Exception):
+    """Raised when another worker or host is already running the payroll."""
+
+
+def compute_salaries(jobs):
+    """
+    Monthly salary of every staff member of the given jobs.
+
+    Args:
+        jobs (list[dict]): jobs-collection documents with staff,
+            rate_per_hour and hours_per_mo.
+
+    Returns:
+        dict: {username: {"amount", "jobs": [job names]}}
+    """
+    jobs = [job for job in jobs if job.get("staff")]
+    if not jobs:
+        return {}
+    monthly = np.array(
+        [job.get("rate_per_hour") or 0 for job in jobs], dtype=float
+    ) * np.array([job.get("hours_per_mo") or 0 for job in jobs], dtype=float)
+
+    salaries = defaultdict(lambda: {"amount": 0.0, "jobs": []})
+    for job, amount in zip(jobs, monthly.tolist()):
+        if amount <= 0:
+            continue
+        for username in dict.fromkeys(job["staff"]):
+            salary = salaries[username]
+            salary["amount"] += amount
+            salary["jobs"].append(f"{job.get('title')} at {job.get('company')}")
+    return {
+        username: {"amount": round(salary["amount"], 2), "jobs": salary["jobs"]}
+        for username, salary in salaries.items()
+    }
+
+
+def _pay(db, period, salaries, now):
+    payroll_id = f"payroll:{period}"
+    usernames = list(salaries)
+    banks = {
+        bank["customer"]: bank
+        for bank in db["bank-collection"].find(
+            {"customer": {"$in": usernames}},
+            {"customer": 1, "customerId": 1, "last_payroll": 1},
+        )
+    }
+    payable = {
+        username: salary
+        for username, salary in salaries.items()
+        if username in banks and banks[username].get("last_payroll") != period
+    }
+
+    # Debit the game bank for every payee of this run, leaving a marker
+    # ({_id: "payroll:<period>:<username>"}) per debited salary. A payee whose
+    # marker already exists was debited by a run that stopped before paying
+    # them, so running the payroll again neither skips nor repeats the debit.
+    markers = db["game-bank"]
+    claimed = {}
+    for username, salary in payable.items():
+        marker = markers.update_one(
+            {"_id": f"{payroll_id}:{username}"},
+            {
+                "$setOnInsert": {
+                    "payrollId": payroll_id,
+                    "customer": username,
+                    "amount": salary["amount"],
+                    "date": now,
+                }
+            },
+            upsert=True,
+        )
+        if marker.upserted_id is not None:
+            claimed[username] = salary["amount"]
+    if claimed:
+        try:
+            shards.debit(markers, round(sum(claimed.values()), 2))
+        except ValueError:
+            markers.delete_many({"_id": {"$in": [f"{payroll_id}:{username}" for username in claimed]}})
+            raise
+
+    entries, bank_ops = {}, []
+    for username, salary in payable.items():
+        entries[username] = {
+            "type": "deposit",
+            "amount": salary["amount"],
+            "from": GAME_BANK_NAME,
+            "message": "Salary: " + ", ".join(salary["jobs"]),
+            "period": period,
+            "payrollId": payroll_id,
+            "date": now,
+        }
+        log_entry = {key: {"$literal": value} for key, value in entries[username].items()}
+        log_entry["balanceAfter"] = "$balance"
+        bank_ops.append(
+            UpdateOne(
+                {"_id": banks[username]["_id"], "last_payroll": {"$ne": period}},
+                [
+                    {
+                        "$set": {
+                            "balance": {"$add": [{"$ifNull": ["$balance", 0]}, salary["amount"]]},
+                            "last_payroll": {"$literal": period},
+                            "payroll_period": {"$literal": period},
+                        }
+                    },
+                    {
+                        "$set": {
+                            "payroll_balance_after": "$balance",
+                            "Banklog": {
+                                "$slice": [
+                                    {"$concatArrays": [{"$ifNull": ["$Banklog", []]}, [log_entry]]},
+                                    -BANK_LOG_TAIL,
+                                ]
+                            },
+                        }
+                    },
+                ],
+            )
+        )
+    if bank_ops:
+        db["bank-collection"].bulk_write(bank_ops, ordered=False)
+        identity_map.evict("bank-collection")
+
+    # Read back the balances the bank updates produced (a concurrent payment
+    # may have moved them since the first read); this also finds players a
+    # stopped earlier run paid but did not record yet.
+    credited = list(
+        db["bank-collection"].find(
+            {"customer": {"$in": usernames}, "payroll_period": period},
+            {"customer": 1, "customerId": 1, "payroll_balance_after": 1},
+        )
+    )
+    # Give back the salaries of payees advance_month paid meanwhile
+    paid_now = {bank["customer"] for bank in credited}
+    unpaid = [username for username in payable if username not in paid_now]
+    if unpaid:
+        refunded = markers.find({"_id": {"$in": [f"{payroll_id}:{username}" for username in unpaid]}})
+        refunds = {marker["_id"]: marker["amount"] for marker in refunded}
+        if refunds:
+            markers.delete_many({"_id": {"$in": list(refunds)}})
+            shards.credit(markers, round(sum(refunds.values()), 2))
+
+    ledger_ops, balancesheet_ops, paid = [], [], {}
+    for bank in credited:
+        username = bank["customer"]
+        salary = salaries[username]
+        amount = salary["amount"]
+        entry = entries.get(username) or {
+            "type": "deposit",
+            "amount": amount,
+            "from": GAME_BANK_NAME,
+            "message": "Salary: " + ", ".join(salary["jobs"]),
+            "period": period,
+            "payrollId": payroll_id,
+            "date": now,
+        }
+        balance_after = bank.get("payroll_balance_after")
+        ledger_ops.append(
+            UpdateOne(
+                {"customerId": bank.get("customerId"), "payrollId": payroll_id},
+                {
+                    "$setOnInsert": {
+                        **entry,
+                        "customerId": bank.get("customerId"),
+                        "bankId": bank["_id"],
+                        "customer": username,
+                        "delta": amount,
+                        "balanceAfter": balance_after,
+                    }
+                },
+                upsert=True,
+            )
+        )
+        # Move the balancesheet's mirror of the bank balance along with it
+        balancesheet_ops.append(
+            UpdateOne(
+                {"username": username, "bank_balance": {"$exists": True}, "last_payroll": {"$ne": period}},
+                {"$inc": {"bank_balance": amount, "net_worth": amount}, "$set": {"last_payroll": period}},
+            )
+        )
+        if username in payable:
+            paid[username] = {**salary, "balance": balance_after}
+
+    if ledger_ops:
+        db["bank-ledger-collection"].bulk_write(ledger_ops, ordered=False)
+        db["balancesheet-collection"].bulk_write(balancesheet_ops, ordered=False)
+        identity_map.evict("balancesheet-collection")
+    return paid, round(sum(salary["amount"] for salary in paid.values()), 2)
+
+
+def _notify(period, paid):
+    for username, salary in paid.items():
+        try:
+            _emit_to_room(
+                socketio,
+                "salary_reciept_complete",
+                {
+                    "username": username,
+                    "message": f"Salary for {period}: {salary['amount']}",
+                    "payload": {
+                        "period": period,
+                        "amount": salary["amount"],
+                        "jobs": salary["jobs"],
+                        "balance": salary["balance"],
+                    },
+                },
+                room=username,
+            )
+        except Exception as e:
+            logger.error(f"Payroll {period}: could not notify {username}: {e}")
+
+
+def run_payroll(db, period=None, notify=True):
+    """
+    Pay the salaries of ``period`` (YYYY-MM, default the current UTC month)
+    to every staff member of every job.
+
+    Args:
+        notify (bool): Emit salary_reciept_complete to every paid player.
+
+    Returns:
+        dict: {"period", "paid", "total", "skipped", "seconds"}; skipped lists
+        staff without a bank account or already paid for the period.
+
+    Raises:
+        ValueError: Invalid period, or the game bank cannot cover the payroll.
+        PayrollBusy: Another run holds the lease.
+    """
+    period = validate_period(period or current_period())
+    lease = MongoLease(db, "payroll", ttl_seconds=PAYROLL_LEASE_TTL)
+    if not lease.acquire():
+        raise PayrollBusy("A payroll run is already in progress, try again later.")
+
+    started = time.monotonic()
+    try:
+        jobs = db["jobs-collection"].find(
+            {"staff.0": {"$exists": True}},
+            {"title": 1, "company": 1, "staff": 1, "rate_per_hour": 1, "hours_per_mo": 1},
+        )
+        salaries = compute_salaries(list(jobs))
+        GameBank()  # creates the game-bank shards on first use
+        # Mongo stores datetimes with millisecond precision
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        paid, total = _pay(db, period, salaries, now) if salaries else ({}, 0)
+    finally:
+        lease.release()
+
+    if notify:
+        _notify(period, paid)
+
+    summary = {
+        "period": period,
+        "paid": len(paid),
+        "total": total,
+        "skipped": sorted(username for username in salaries if username not in paid),
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    logger.info(f"Payroll {period} done: {summary}")
+    return summary
@@ -0,0 +1,170 @@
+"""
+Single-thread, leader-elected scheduler for due-time background work.
+
+One ``LeasedScheduler`` thread runs per worker process. Only the worker holding
+the Mongo lease does any work; the others just keep trying to take the lease
+over. The leader keeps a heap of upcoming due times (fed by ``schedule()`` from
+request handlers and by ``next_due_at()`` from the database) and sleeps until
+the earliest one, or at most ``max_sleep`` seconds so that items scheduled on
+other workers are still picked up. The heap only decides *when* to wake up;
+what is due is always read back from Mongo, so nothing is lost when a worker is
+recycled.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.utils.lease import MongoLease
+
+logger = logging.getLogger(__name__)
+
+
+class LeasedScheduler:
+    """
+    Base class. Subclasses implement:
+
+    - ``process_due(now, limit)``: handle up to ``limit`` due items, return how
+      many were handled successfully (failures stay due and are retried on the
+      next poll).
+    - ``next_due_at()``: the earliest pending due time in the database, or None.
+
+    A drain calls ``process_due`` again while it keeps returning ``limit``, so
+    an item that is still due after being handled must not be counted (or must
+    not be returned again within the drain), otherwise the drain never ends.
+    ``begin_drain()`` is called once before the passes of each drain.
+    """
+
+    name = "scheduler"
+
+    def __init__(self, db, lease_name, max_sleep=30, batch_size=50, lease_ttl=90):
+        self.max_sleep = max_sleep
+        self.batch_size = batch_size
+        self._lease = MongoLease(db, lease_name, ttl_seconds=lease_ttl)
+        self._lease_checked = 0.0
+        self._last_poll = 0.0
+        self._heap = []
+        self._queued = set()
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_leader(self):
+        return self._lease.held
+
+    def start(self):
+        """Start the scheduler thread (idempotent)."""
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the thread and hand the lease back."""
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._lease.release()
+
+    def schedule(self, due_at, key=None):
+        """
+        Ask to be woken up at ``due_at`` (naive UTC datetime). The item itself
+        must already be persisted; ``key`` is only used to de-duplicate.
+        """
+        if due_at is None:
+            due_at = datetime.utcnow()
+        with self._condition:
+            entry = (due_at, str(key))
+            if entry not in self._queued:
+                self._queued.add(entry)
+                heapq.heappush(self._heap, entry)
+            self._condition.notify()
+
+    def begin_drain(self):
+        pass
+
+    def process_due(self, now, limit):
+        raise NotImplementedError
+
+    def next_due_at(self):
+        raise NotImplementedError
+
+    def _run(self):
+        logger.info(f"{self.name} started")
+        while not self._stopped.is_set():
+            try:
+                if self._ensure_lease():
+                    self._drain()
+            except Exception as e:
+                logger.error(f"{self.name} iteration failed: {e}", exc_info=True)
+            self._wait(self._sleep_seconds() if self._lease.held else self.max_sleep)
+        logger.info(f"{self.name} stopped")
+
+    def _ensure_lease(self):
+        # Renew at a third of the TTL rather than on every wake-up.
+        elapsed = time.monotonic() - self._lease_checked
+        if self._lease.held and elapsed < self._lease.ttl_seconds / 3:
+            return True
+        was_leader = self._lease.held
+        self._lease_checked = time.monotonic()
+        if self._lease.acquire() and not was_leader:
+            # New leader: recover whatever is pending right away.
+            self._last_poll = 0.0
+        return self._lease.held
+
+    def schedule_next_from_db(self):
+        due_at = self.next_due_at()
+        if due_at is None:
+            return
+        # Anything still due right after a drain failed to process; retry it on
+        # the next poll instead of spinning on it.
+        retry_at = datetime.utcnow() + timedelta(seconds=self.max_sleep)
+        if due_at <= datetime.utcnow():
+            due_at = retry_at
+        self.schedule(due_at, key="db")
+
+    def _drain(self):
+        now = datetime.utcnow()
+        popped = False
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                self._queued.discard(heapq.heappop(self._heap))
+                popped = True
+        # Woken early by schedule() with nothing due yet: no need to query.
+        if not popped and time.monotonic() - self._last_poll < self.max_sleep:
+            return
+        self._last_poll = time.monotonic()
+        self.begin_drain()
+        # Process in batches until a short batch says nothing else is due,
+        # renewing the lease in between so a long backlog cannot outlast it;
+        # if another worker took it over meanwhile, leave the rest to it.
+        while not self._stopped.is_set():
+            handled = self.process_due(now, self.batch_size)
+            if handled < self.batch_size:
+                break
+            if not self._ensure_lease():
+                logger.warning(f"{self.name} lost its lease mid-drain, stopping")
+                return
+        self.schedule_next_from_db()
+
+    def _sleep_seconds(self):
+        with self._condition:
+            if not self._heap:
+                return self.max_sleep
+            until_due = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+        return max(0.0, min(until_due, self.max_sleep))
+
+    def _wait(self, seconds):
+        with self._condition:
+            if not self._stopped.is_set():
+                self._condition.wait(timeout=seconds)
@@ -0,0 +1,314 @@
+"""
+Durable, Mongo-backed task queue for background work.
+
+The in-process executor (executor.py) loses whatever is queued or running when
+gunicorn recycles a worker. With TASK_QUEUE_ENABLED=true, dispatch() instead
+stores a task document in the ``task-queue`` collection and returns at once;
+the separate ``worker`` process (worker.py) claims and runs it:
+
+- Claiming sets a lease (``owner`` + ``leaseUntil``). The worker renews the
+  lease while the task runs; if the worker dies, the task becomes visible again
+  TASK_VISIBILITY_TIMEOUT seconds later and another worker picks it up.
+- A failed task is retried with exponential backoff (TASK_RETRY_BACKOFF doubled
+  per attempt, capped at TASK_RETRY_BACKOFF_MAX) up to ``maxAttempts`` times,
+  then marked ``dead`` with its last error.
+- An ``idempotencyKey`` makes enqueueing the same work twice (a retried HTTP
+  request) return the existing task instead of creating a second one.
+
+Tasks run at least once, so handlers must tolerate being run again after a
+crash (they get the task id to key that on). Payloads are plain JSON; handlers
+(tasks.py) reload their objects by id.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.BackgroundThreads.executor import background_executor
+
+logger = logging.getLogger(__name__)
+
+TASK_QUEUE_COLLECTION = "task-queue"
+TASK_QUEUE_ENABLED = os.getenv("TASK_QUEUE_ENABLED", "false").lower() == "true"
+TASK_VISIBILITY_TIMEOUT = float(os.getenv("TASK_VISIBILITY_TIMEOUT", 60))
+TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 5))
+TASK_RETRY_BACKOFF = float(os.getenv("TASK_RETRY_BACKOFF", 2))
+TASK_RETRY_BACKOFF_MAX = float(os.getenv("TASK_RETRY_BACKOFF_MAX", 300))
+TASK_WORKER_CONCURRENCY = int(os.getenv("TASK_WORKER_CONCURRENCY", 4))
+TASK_WORKER_POLL_INTERVAL = float(os.getenv("TASK_WORKER_POLL_INTERVAL", 1))
+
+# name -> handler(payload, task_id)
+_handlers = {}
+
+
+def task(name):
+    """
+    Register the decorated function as the handler of task ``name``.
+
+    The handler is called as ``handler(payload, task_id)``; ``task_id`` is the
+    task document's _id, the same on every run of the task. A handler that
+    raises is retried.
+    """
+
+    def register(fn):
+        _handlers[name] = fn
+        return fn
+
+    return register
+
+
+def _now():
+    # Mongo stores datetimes with millisecond precision
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def enqueue(db, name, payload=None, idempotency_key=None, delay_seconds=0, max_attempts=TASK_MAX_ATTEMPTS):
+    """
+    Store a task for the worker process.
+
+    Args:
+        name (str): Registered task name.
+        payload (dict): JSON-serializable arguments of the handler.
+        idempotency_key (str): Optional; a second enqueue with the same key
+            returns the first task's id instead of adding a task.
+        delay_seconds (float): Do not run the task before this many seconds.
+        max_attempts (int): Runs before the task is marked dead.
+
+    Returns:
+        ObjectId: The task id.
+    """
+    now = _now()
+    doc = {
+        "name": name,
+        "payload": payload or {},
+        "status": "queued",
+        "attempts": 0,
+        "maxAttempts": max_attempts,
+        "runAt": now + timedelta(seconds=delay_seconds),
+        "createdAt": now,
+    }
+    collection = db[TASK_QUEUE_COLLECTION]
+    if idempotency_key is None:
+        return collection.insert_one(doc).inserted_id
+
+    doc["idempotencyKey"] = idempotency_key
+    try:
+        result = collection.update_one(
+            {"idempotencyKey": idempotency_key}, {"$setOnInsert": doc}, upsert=True
+        )
+        if result.upserted_id is not None:
+            return result.upserted_id
+    except DuplicateKeyError:
+        # Lost the race against a concurrent enqueue of the same key
+        pass
+    return collection.find_one({"idempotencyKey": idempotency_key}, {"_id": 1})["_id"]
+
+
+def dispatch(db, name, payload, fallback, *args, idempotency_key=None, **kwargs):
+    """
+    Run background work durably when the task queue is enabled, otherwise on
+    the in-process executor as before.
+
+    Args:
+        name (str): Task name (also the executor's task_type).
+        payload (dict): JSON payload of the ``name`` handler.
+        fallback: Function run on the executor as ``fallback(*args, **kwargs)``
+            when the queue is disabled.
+
+    Raises:
+        ExecutorSaturated: The queue is disabled and the executor is full.
+    """
+    if TASK_QUEUE_ENABLED:
+        return enqueue(db, name, payload, idempotency_key=idempotency_key)
+    background_executor.submit(fallback, *args, task_type=name, **kwargs)
+    return None
+
+
+def claim(db, owner, visibility_timeout=TASK_VISIBILITY_TIMEOUT):
+    """
+    Lease the next due task: a queued one whose runAt has passed, or a running
+    one whose lease expired (its worker died).
+
+    Returns:
+        dict | None: The claimed task document.
+    """
+    now = _now()
+    return db[TASK_QUEUE_COLLECTION].find_one_and_update(
+        {
+            "$or": [
+                {"status": "queued", "runAt": {"$lte": now}},
+                {"status": "running", "leaseUntil": {"$lte": now}},
+            ]
+        },
+        {
+            "$set": {
+                "status": "running",
+                "owner": owner,
+                "leaseUntil": now + timedelta(seconds=visibility_timeout),
+                "startedAt": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("runAt", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renew(db, owner, task_ids, visibility_timeout=TASK_VISIBILITY_TIMEOUT):
+    """Extend the lease of the tasks ``owner`` is still running."""
+    if not task_ids:
+        return
+    db[TASK_QUEUE_COLLECTION].update_many(
+        {"_id": {"$in": list(task_ids)}, "owner": owner, "status": "running"},
+        {"$set": {"leaseUntil": _now() + timedelta(seconds=visibility_timeout)}},
+    )
+
+
+def complete(db, doc):
+    """Mark a claimed task done (no-op if the lease was lost meanwhile)."""
+    db[TASK_QUEUE_COLLECTION].update_one(
+        {"_id": doc["_id"], "owner": doc["owner"], "status": "running"},
+        {"$set": {"status": "done", "finishedAt": _now()}, "$unset": {"leaseUntil": ""}},
+    )
+
+
+def retry_delay(attempts):
+    """Backoff before the next run after ``attempts`` failed runs, with jitter."""
+    delay = min(TASK_RETRY_BACKOFF * 2 ** max(attempts - 1, 0), TASK_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail(db, doc, error):
+    """Schedule a failed task for a retry, or mark it dead after its last attempt."""
+    now = _now()
+    if doc["attempts"] >= doc.get("maxAttempts", TASK_MAX_ATTEMPTS):
+        update = {"status": "dead", "finishedAt": now, "lastError": error}
+    else:
+        update = {
+            "status": "queued",
+            "runAt": now + timedelta(seconds=retry_delay(doc["attempts"])),
+            "lastError": error,
+        }
+    db[TASK_QUEUE_COLLECTION].update_one(
+        {"_id": doc["_id"], "owner": doc["owner"], "status": "running"},
+        {"$set": update, "$unset": {"leaseUntil": ""}},
+    )
+
+
+def queue_stats(db):
+    """
+    Returns:
+        dict: {name: {status: count}} over the whole collection.
+    """
+    stats = {}
+    rows = db[TASK_QUEUE_COLLECTION].aggregate(
+        [{"$group": {"_id": {"name": "$name", "status": "$status"}, "count": {"$sum": 1}}}]
+    )
+    for row in rows:
+        stats.setdefault(row["_id"]["name"], {})[row["_id"]["status"]] = row["count"]
+    return stats
+
+
+class TaskWorker:
+    """
+    Runs queued tasks on ``concurrency`` threads until stop() is called.
+
+    Each thread claims one task at a time and sleeps ``poll_interval`` seconds
+    when nothing is due. A heartbeat thread renews the leases of running tasks
+    every third of the visibility timeout.
+    """
+
+    def __init__(
+        self,
+        db,
+        concurrency=TASK_WORKER_CONCURRENCY,
+        poll_interval=TASK_WORKER_POLL_INTERVAL,
+        visibility_timeout=TASK_VISIBILITY_TIMEOUT,
+        owner=None,
+    ):
+        self.db = db
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._stopped.clear()
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._work, name=f"task-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat, name="task-worker-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        logger.info(f"Task worker {self.owner} started with {self.concurrency} thread(s)")
+
+    def stop(self, timeout=None):
+        """Stop claiming and wait for the running tasks to finish."""
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def run_once(self):
+        """
+        Claim and run one due task.
+
+        Returns:
+            bool: False when no task was due.
+        """
+        doc = claim(self.db, self.owner, self.visibility_timeout)
+        if doc is None:
+            return False
+        with self._running_lock:
+            self._running.add(doc["_id"])
+        started = time.monotonic()
+        try:
+            handler = _handlers.get(doc["name"])
+            if handler is None:
+                raise LookupError(f"No handler registered for task '{doc['name']}'")
+            handler(doc.get("payload") or {}, doc["_id"])
+        except Exception as e:
+            logger.error(
+                f"Task {doc['name']} {doc['_id']} failed (attempt {doc['attempts']}): {e}",
+                exc_info=True,
+            )
+            fail(self.db, doc, str(e))
+        else:
+            complete(self.db, doc)
+            logger.info(f"Task {doc['name']} {doc['_id']} done in {time.monotonic() - started:.3f}s")
+        finally:
+            with self._running_lock:
+                self._running.discard(doc["_id"])
+        return True
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Task worker {self.owner}: {e}", exc_info=True)
+            self._stopped.wait(self.poll_interval)
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.visibility_timeout / 3):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                renew(self.db, self.owner, running, self.visibility_timeout)
+            except Exception as e:
+                logger.error(f"Task worker {self.owner}: lease renewal failed: {e}")
@@ -0,0 +1,157 @@
+"""
+Handlers of the durable task queue (task_queue.py).
+
+Each handler takes the JSON payload stored by dispatch() and the task id,
+reloads the objects the work needs and runs the same operation as the matching
+bg_* function. The bg_* functions catch every error and report it to the
+player; the handlers only do that for business errors (ValueError), which a
+retry would not fix. Any other error is raised, so the queue retries the task
+with backoff and marks it dead after its last attempt.
+
+A task whose player or job no longer exists is dropped (logged) instead of
+being retried.
+"""
+
+import logging
+
+from bson import ObjectId
+
+from app import app, db
+from app.BackgroundThreads import (
+    apply_and_hire_failed,
+    apply_appreciation_to_properties,
+    bg_salary_confirmation,
+    draw_lotto_ticket,
+    payment_failed,
+    process_apply_and_hire,
+    process_payment,
+    process_update_asset,
+    process_update_liability,
+    update_asset_failed,
+    update_liability_failed,
+)
+from app.BackgroundThreads.month_close import MonthCloseBusy, run_month_close
+from app.BackgroundThreads.payroll import run_payroll
+from app.BackgroundThreads.task_queue import task
+from classes.BalanceSheet.index import BalanceSheet
+from classes.Bank.index import Bank
+from classes.Job.index import Job
+from classes.Player.index import Player
+from classes.Property.index import Property
+
+logger = logging.getLogger(__name__)
+
+
+def _player(username):
+    with app.app_context():
+        player = Player.load_from_db(username)
+    if player is None:
+        logger.warning(f"Task dropped: player '{username}' not found")
+    return player
+
+
+@task("apply_and_hire")
+def apply_and_hire_task(payload, task_id):
+    player = _player(payload["username"])
+    job = Job.load_from_db(id=payload["job_id"])
+    if player is None or job is None:
+        return
+    with app.app_context():
+        try:
+            process_apply_and_hire(job, player)
+        except ValueError as e:
+            apply_and_hire_failed(job, player, e)
+
+
+@task("payment")
+def payment_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    with app.app_context():
+        bank = Bank(customer=player)
+        bank.load_bank_data()
+        try:
+            # Keyed by the task, so a run after a crash does not pay twice
+            process_payment(
+                bank,
+                player,
+                payload["amount"],
+                payload["recipient"],
+                payload.get("late_payment"),
+                operation_id=f"task:{task_id}",
+            )
+        except ValueError as e:
+            payment_failed(player, e)
+
+
+@task("update_liability")
+def update_liability_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    with app.app_context():
+        try:
+            process_update_liability(BalanceSheet(player=player), player.username, payload["updates"], player)
+        except ValueError as e:
+            update_liability_failed(player.username, player, e)
+
+
+@task("update_asset")
+def update_asset_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    with app.app_context():
+        try:
+            process_update_asset(BalanceSheet(player=player), player.username, payload["updates"], player)
+        except ValueError as e:
+            update_asset_failed(player.username, player, e)
+
+
+@task("apply_appreciation")
+def apply_appreciation_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    with app.app_context():
+        # Keyed by the task, so a run after a crash does not compound it
+        apply_appreciation_to_properties(
+            player,
+            Property,
+            payload["property_ids"],
+            payload["years"],
+            payload["update_balancesheet"],
+            task_id=f"task:{task_id}",
+        )
+
+
+@task("lotto_draw")
+def lotto_draw_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    if not draw_lotto_ticket(ObjectId(payload["ticket_id"]), player):
+        raise RuntimeError(f"Lotto ticket {payload['ticket_id']} could not be drawn")
+
+
+@task("salary_confirmation")
+def salary_confirmation_task(payload, task_id):
+    player = _player(payload["username"])
+    if player is None:
+        return
+    bg_salary_confirmation(None, player, payload["amount"], payload.get("proxy"), payload.get("message"))
+
+
+@task("payroll")
+def payroll_task(payload, task_id):
+    run_payroll(db, payload["period"])
+
+
+@task("month_close")
+def month_close_task(payload, task_id):
+    try:
+        run_month_close(db, payload["period"])
+    except MonthCloseBusy as e:
+        # Another worker holds the lease; the close is already being done
+        logger.info(f"Month close {payload['period']} not started: {e}")
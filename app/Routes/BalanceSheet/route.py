@@ -1,9 +1,12 @@
 # INSERT_YOUR_CODE
-from flask import request, jsonify
-import threading
-from app import app
+import json
+from datetime import datetime
+from flask import Response, request, jsonify, stream_with_context
+from app import app, db
 from app.BackgroundThreads import bg_update_asset, bg_update_liability
-from classes.BalanceSheet.index import BalanceSheet
+from app.BackgroundThreads.executor import ExecutorSaturated
+from app.BackgroundThreads.task_queue import dispatch
+from classes.BalanceSheet.index import BalanceSheet, SNAPSHOT_PAGE_SIZE
 from classes.Player.index import Player
 import logging
 
@@ -101,6 +104,68 @@ def get_balancesheet(username):
     return jsonify(bs), 200
 
 
+@app.route("/api/balancesheet/<username>/history", methods=["GET"])
+def get_balancesheet_history(username):
+    """
+    Snapshot history of the user's balancesheet totals, newest first.
+
+    Query params:
+        limit: number of snapshots (default 50, max 500)
+        before: ISO timestamp, only snapshots taken before it (next page)
+    """
+    try:
+        limit = int(request.args.get("limit", SNAPSHOT_PAGE_SIZE))
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit'."}), 400
+    limit = min(limit, 500)
+
+    before = request.args.get("before")
+    if before:
+        try:
+            before = datetime.fromisoformat(before)
+        except ValueError:
+            return jsonify({"error": "Invalid 'before', expected an ISO timestamp."}), 400
+
+    snapshots = BalanceSheet.load_history(username, limit=limit, before=before or None)
+    for snapshot in snapshots:
+        snapshot["takenAt"] = snapshot["takenAt"].isoformat()
+    next_before = snapshots[-1]["takenAt"] if len(snapshots) == limit else None
+    return jsonify({"snapshots": snapshots, "next_before": next_before}), 200
+
+
+@app.route("/api/balancesheet/<username>/liability/<name>/schedule", methods=["GET"])
+def get_liability_schedule(username, name):
+    """
+    Stream the repayment schedule of one liability as NDJSON, one line per
+    period: {"period", "payment", "interest", "principal", "balance"}.
+    """
+    player, error_resp, status = get_player_or_404(username)
+    if error_resp:
+        return error_resp, status
+    bs = player.balancesheet
+    idx = bs._find_item(bs.liabilities, name)
+    if idx is None:
+        return jsonify({"error": f"Liability '{name}' not found."}), 404
+
+    liability = bs.liabilities[idx]
+    try:
+        if float(liability.get("loanAmount", 0)) <= 0 or float(liability.get("amortizationTerm", 1)) <= 0:
+            raise ValueError
+        float(liability.get("interestRate", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": f"Liability '{name}' has no valid repayment terms."}), 400
+
+    rows = bs.iter_liability_schedule(name, username=username)
+
+    def generate():
+        for row in rows:
+            yield json.dumps(row) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 # You must register this blueprint with your Flask app elsewhere, e.g.:
 # app.register_blueprint(balancesheet_bp)
 
@@ -133,11 +198,14 @@ def update_liability(username):
 
     bs = BalanceSheet(player=player)
 
-    # Use threading.Thread for background task execution
-    # This works with Flask-SocketIO in threading mode
-    thread = threading.Thread(target=bg_update_liability, args=(bs, username, updates, player))
-    thread.daemon = True
-    thread.start()
+    # Run the update in the background (durable task queue or shared executor)
+    try:
+        dispatch(
+            db, "update_liability", {"username": username, "updates": updates},
+            bg_update_liability, bs, username, updates, player,
+        )
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
 
     return jsonify(
         {
@@ -177,9 +245,13 @@ def update_assets(username):
 
     
 
-    thread = threading.Thread(target=bg_update_asset, args=(bs, username, updates, player))
-    thread.daemon = True
-    thread.start()
+    try:
+        dispatch(
+            db, "update_asset", {"username": username, "updates": updates},
+            bg_update_asset, bs, username, updates, player,
+        )
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
 
     return jsonify(
         {
@@ -1,9 +1,15 @@
-from app import app, socketio
+import numpy as np
+
+from app import app, db, socketio
 from flask import request, jsonify
-import threading
+from app.utils import identity_map
 from app.BackgroundThreads import bg_payment
+from app.BackgroundThreads.executor import ExecutorSaturated
+from app.BackgroundThreads.task_queue import dispatch
 from classes.BalanceSheet.index import BalanceSheet
-from classes.Bank.index import Bank
+from classes.BalanceSheet.amortization import batch_payments
+from classes.Bank.credit_score import approval_limit, required_scores
+from classes.Bank.index import Bank, LEDGER_PAGE_SIZE
 from classes.Player.index import Player
 
 
@@ -50,13 +56,16 @@ def make_bank_payment(username):
         return jsonify({"error": "Insufficient funds for payment."}), 400
 
     try:
-        # Use threading.Thread for background task execution
-        # This works with Flask-SocketIO in threading mode
-        thread = threading.Thread(
-            target=bg_payment, args=(bank, player, amount, recipient, late_payment)
+        # Run the payment in the background (durable task queue or shared executor).
+        # A client retrying with the same Idempotency-Key header gets the same task.
+        key = request.headers.get("Idempotency-Key")
+        dispatch(
+            db,
+            "payment",
+            {"username": username, "amount": amount, "recipient": recipient, "late_payment": late_payment},
+            bg_payment, bank, player, amount, recipient, late_payment,
+            idempotency_key=f"payment:{username}:{key}" if key else None,
         )
-        thread.daemon = True
-        thread.start()
         return jsonify(
             {
                 "message": f"Payment of {amount} to '{recipient}' is being processed in the background.",
@@ -64,6 +73,8 @@ def make_bank_payment(username):
                 "bank_log": bank.get_logs(),
             }
         ), 200
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
     except Exception as e:
@@ -150,3 +161,165 @@ def request_loan(username):
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "An unexpected error occurred: " + str(e)}), 500
+
+
+# Largest amounts x rates x terms grid /loan-curve evaluates in one request.
+LOAN_CURVE_MAX_POINTS = 20000
+LOAN_CURVE_DEFAULT_STEPS = 20
+
+
+def _float_list(name):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return [float(value) for value in raw.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid '{name}', expected comma-separated numbers.")
+
+
+@app.route("/api/bank/<username>/loan-curve", methods=["GET"])
+def get_loan_curve(username):
+    """
+    Read-only loan shopping: the required credit score and monthly payment over
+    a grid of amounts, interest rates and terms, evaluated in one vectorized
+    pass, plus the approval frontier for the player's current score.
+
+    Query params:
+        amounts: comma-separated loan amounts, or
+        max_amount (default: twice the income) and steps (default 20) for an
+            evenly spaced range
+        rates: comma-separated annual interest rates (default 0.05)
+        terms: comma-separated terms in months, as request-loan takes them (default 12)
+
+    The payment is the expense line request-loan would add for each loan.
+    The income is the balancesheet total, the same request-loan checks the
+    required score against.
+    """
+    try:
+        amounts = _float_list("amounts")
+        rates = _float_list("rates") or [0.05]
+        terms = _float_list("terms") or [12]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        max_amount = request.args.get("max_amount")
+        max_amount = float(max_amount) if max_amount is not None else None
+        steps = int(request.args.get("steps", LOAN_CURVE_DEFAULT_STEPS))
+    except ValueError:
+        return jsonify({"error": "Invalid 'max_amount' or 'steps'."}), 400
+    if any(rate < 0 for rate in rates) or any(term <= 0 for term in terms) or steps <= 0:
+        return jsonify({"error": "Rates must not be negative; terms and steps must be positive."}), 400
+
+    player = Player.get_player(username)
+    if not player:
+        return jsonify({"error": f"User '{username}' not found."}), 404
+    bs = player.balancesheet
+    bs.player = player
+    # Built from the cached document: this endpoint must not write
+    customer_id = str(player._id)
+    bank_doc = identity_map.find_one(
+        db["bank-collection"], ("customerId", customer_id), {"customerId": customer_id}
+    )
+    bank = Bank.from_document(player, bank_doc)
+
+    income = bs.total_income()
+    if amounts is None:
+        top = max_amount if max_amount is not None else 2 * max(income, 1)
+        amounts = np.linspace(top / steps, top, steps).round(2).tolist()
+    if any(amount <= 0 for amount in amounts):
+        return jsonify({"error": "Amounts must be positive."}), 400
+    if len(amounts) * len(rates) * len(terms) > LOAN_CURVE_MAX_POINTS:
+        return jsonify({"error": f"Grid too large, at most {LOAN_CURVE_MAX_POINTS} points."}), 400
+
+    try:
+        credit = bank.credit_score_details(bs, save=False)
+        score = credit["score"]
+
+        # Required score depends on the amount only; payments on all three axes.
+        amount_axis = np.asarray(amounts, dtype=float)
+        required = required_scores(amount_axis, income)
+        approved = required <= score
+        grid_amount, grid_rate, grid_term = np.meshgrid(amount_axis, rates, terms, indexing="ij")
+        payments = batch_payments(grid_amount, grid_rate, grid_term, "monthly", "monthly")
+
+        frontier = []
+        approved_idx = np.nonzero(approved)[0]
+        if approved_idx.size:
+            # Largest approved amount of the grid, for every rate and term
+            top = approved_idx[np.argmax(amount_axis[approved_idx])]
+            for j, rate in enumerate(rates):
+                for k, term in enumerate(terms):
+                    frontier.append(
+                        {
+                            "interestRate": rate,
+                            "termMonths": term,
+                            "amount": float(amount_axis[top]),
+                            "requiredScore": int(required[top]),
+                            "payment": float(payments["payment"][top, j, k]),
+                            "totalAmount": float(payments["total_amount"][top, j, k]),
+                            "interestPayment": float(payments["interest_payment"][top, j, k]),
+                        }
+                    )
+
+        return jsonify(
+            {
+                "credit_score": score,
+                "income": income,
+                # Amounts strictly below this are approved (None: any amount)
+                "approval_limit": approval_limit(score, income),
+                "frontier": frontier,
+                "grid": {
+                    "amounts": amount_axis.tolist(),
+                    "interestRates": rates,
+                    "termMonths": terms,
+                    "requiredScore": required.tolist(),
+                    "approved": approved.tolist(),
+                    # Indexed [amount][rate][term]
+                    "payment": payments["payment"].tolist(),
+                },
+            }
+        ), 200
+    except Exception as e:
+        return jsonify({"error": "An unexpected error occurred: " + str(e)}), 500
+
+
+@app.route("/api/bank/<username>/ledger", methods=["GET"])
+def get_bank_ledger(username):
+    """
+    Page through the user's bank ledger, newest first.
+
+    Query params:
+        limit: page size (default 50, max 200)
+        cursor: next_cursor from the previous response
+        rollup: "day" for per-day totals instead of individual entries
+    """
+    rollup = request.args.get("rollup")
+    if rollup not in (None, "", "day"):
+        return jsonify({"error": "Invalid 'rollup', expected 'day'."}), 400
+
+    try:
+        limit = int(request.args.get("limit", LEDGER_PAGE_SIZE))
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({"error": "Invalid 'limit'."}), 400
+
+    users_collection = db["users-collection"]
+    player_doc = identity_map.find_one(
+        users_collection, ("username", username), {"username": username}
+    )
+    if not player_doc:
+        return jsonify({"error": f"User '{username}' not found."}), 404
+
+    cursor = request.args.get("cursor") or None
+    try:
+        if rollup == "day":
+            page = Bank.get_ledger_rollup(str(player_doc["_id"]), limit=limit, cursor=cursor)
+        else:
+            page = Bank.get_ledger(str(player_doc["_id"]), limit=limit, cursor=cursor)
+        return jsonify(page), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "An unexpected error occurred: " + str(e)}), 500
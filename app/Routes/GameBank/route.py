@@ -1,8 +1,11 @@
-from app import app
+from app import app, db
 from flask import request, jsonify
 from app.BackgroundThreads import bg_payment, bg_salary_confirmation
+from app.BackgroundThreads.executor import ExecutorSaturated
+from app.BackgroundThreads.month_close import current_period, validate_period
+from app.BackgroundThreads.payroll import PayrollBusy, run_payroll
+from app.BackgroundThreads.task_queue import dispatch
 from classes.GameBank.index import GameBank
-import threading
 
 from classes.Player.index import Player
 
@@ -26,9 +29,16 @@ def gamebank_pay():
         bank = GameBank.get_bank()
         bank.pay_player(player_username, amount, proxy, message )
 
-        thread = threading.Thread(target=bg_salary_confirmation, args=(bank, player, amount, proxy, message))
-        thread.daemon = True
-        thread.start()
+        try:
+            dispatch(
+                db,
+                "salary_confirmation",
+                {"username": player_username, "amount": amount, "proxy": proxy, "message": message},
+                bg_salary_confirmation, bank, player, amount, proxy, message,
+            )
+        except ExecutorSaturated as e:
+            # The payment itself is done; only the confirmation event is skipped.
+            print(f"Salary confirmation for '{player_username}' not queued: {e}")
 
         return jsonify({
             "message": f"Paid {amount} to '{player_username}' from the bank.",
@@ -38,3 +48,31 @@ def gamebank_pay():
         return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": "Server error", "details": str(e)}), 500
+
+
+def _run_payroll_task(period):
+    try:
+        run_payroll(db, period)
+    except (ValueError, PayrollBusy) as e:
+        print(f"Payroll {period} not run: {e}")
+
+
+@app.route('/api/gamebank/payroll', methods=['POST'])
+def gamebank_payroll():
+    """
+    Pay every employed player's salary for a period in the background.
+
+    Body JSON (optional): { "period": "2024-05" }  # defaults to the current month
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        period = validate_period(data.get("period") or current_period())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        dispatch(db, "payroll", {"period": period}, _run_payroll_task, period)
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
+
+    return jsonify({"message": f"Payroll {period} started.", "period": period}), 202
@@ -3,6 +3,7 @@ from classes.Player.index import Player
 
 
 from app import app
+from app.BackgroundThreads.executor import ExecutorSaturated
 from classes.Job.index import Job
 from flask import jsonify
 
@@ -38,6 +39,8 @@ def apply_for_job():
 
         return jsonify({'success': True, 'message': 'Job application submitted and processed.'})
 
+    except ExecutorSaturated as e:
+        return jsonify({'success': False, 'error': str(e)}), 429
     except Exception as e:
        
         return jsonify({'success': False, 'error': str(e)}), 400
@@ -1,7 +1,8 @@
-from app import app
+from app import app, db
 from flask import request, jsonify
 import threading
-from app.BackgroundThreads import bg_process_lotto_ticket
+from app.BackgroundThreads import bg_process_lotto_ticket, lotto_scheduler
+from app.BackgroundThreads.task_queue import TASK_QUEUE_ENABLED, enqueue
 from classes.Lotto.index import Lotto
 from classes.Bank.index import Bank
 from classes.Player.index import Player
@@ -74,13 +75,28 @@ def submit_lotto_ticket(username):
         # Deduct ticket cost from bank account
         bank.withdraw(amount=ticket_cost)
 
-        # Start background thread to process ticket after delay
-        thread = threading.Thread(
-            target=bg_process_lotto_ticket,
-            args=(lotto, player, result_delay_seconds),
-            daemon=True,
-        )
-        thread.start()
+        if lotto_scheduler.running:
+            # The scheduler draws the ticket once result_at is due
+            lotto_scheduler.schedule(lotto.result_at, lotto._id)
+        elif TASK_QUEUE_ENABLED:
+            # The worker process draws the ticket once the delay has passed
+            enqueue(
+                db,
+                "lotto_draw",
+                {"ticket_id": str(lotto._id), "username": player.username},
+                idempotency_key=f"lotto_draw:{lotto._id}",
+                delay_seconds=result_delay_seconds,
+            )
+        else:
+            # Scheduler disabled: start background thread to process ticket after delay.
+            # This one stays a dedicated thread; it sleeps until result_at and
+            # would otherwise hold a background executor worker for the whole delay.
+            thread = threading.Thread(
+                target=bg_process_lotto_ticket,
+                args=(lotto, player, result_delay_seconds),
+                daemon=True,
+            )
+            thread.start()
 
         return jsonify(
             {
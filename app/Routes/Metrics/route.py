@@ -0,0 +1,51 @@
+from app import app, db
+from flask import request, jsonify
+from app.utils.db_guard import get_guard_stats, reset_guard_stats
+from app.BackgroundThreads import emit_coalescer
+from app.BackgroundThreads.executor import background_executor
+from app.BackgroundThreads.task_queue import TASK_QUEUE_ENABLED, queue_stats
+from app.utils.emit_bus import emit_stats
+from classes.BalanceSheet import amortization
+
+
+@app.route("/api/metrics/db-guard", methods=["GET"])
+def db_guard_metrics():
+    """
+    Contention counters for the striped DB guard.
+
+    Query parameters:
+    - include_idle: "true" to also list stripes that were never acquired
+    """
+    include_idle = request.args.get("include_idle", "false").lower() == "true"
+    return jsonify(get_guard_stats(include_idle=include_idle)), 200
+
+
+@app.route("/api/metrics/db-guard/reset", methods=["POST"])
+def reset_db_guard_metrics():
+    """Reset the DB guard contention counters."""
+    reset_guard_stats()
+    return jsonify({"message": "DB guard counters reset."}), 200
+
+
+@app.route("/api/metrics/executor", methods=["GET"])
+def executor_metrics():
+    """Queue depth and per-task-type counters for the background executor."""
+    return jsonify(background_executor.stats()), 200
+
+
+@app.route("/api/metrics/emit-bus", methods=["GET"])
+def emit_bus_metrics():
+    """Socket.IO emit bus backend, and this worker's emit and coalescing counters."""
+    return jsonify({**emit_stats(), "coalescer": emit_coalescer.stats()}), 200
+
+
+@app.route("/api/metrics/task-queue", methods=["GET"])
+def task_queue_metrics():
+    """Task counts per task name and status in the durable task queue."""
+    return jsonify({"enabled": TASK_QUEUE_ENABLED, "tasks": queue_stats(db)}), 200
+
+
+@app.route("/api/metrics/amortization-cache", methods=["GET"])
+def amortization_cache_metrics():
+    """Hit/miss counters of the memoized amortization calculation."""
+    return jsonify(amortization.cache_info()), 200
@@ -0,0 +1,55 @@
+from app import app, db
+from flask import request, jsonify
+from app.BackgroundThreads.executor import ExecutorSaturated
+from app.BackgroundThreads.month_close import (
+    MonthCloseBusy,
+    current_period,
+    get_month_close_run,
+    run_month_close,
+    validate_period,
+)
+from app.BackgroundThreads.task_queue import dispatch
+
+
+def _run_month_close_task(period):
+    try:
+        run_month_close(db, period)
+    except MonthCloseBusy as e:
+        print(f"Month close {period} not started: {e}")
+
+
+@app.route("/api/month-close", methods=["POST"])
+def start_month_close():
+    """
+    Start the month close for a period in the background.
+
+    Body JSON (optional): { "period": "2024-05" }  # defaults to the current month
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        period = validate_period(data.get("period") or current_period())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    run = get_month_close_run(db, period)
+    if run and run.get("status") == "running":
+        return jsonify({"error": f"Month close {period} is already running.", "run": run}), 409
+
+    try:
+        dispatch(db, "month_close", {"period": period}, _run_month_close_task, period)
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
+
+    return jsonify({"message": f"Month close {period} started.", "period": period}), 202
+
+
+@app.route("/api/month-close/<period>", methods=["GET"])
+def get_month_close(period):
+    """Status and counters of a period's month close."""
+    try:
+        run = get_month_close_run(db, period)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not run:
+        return jsonify({"error": f"No month close for {period}."}), 404
+    return jsonify(run), 200
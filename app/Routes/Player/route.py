@@ -1,5 +1,9 @@
-from app import app
+from datetime import datetime
+
+from app import app, db
 from flask import request, jsonify
+from app.BackgroundThreads.advance_month import advance_month, MonthAlreadyAdvanced
+from app.utils import identity_map
 from classes.BalanceSheet.index import BalanceSheet
 from classes.Bank.index import Bank
 from classes.Job.index import Job
@@ -7,34 +11,145 @@ from classes.Player.index import Player
 from classes.Property.index import Property
 
 
+# Parts of the profile a client can select with ?fields=job,bank,... (default: all).
+# credit_score is returned under "bank" and needs the bank and the balancesheet.
+PROFILE_FIELDS = ("job", "bank", "credit_score", "balancesheet", "properties")
+
+
+def _profile_pipeline(username, parts):
+    """
+    One aggregation on users-collection that joins everything the profile needs.
+
+    Bank documents and properties reference the player by the string form of
+    its _id, and player.job may hold the job _id as a string, hence the
+    $toString / $convert helper fields.
+    """
+    pipeline = [
+        {"$match": {"username": username}},
+        {"$limit": 1},
+        {"$addFields": {"_player_id": {"$toString": "$_id"}}},
+    ]
+    if "job" in parts:
+        pipeline += [
+            {
+                "$addFields": {
+                    "_job_id": {
+                        "$convert": {"input": "$job", "to": "objectId", "onError": "$job", "onNull": None}
+                    }
+                }
+            },
+            {"$lookup": {"from": "jobs-collection", "localField": "_job_id", "foreignField": "_id", "as": "_job"}},
+        ]
+    if "bank" in parts:
+        pipeline.append(
+            {"$lookup": {"from": "bank-collection", "localField": "_player_id", "foreignField": "customerId", "as": "_bank"}}
+        )
+    if "balancesheet" in parts:
+        pipeline.append(
+            {"$lookup": {"from": "balancesheet-collection", "localField": "username", "foreignField": "username", "as": "_balancesheet"}}
+        )
+    if "properties" in parts:
+        pipeline.append(
+            {"$lookup": {"from": "property-collection", "localField": "_player_id", "foreignField": "player_id", "as": "_properties"}}
+        )
+    # Drop what the response never uses: the job's staff list is blanked anyway
+    # and the Banklog tail is not part of bank.to_dict().
+    projection = {"_job_id": 0}
+    if "job" in parts:
+        projection["_job.staff"] = 0
+    if "bank" in parts:
+        projection["_bank.Banklog"] = 0
+    pipeline.append({"$project": projection})
+    return pipeline
+
+
+def _first(docs):
+    return docs[0] if docs else None
+
+
 @app.route("/api/player", methods=["GET"])
 def get_player():
+    """
+    Full player profile: player, job, bank (with credit_score), balancesheet and
+    owned properties, read with a single $lookup aggregation.
+
+    Query parameters:
+    - username: required
+    - fields: optional comma-separated subset of job, bank, credit_score,
+      balancesheet, properties (default: all)
+
+    bank.has_account is False for a player who has no bank account yet.
+    """
     username = request.args.get("username")
     if not username:
         return jsonify({"error": "Missing 'username' parameter"}), 400
 
-    player = Player.get_player(username)
-    job = Job(id=player.job)
-    bank = Bank(customer=player)
-    bs = BalanceSheet(player=player)
-    props = Property(player)
-    player.balancesheet = bs
+    fields = request.args.get("fields")
+    if fields:
+        parts = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = parts - set(PROFILE_FIELDS)
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {sorted(unknown)}. Allowed: {list(PROFILE_FIELDS)}"}), 400
+    else:
+        parts = set(PROFILE_FIELDS)
+    if "credit_score" in parts:
+        parts |= {"bank", "balancesheet"}
 
-    if not player:
-        result = {}
+    doc = next(db["users-collection"].aggregate(_profile_pipeline(username, parts)), None)
+    if not doc:
         return jsonify({"error": f"Player '{username}' not found."}), 404
+
+    player_id = doc.pop("_player_id", None)
+    job_doc = _first(doc.pop("_job", []))
+    bank_doc = _first(doc.pop("_bank", []))
+    bs_doc = _first(doc.pop("_balancesheet", []))
+    property_docs = doc.pop("_properties", [])
+
+    if bs_doc:
+        # Later loads in this request (credit score, prev_totals) hit the identity map.
+        identity_map.put("balancesheet-collection", bs_doc, ("_id", bs_doc["_id"]), ("username", username))
+        bs = BalanceSheet.from_dict(bs_doc)
+        bs.id = bs_doc["_id"]
     else:
-        result = player.to_dict()
+        bs = BalanceSheet()
+    player = Player.from_document(doc, bs)
+    bs.player = player
+
+    result = player._base_dict()
+    if "balancesheet" in parts:
+        if bs.bank_balance is None and bank_doc:
+            bs.bank_balance = bank_doc.get("balance", 0)
+        result["balancesheet"] = bs.to_dict()
+
+    if "job" in parts:
+        job = Job.from_document(job_doc) if job_doc else Job()
+        if not job_doc:
+            job._id = player.job
         result["job"] = job.to_dict()
+        result["job"]["staff"] = []
+
+    if "bank" in parts:
+        bank = Bank.from_document(player, bank_doc)
         result["bank"] = bank.to_dict()
-        result['bank']['credit_score'] = bank.calculate_credit_score(bs)
-        result["balancesheet"] = bs.to_dict()
-        # result['balancesheet']['prev_balancesheet'] = bs.get_prev_balancesheet(username)
-        result['properties'] = props.load_all_owned_properties()
+        # The account is only opened by the first deposit; say so rather than
+        # presenting a zero balance as an existing account.
+        result["bank"]["has_account"] = bank_doc is not None
+        if "credit_score" in parts:
+            # Cached per factor on the bank document; "recalculated" lists the
+            # factors whose inputs changed since the last read.
+            credit = bank.credit_score_details(bs)
+            result["bank"]["credit_score"] = credit["score"]
+            result["bank"]["credit_score_factors"] = credit["factors"]
+            result["bank"]["credit_score_recalculated"] = credit["recalculated"]
+
+    if "properties" in parts:
+        properties = []
+        for property_doc in property_docs:
+            prop = Property(player)
+            prop.from_dict(property_doc)
+            properties.append(prop.to_json())
+        result["properties"] = properties
 
-        if result["job"] is not None:
-            result["job"]["staff"] = []
-    print("LOADING PLAYER . BS: => ", bs.player.username)
     return jsonify(result), 200
 
 
@@ -149,3 +264,45 @@ def add_property():
         return jsonify(
             {"error": "Failed to add property", "details": str(e)}
         ), 500
+
+
+@app.route("/api/player/<username>/advance-month", methods=["POST"])
+def advance_player_month(username):
+    """
+    Advance the player's month in one turn: salary, loan payments, property
+    appreciation and farm timers, saved together. The result is returned and
+    also emitted as month_advance_complete.
+
+    Optional JSON:
+    {
+        "salary": 4000,  // defaults to the balancesheet's "Salary: ..." income
+        "currentGameDate": "2024-01-01T00:00:00"  // farm timers, defaults to the stored game date
+    }
+    """
+    data = request.get_json(silent=True) or {}
+
+    salary = data.get("salary")
+    if salary is not None:
+        try:
+            salary = float(salary)
+        except (ValueError, TypeError):
+            return jsonify({"error": "'salary' must be a number."}), 400
+
+    game_date = data.get("currentGameDate")
+    if game_date:
+        try:
+            game_date = datetime.fromisoformat(game_date.replace("Z", "+00:00"))
+        except (ValueError, AttributeError):
+            return jsonify({"error": "Invalid currentGameDate format. Use ISO format."}), 400
+
+    try:
+        result = advance_month(username, salary=salary, game_date=game_date or None)
+        if result is None:
+            return jsonify({"error": f"Player '{username}' not found."}), 404
+        return jsonify(result), 200
+    except MonthAlreadyAdvanced as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": "Failed to advance month", "details": str(e)}), 500
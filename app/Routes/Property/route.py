@@ -1,10 +1,11 @@
-from app import app
+from app import app, db
 from flask import jsonify
 from app.BackgroundThreads import update_properties_in_background
+from app.BackgroundThreads.executor import ExecutorSaturated
+from app.BackgroundThreads.task_queue import dispatch
 from classes.Player.index import Player
 from classes.Property.index import Property
 from flask import request
-import threading
 
 
 @app.route("/api/property/<username>", methods=["GET"])
@@ -55,13 +56,19 @@ def apply_property_appreciation(username):
         if player is None:
             return jsonify({"error": f"Player '{username}' not found"}), 404
 
-        # Start the background thread for updating properties
-        thread = threading.Thread(
-            target=update_properties_in_background,
-            args=(player, Property, property_ids, years, update_balancesheet),
-            daemon=True,
+        # Queue the property update (durable task queue or shared executor)
+        dispatch(
+            db,
+            "apply_appreciation",
+            {
+                "username": username,
+                "property_ids": [str(pid) for pid in property_ids],
+                "years": years,
+                "update_balancesheet": update_balancesheet,
+            },
+            update_properties_in_background,
+            player, Property, property_ids, years, update_balancesheet,
         )
-        thread.start()
 
         return jsonify({
             "message": "Appreciation update started in background",
@@ -69,6 +76,8 @@ def apply_property_appreciation(username):
             "years": years
         }), 202
 
+    except ExecutorSaturated as e:
+        return jsonify({"error": str(e)}), 429
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
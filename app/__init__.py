@@ -4,10 +4,12 @@ from pymongo import MongoClient
 from dotenv import load_dotenv
 from flask_cors import CORS
 from flask_socketio import SocketIO
+from app.utils.emit_bus import socketio_options
+from app.utils.identity_map import QueryCounter, start_query_count, query_count
 
 load_dotenv()
 MONGO_URI = os.getenv("MONGO_DB_CONNECTION_STRING")
-mongo_client = MongoClient(MONGO_URI)
+mongo_client = MongoClient(MONGO_URI, event_listeners=[QueryCounter()])
 db = mongo_client.get_database('Capitol-db')
 
 app = Flask(__name__)
@@ -16,8 +18,26 @@ CORS(app)
 # Initialize SocketIO
 # Using 'threading' async mode for standard Python threading support
 # This works with Gunicorn gthread workers
+# SOCKETIO_MESSAGE_QUEUE shares emits between workers (see app/utils/emit_bus.py)
 async_mode = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode, **socketio_options())
+
+# Expose the number of Mongo round-trips per request as a response header in debug
+# mode (or when DB_QUERY_COUNT_HEADER=true) to make query regressions visible.
+QUERY_COUNT_HEADER = os.getenv("DB_QUERY_COUNT_HEADER", "false").lower() == "true"
+
+
+@app.before_request
+def _begin_query_count():
+    start_query_count()
+
+
+@app.after_request
+def _add_query_count_header(response):
+    if app.debug or QUERY_COUNT_HEADER:
+        response.headers["X-DB-Query-Count"] = str(query_count())
+    return response
+
 
 @app.route('/')
 def index():
@@ -36,5 +56,32 @@ from .Routes.BalanceSheet.route import *
 from .Routes.Lotto.route import *
 from .Routes.Farm.route import *
 from .Routes.GameTime.route import *
+from .Routes.Metrics.route import *
+from .Routes.MonthClose.route import *
 # Import socket events (create this file for Socket.IO event handlers)
 from .socket_events import *
+from .cli import *
+
+# Create/verify the collection indexes in the background so a slow or
+# unreachable Mongo does not block worker boot. Disable with AUTO_ENSURE_INDEXES=false
+# and run `flask --app wsgi ensure-indexes` from a release step instead.
+if os.getenv("AUTO_ENSURE_INDEXES", "true").lower() == "true":
+    import threading
+    from app.utils.indexes import ensure_indexes_safely
+
+    threading.Thread(target=ensure_indexes_safely, args=(db,), daemon=True).start()
+
+# One lotto draw scheduler and one farm timer scheduler per worker; a Mongo
+# lease elects the worker that actually runs each. Disable with
+# LOTTO_SCHEDULER_ENABLED=false (falls back to a sleeping thread per ticket) or
+# FARM_SCHEDULER_ENABLED=false (timers then only move on /update-timers).
+import atexit
+from app.BackgroundThreads import lotto_scheduler, farm_timer_scheduler
+
+if os.getenv("LOTTO_SCHEDULER_ENABLED", "true").lower() == "true":
+    lotto_scheduler.start()
+    atexit.register(lotto_scheduler.stop)
+
+if os.getenv("FARM_SCHEDULER_ENABLED", "true").lower() == "true":
+    farm_timer_scheduler.start()
+    atexit.register(farm_timer_scheduler.stop)
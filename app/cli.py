@@ -0,0 +1,73 @@
+"""
+Flask CLI commands for operational tasks.
+
+Run with the app module, e.g.:
+    flask --app wsgi ensure-indexes
+    flask --app wsgi ensure-indexes --verify
+    flask --app wsgi month-close --period 2024-05
+    flask --app wsgi rescore-credit
+    flask --app wsgi payroll --period 2024-05
+"""
+import json
+
+import click
+
+from app import app, db
+from app.utils.indexes import ensure_indexes, verify_indexes
+from app.BackgroundThreads.credit_rescore import CREDIT_RESCORE_CHUNK_SIZE, rescore_credit
+from app.BackgroundThreads.month_close import (
+    MONTH_CLOSE_CHUNK_SIZE,
+    MonthCloseBusy,
+    run_month_close,
+)
+from app.BackgroundThreads.payroll import PayrollBusy, run_payroll
+
+
+@app.cli.command("ensure-indexes")
+@click.option("--verify", is_flag=True, help="Also report missing and unused indexes.")
+def ensure_indexes_command(verify):
+    """Create (idempotently) every index in the manifest."""
+    result = ensure_indexes(db)
+    click.echo(f"Ensured {len(result['created'])} index(es).")
+    for failure in result["failed"]:
+        click.echo(f"FAILED {failure['collection']}.{failure['index']}: {failure['error']}")
+    if verify:
+        click.echo(json.dumps(verify_indexes(db), indent=2, default=str))
+
+
+@app.cli.command("verify-indexes")
+def verify_indexes_command():
+    """Report manifest indexes that are missing and live indexes that are unused."""
+    click.echo(json.dumps(verify_indexes(db), indent=2, default=str))
+
+
+@app.cli.command("month-close")
+@click.option("--period", default=None, help="Month to close as YYYY-MM (default: current month).")
+@click.option("--chunk-size", default=MONTH_CLOSE_CHUNK_SIZE, show_default=True, type=int)
+def month_close_command(period, chunk_size):
+    """Settle every balancesheet for the month (safe to re-run)."""
+    try:
+        summary = run_month_close(db, period, chunk_size=chunk_size)
+    except (ValueError, MonthCloseBusy) as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(summary, indent=2))
+
+
+@app.cli.command("rescore-credit")
+@click.option("--chunk-size", default=CREDIT_RESCORE_CHUNK_SIZE, show_default=True, type=int)
+@click.option("--force", is_flag=True, help="Recompute every factor, not only outdated ones.")
+def rescore_credit_command(chunk_size, force):
+    """Refresh every player's cached credit score (run after changing the rules)."""
+    summary = rescore_credit(db, chunk_size=chunk_size, force=force)
+    click.echo(json.dumps(summary, indent=2))
+
+
+@app.cli.command("payroll")
+@click.option("--period", default=None, help="Month to pay as YYYY-MM (default: current month).")
+def payroll_command(period):
+    """Pay every employed player's salary from the game bank (safe to re-run)."""
+    try:
+        summary = run_payroll(db, period)
+    except (ValueError, PayrollBusy) as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(summary, indent=2))
@@ -0,0 +1,97 @@
+import copy
+
+# Above this fraction of changed elements a list is rewritten with one $set
+# instead of one positional $set per element.
+POSITIONAL_UPDATE_RATIO = 0.5
+
+
+def _safe_keys(d):
+    # Keys with dots or a leading '$' cannot be addressed by a dotted path.
+    return all(isinstance(k, str) and "." not in k and not k.startswith("$") for k in d)
+
+
+def _diff(old, new, path, ops):
+    if isinstance(old, dict) and isinstance(new, dict) and _safe_keys(old) and _safe_keys(new):
+        for key, value in new.items():
+            child = f"{path}.{key}" if path else key
+            if key not in old:
+                ops["$set"][child] = value
+            else:
+                _diff(old[key], value, child, ops)
+        for key in old:
+            if key not in new:
+                ops["$unset"][f"{path}.{key}" if path else key] = ""
+        return
+
+    if isinstance(old, list) and isinstance(new, list) and path:
+        if len(new) > len(old) and new[: len(old)] == old:
+            # Pure append: only the new tail goes over the wire.
+            ops["$push"][path] = {"$each": new[len(old):]}
+            return
+        if len(new) == len(old):
+            changed = [i for i, (a, b) in enumerate(zip(old, new)) if a != b]
+            if len(changed) <= max(1, len(old) * POSITIONAL_UPDATE_RATIO):
+                for i in changed:
+                    _diff(old[i], new[i], f"{path}.{i}", ops)
+                return
+        ops["$set"][path] = new
+        return
+
+    numbers = isinstance(old, (int, float)) and isinstance(new, (int, float))
+    if old == new and (type(old) is type(new) or numbers):
+        return
+    ops["$set"][path] = new
+
+
+def build_update(old, new):
+    """
+    Build the smallest Mongo update that turns document ``old`` into ``new``.
+
+    Changed scalars become ``$set`` on their dotted path, changed list elements
+    become positional ``$set`` (``plants.3.status``), appended list items become
+    ``$push`` with ``$each`` and removed keys become ``$unset``.
+
+    Returns:
+        dict: The update document; empty when nothing changed.
+    """
+    ops = {"$set": {}, "$unset": {}, "$push": {}}
+    _diff(old, new, "", ops)
+    return {op: fields for op, fields in ops.items() if fields}
+
+
+def changed_paths(update):
+    """Dotted paths touched by an update built with build_update."""
+    return sorted(path for fields in update.values() for path in fields)
+
+
+class ChangeTracker:
+    """
+    Mixin that remembers the last persisted document of a domain object.
+
+    Classes call ``_mark_persisted(document)`` after loading or saving and
+    ``_tracked_update(document)`` when saving to get a minimal update. The
+    snapshot is a deep copy, so in-place mutations of nested dicts and lists
+    (plots, animals, logs) are detected at save time.
+    """
+
+    _persisted_document = None
+
+    def _mark_persisted(self, document):
+        self._persisted_document = copy.deepcopy(document)
+
+    def _tracked_update(self, document):
+        """
+        Returns:
+            dict | None: Minimal update ({} when unchanged), or None if this
+            object has no persisted snapshot and needs a full write.
+        """
+        if self._persisted_document is None:
+            return None
+        return build_update(self._persisted_document, document)
+
+    def changed_fields(self, document):
+        """Dotted paths that differ from the persisted snapshot."""
+        update = self._tracked_update(document)
+        if update is None:
+            return None
+        return changed_paths(update)
@@ -1,26 +1,158 @@
+import logging
+import os
 import threading
+import time
+import zlib
 from contextlib import contextmanager
 
-# A reentrant lock ensures nested save/load calls in the same thread do not deadlock,
-# while still allowing only one thread to perform DB operations at a time.
-_db_call_lock = threading.RLock()
-_db_call_flag = {"active": False}
+logger = logging.getLogger(__name__)
+
+# Number of lock stripes. Entities (usernames, farm ids, ticket ids) hash onto a
+# stripe, so unrelated users rarely share a lock while work on the same entity
+# is still serialized.
+DB_GUARD_STRIPES = int(os.getenv("DB_GUARD_STRIPES", 64))
+
+# How long a nested guard on a *different* stripe waits when acquiring it would
+# invert the stripe order (and could therefore deadlock with another thread)
+# before giving up with DbGuardTimeout.
+DB_GUARD_NESTED_TIMEOUT = float(os.getenv("DB_GUARD_NESTED_TIMEOUT", 5))
+
+
+class DbGuardTimeout(RuntimeError):
+    """A nested db_call_guard could not get its stripe without risking a deadlock."""
+
+
+class _Stripe:
+    """A reentrant lock plus contention counters for one stripe."""
+
+    __slots__ = ("lock", "stats_lock", "acquisitions", "contended", "wait_seconds", "max_wait_seconds", "timeouts")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.stats_lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+
+    def record(self, contended, waited, timed_out=False):
+        with self.stats_lock:
+            self.acquisitions += 1
+            if contended:
+                self.contended += 1
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            if timed_out:
+                self.timeouts += 1
+
+
+_stripes = [_Stripe() for _ in range(DB_GUARD_STRIPES)]
+_held = threading.local()
+
+
+def _stripe_index(label, key):
+    # Without an entity key fall back to the label so that unkeyed calls of the
+    # same kind still serialize with each other (the old global behaviour, scoped).
+    token = key if key is not None else label
+    return zlib.crc32(str(token).encode("utf-8")) % DB_GUARD_STRIPES
+
+
+def _held_stripes():
+    stack = getattr(_held, "stack", None)
+    if stack is None:
+        stack = _held.stack = []
+    return stack
 
 
 @contextmanager
-def db_call_guard(label: str = "db_call"):
+def db_call_guard(label: str = "db_call", key=None):
+    """
+    Serialize DB save/load operations that touch the same entity.
+
+    ``key`` identifies the entity (username, farm id, ticket id, ...). Calls for
+    the same key share a stripe and run one at a time; calls for unrelated keys
+    usually land on different stripes and run in parallel. Each stripe is an
+    RLock, so nested save/load calls in the same thread do not deadlock.
+
+    Raises:
+        DbGuardTimeout: A nested guard on a lower stripe than one already held
+            waited DB_GUARD_NESTED_TIMEOUT seconds. Nothing has run under it;
+            the caller should retry the whole operation.
+    """
+    index = _stripe_index(label, key)
+    stripe = _stripes[index]
+    stack = _held_stripes()
+
+    if index in stack:
+        # Re-entrant acquisition within the same thread, never contended.
+        stripe.lock.acquire()
+        stripe.record(False, 0.0)
+    elif stripe.lock.acquire(blocking=False):
+        stripe.record(False, 0.0)
+    else:
+        started = time.monotonic()
+        if stack and index < max(stack):
+            # Acquiring a lower stripe while holding a higher one can deadlock
+            # against a thread doing the reverse; bound the wait instead.
+            acquired = stripe.lock.acquire(timeout=DB_GUARD_NESTED_TIMEOUT)
+        else:
+            acquired = stripe.lock.acquire()
+        waited = time.monotonic() - started
+        stripe.record(True, waited, timed_out=not acquired)
+        if not acquired:
+            logger.warning(
+                f"db_call_guard: '{label}' gave up waiting for stripe {index} after {waited:.2f}s "
+                f"(lock order inversion)"
+            )
+            raise DbGuardTimeout(f"'{label}' timed out waiting for stripe {index}, retry the operation")
+
+    stack.append(index)
+    try:
+        yield
+    finally:
+        stack.pop()
+        stripe.lock.release()
+
+
+def get_guard_stats(include_idle=False):
     """
-    Serialize DB save/load operations across classes.
+    Return contention counters per stripe.
+
+    Args:
+        include_idle (bool): Include stripes that were never acquired.
 
-    The flag tracks whether a DB call is active; the RLock ensures only one
-    thread enters at a time while allowing re-entrancy within the same thread.
+    Returns:
+        dict: {"stripes": int, "totals": {...}, "per_stripe": [{...}, ...]}
     """
-    with _db_call_lock:
-        was_active = _db_call_flag["active"]
-        _db_call_flag["active"] = True
-        try:
-            yield
-        finally:
-            if not was_active:
-                _db_call_flag["active"] = False
+    per_stripe = []
+    totals = {"acquisitions": 0, "contended": 0, "wait_seconds": 0.0, "timeouts": 0}
+    for index, stripe in enumerate(_stripes):
+        with stripe.stats_lock:
+            row = {
+                "stripe": index,
+                "acquisitions": stripe.acquisitions,
+                "contended": stripe.contended,
+                "contention_ratio": (stripe.contended / stripe.acquisitions) if stripe.acquisitions else 0.0,
+                "wait_seconds": round(stripe.wait_seconds, 6),
+                "max_wait_seconds": round(stripe.max_wait_seconds, 6),
+                "timeouts": stripe.timeouts,
+            }
+        for field in totals:
+            totals[field] += row[field]
+        if include_idle or row["acquisitions"]:
+            per_stripe.append(row)
+    totals["wait_seconds"] = round(totals["wait_seconds"], 6)
+    totals["contention_ratio"] = (totals["contended"] / totals["acquisitions"]) if totals["acquisitions"] else 0.0
+    return {"stripes": DB_GUARD_STRIPES, "totals": totals, "per_stripe": per_stripe}
+
 
+def reset_guard_stats():
+    """Zero all stripe counters (useful between load-test runs)."""
+    for stripe in _stripes:
+        with stripe.stats_lock:
+            stripe.acquisitions = 0
+            stripe.contended = 0
+            stripe.wait_seconds = 0.0
+            stripe.max_wait_seconds = 0.0
+            stripe.timeouts = 0
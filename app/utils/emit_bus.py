@@ -0,0 +1,232 @@
+"""
+Cross-worker bus for Socket.IO emits.
+
+With several gunicorn workers (and the task queue worker), a background task
+that finishes in one process must reach a client connected to another.
+SOCKETIO_MESSAGE_QUEUE selects the python-socketio client manager that
+SocketIO is created with; every emit, including each ``_emit_to_room`` call,
+is published on it and delivered by whichever process holds the client:
+
+- ``redis://host:6379/0`` (or ``rediss://``): Redis pub/sub, for production.
+  Needs the optional ``redis`` package (``pip install redis``, not in
+  requirements.txt); any Redis-protocol server (Valkey, KeyDB) works.
+- ``unix:///tmp/finance-game-emit.sock``: a small fan-out broker on a Unix
+  socket, started by the first process that finds none. For tests and
+  single-host setups without Redis.
+- ``local://``: fan-out between the servers of one process, for tests.
+- unset: no bus; emits only reach clients of the emitting process.
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import queue
+import socket
+import threading
+import time
+
+import socketio
+from socketio.pubsub_manager import PubSubManager
+
+logger = logging.getLogger(__name__)
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "finance-game")
+
+_stats_lock = threading.Lock()
+_stats = {"emitted": 0, "failed": 0, "broadcast_fallbacks": 0}
+
+
+def record(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def emit_stats():
+    """
+    Returns:
+        dict: The configured backend and this process's emit counters.
+    """
+    with _stats_lock:
+        counters = dict(_stats)
+    return {"backend": SOCKETIO_MESSAGE_QUEUE.split("://")[0] or None, **counters}
+
+
+class LocalManager(PubSubManager):
+    """Fans messages out to every LocalManager on the same channel in this process."""
+
+    name = "local"
+    _subscribers = {}
+    _subscribers_lock = threading.Lock()
+
+    def __init__(self, url="local://", channel=SOCKETIO_CHANNEL, write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self._queue = queue.Queue()
+        if not write_only:
+            with self._subscribers_lock:
+                self._subscribers.setdefault(channel, []).append(self._queue)
+
+    def _publish(self, data):
+        message = self.json.dumps(data)
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.get(self.channel, []))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    def _listen(self):
+        while True:
+            yield self._queue.get()
+
+
+def _broker(server):
+    # subscriber connection -> lock held while a line is written to it, so
+    # lines relayed by different publisher threads never interleave
+    subscribers = {}
+    subscribers_lock = threading.Lock()
+
+    def serve(conn):
+        # The first line says whether the connection publishes or subscribes
+        lines = conn.makefile("rb")
+        subscriber = lines.readline() == b"sub\n"
+        if subscriber:
+            with subscribers_lock:
+                subscribers[conn] = threading.Lock()
+        try:
+            for line in lines:
+                with subscribers_lock:
+                    targets = list(subscribers.items())
+                for target, write_lock in targets:
+                    try:
+                        with write_lock:
+                            target.sendall(line)
+                    except OSError:
+                        pass
+        except OSError:
+            pass  # the process went away
+        finally:
+            if subscriber:
+                with subscribers_lock:
+                    subscribers.pop(conn, None)
+            conn.close()
+
+    while True:
+        conn, _ = server.accept()
+        threading.Thread(target=serve, args=(conn,), name="emit-bus-broker-client", daemon=True).start()
+
+
+def start_unix_broker(path):
+    """
+    Serve the Unix socket fan-out broker on ``path`` from a daemon thread,
+    unless another process already does.
+
+    Returns:
+        bool: True if this process started the broker.
+    """
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        return False
+    except OSError:
+        pass
+    finally:
+        probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket of a broker that died
+        server.bind(path)
+    except OSError:
+        # Another process bound it first
+        server.close()
+        return False
+    server.listen(64)
+    threading.Thread(target=_broker, args=(server,), name="emit-bus-broker", daemon=True).start()
+    logger.info(f"Emit bus broker listening on {path}")
+    return True
+
+
+class UnixSocketManager(PubSubManager):
+    """
+    Publishes newline-delimited JSON messages through the broker listening on
+    a Unix socket, which relays every message to every connected process.
+    """
+
+    name = "unix"
+
+    def __init__(self, url, channel=SOCKETIO_CHANNEL, write_only=False, logger=None, json=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len("unix://"):]
+        self._publisher = None
+        self._publish_lock = threading.Lock()
+
+    def _connect(self, role):
+        start_unix_broker(self.path)
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(self.path)
+        conn.sendall(role + b"\n")
+        return conn
+
+    def _publish(self, data):
+        line = json.dumps({"channel": self.channel, "data": self.json.dumps(data)}).encode() + b"\n"
+        with self._publish_lock:
+            for retry in (False, True):
+                try:
+                    if self._publisher is None:
+                        self._publisher = self._connect(b"pub")
+                    self._publisher.sendall(line)
+                    return
+                except OSError:
+                    if self._publisher is not None:
+                        self._publisher.close()
+                    self._publisher = None
+                    if retry:
+                        raise
+
+    def _listen(self):
+        while True:
+            try:
+                # Whoever reconnects first takes over the broker if its
+                # process went away (messages published meanwhile are lost)
+                with self._connect(b"sub") as conn:
+                    for line in conn.makefile("rb"):
+                        message = json.loads(line)
+                        if message.get("channel") == self.channel:
+                            yield message["data"]
+            except OSError as e:
+                logger.warning(f"Emit bus connection to {self.path} lost, reconnecting: {e}")
+            time.sleep(1)
+
+
+def create_client_manager(url=SOCKETIO_MESSAGE_QUEUE, channel=SOCKETIO_CHANNEL, write_only=False):
+    """
+    The python-socketio client manager for a SOCKETIO_MESSAGE_QUEUE url.
+
+    Returns:
+        PubSubManager | None: None when no url is configured.
+
+    Raises:
+        ValueError: Unsupported url scheme, or a redis url without the
+            optional redis package installed.
+    """
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://")):
+        if importlib.util.find_spec("redis") is None:
+            raise ValueError(
+                "SOCKETIO_MESSAGE_QUEUE is a redis url but the redis package is not installed "
+                "(pip install redis), or use a unix:// bus"
+            )
+        return socketio.RedisManager(url, channel=channel, write_only=write_only)
+    if url.startswith("unix://"):
+        return UnixSocketManager(url, channel=channel, write_only=write_only)
+    if url.startswith("local://"):
+        return LocalManager(url, channel=channel, write_only=write_only)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE '{url}'")
+
+
+def socketio_options():
+    """Extra SocketIO(...) keyword arguments for the configured bus."""
+    manager = create_client_manager()
+    return {"client_manager": manager} if manager is not None else {}
@@ -0,0 +1,170 @@
+"""
+Coalescing of per-room socket emits.
+
+Background tasks emit the full state (balancesheet, farm, player) after every
+operation, so a player doing ten asset updates in a second gets ten full-state
+pushes. EmitCoalescer holds each such event for EMIT_COALESCE_WINDOW_MS after
+the first one of its kind and then sends only the latest payload:
+
+- Only the events in EMIT_COALESCE_EVENTS are coalesced: pure state pushes,
+  where the latest payload makes the earlier ones redundant. Confirmations of
+  separate operations (payments, job applications, lotto results, farm
+  notifications with counts) are never merged.
+- Events are grouped by (namespace, room, event) plus the id of the entity they
+  are about (job_id, ticket_id, farm_id), so results for different tickets or
+  farms are never merged.
+- A flushed payload that replaced earlier ones carries ``"coalesced": n``.
+- Other events and failure payloads (``"success": False``) are not held, but
+  they are sent by the same thread, in order, after whatever was pending for
+  the same group, so the client still sees them in order.
+- EMIT_COALESCE_WINDOW_MS=0 sends every event immediately from the caller.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+EMIT_COALESCE_WINDOW_MS = float(os.getenv("EMIT_COALESCE_WINDOW_MS", 200))
+EMIT_COALESCE_EVENTS = frozenset(
+    event.strip()
+    for event in os.getenv(
+        "EMIT_COALESCE_EVENTS", "assets_update_complete,liabilities_offset_complete"
+    ).split(",")
+    if event.strip()
+)
+
+# Payload fields identifying the entity an event is about.
+ENTITY_FIELDS = ("job_id", "ticket_id", "farm_id")
+
+
+class EmitCoalescer:
+    """
+    Buffers emits per group and flushes each group once, ``window`` seconds
+    after its first buffered event. A single daemon thread does every send,
+    so events leave in the order they were released.
+
+    Args:
+        send: Callable(socketio_instance, event, data, room, namespace) doing
+            the actual emit.
+        window (float): Seconds to hold an event.
+        events (Iterable[str]): Names of the events that may be coalesced.
+    """
+
+    def __init__(self, send, window=EMIT_COALESCE_WINDOW_MS / 1000, events=EMIT_COALESCE_EVENTS):
+        self.send = send
+        self.window = window
+        self.events = frozenset(events)
+        self._pending = {}  # group -> [due, socketio_instance, event, data, room, namespace, count]
+        self._outbox = deque()  # released events, sent in this order
+        self._condition = threading.Condition()
+        # Held while a batch taken from the outbox is sent, so batches never interleave
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self._stats = {"received": 0, "sent": 0, "coalesced": 0, "immediate": 0}
+
+    @staticmethod
+    def _group(event, data, room, namespace):
+        entity = tuple(data.get(field) for field in ENTITY_FIELDS) if isinstance(data, dict) else ()
+        return (namespace, room, event, entity)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="emit-coalescer", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def emit(self, socketio_instance, event, data, room, namespace=None):
+        """Hold the event for the window, or release it now (see module docstring)."""
+        if self.window <= 0:
+            with self._condition:
+                self._stats["received"] += 1
+                self._stats["immediate"] += 1
+            self._send([None, socketio_instance, event, data, room, namespace, 1])
+            return
+
+        group = self._group(event, data, room, namespace)
+        coalesce = event in self.events and not (isinstance(data, dict) and data.get("success") is False)
+        with self._condition:
+            self._stats["received"] += 1
+            if coalesce:
+                pending = self._pending.get(group)
+                if pending is not None:
+                    # Keep only the latest state
+                    pending[1], pending[3] = socketio_instance, data
+                    pending[6] += 1
+                    self._stats["coalesced"] += 1
+                    return
+                self._pending[group] = [
+                    time.monotonic() + self.window, socketio_instance, event, data, room, namespace, 1
+                ]
+            else:
+                self._stats["immediate"] += 1
+                earlier = self._pending.pop(group, None)
+                if earlier is not None:
+                    self._outbox.append(earlier)
+                self._outbox.append([None, socketio_instance, event, data, room, namespace, 1])
+            self._ensure_thread()
+            self._condition.notify()
+
+    def _send(self, pending):
+        _due, socketio_instance, event, data, room, namespace, count = pending
+        if count > 1:
+            data = {**data, "coalesced": count}
+        with self._condition:
+            self._stats["sent"] += 1
+        try:
+            self.send(socketio_instance, event, data, room, namespace)
+        except Exception as e:
+            logger.error(f"Failed to send coalesced '{event}' to room '{room}': {e}")
+
+    def _release_due(self, now):
+        due = sorted(
+            (group for group, pending in self._pending.items() if pending[0] <= now),
+            key=lambda group: self._pending[group][0],
+        )
+        self._outbox.extend(self._pending.pop(group) for group in due)
+
+    def _send_outbox(self):
+        with self._send_lock:
+            with self._condition:
+                ready = list(self._outbox)
+                self._outbox.clear()
+            for pending in ready:
+                self._send(pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    now = time.monotonic()
+                    self._release_due(now)
+                    if self._outbox:
+                        break
+                    next_due = min((pending[0] for pending in self._pending.values()), default=None)
+                    self._condition.wait(None if next_due is None else next_due - now)
+            self._send_outbox()
+
+    def flush(self):
+        """Send everything that is buffered now (used at shutdown)."""
+        with self._condition:
+            self._release_due(float("inf"))
+        self._send_outbox()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Window, buffered groups and received / sent / coalesced /
+            immediate counters.
+        """
+        with self._condition:
+            return {
+                "window_ms": self.window * 1000,
+                "pending": len(self._pending),
+                **self._stats,
+            }
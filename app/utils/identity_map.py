@@ -0,0 +1,120 @@
+import copy
+import threading
+
+from flask import g, has_app_context
+from pymongo import monitoring
+
+# Request-scoped identity map.
+#
+# Each Flask request (and each background task running inside its own
+# ``app.app_context()``) gets a fresh ``flask.g``; documents fetched during that
+# context are remembered there so that repeated loads of the same player,
+# balancesheet, bank or job do not go back to Mongo. Writers must ``evict`` the
+# entries they change so later loads in the same context see the new state.
+
+
+def _store():
+    if not has_app_context():
+        return None
+    store = g.get("_identity_map")
+    if store is None:
+        store = {}
+        g._identity_map = store
+    return store
+
+
+def get(collection, key):
+    """
+    Return a private copy of a cached document, or None on a miss.
+
+    Args:
+        collection (str): Collection name, e.g. "users-collection".
+        key (tuple): Lookup key, e.g. ("username", "alice").
+    """
+    store = _store()
+    if store is None:
+        return None
+    doc = store.get((collection, key))
+    if doc is None:
+        return None
+    return copy.deepcopy(doc)
+
+
+def put(collection, doc, *keys):
+    """Remember ``doc`` under one or more lookup keys for this context."""
+    store = _store()
+    if store is None or doc is None:
+        return
+    cached = copy.deepcopy(doc)
+    for key in keys:
+        store[(collection, key)] = cached
+
+
+def evict(collection, key=None):
+    """Forget one key of a collection, or the whole collection if key is None."""
+    store = _store()
+    if not store:
+        return
+    if key is not None:
+        store.pop((collection, key), None)
+        return
+    for cache_key in [k for k in store if k[0] == collection]:
+        store.pop(cache_key, None)
+
+
+def find_one(collection, key, query, **kwargs):
+    """
+    ``collection.find_one`` through the identity map.
+
+    Args:
+        collection: pymongo Collection.
+        key (tuple): Identity-map key for this lookup.
+        query (dict): Mongo filter used on a miss.
+
+    Returns:
+        dict | None: A copy of the document.
+    """
+    doc = get(collection.name, key)
+    if doc is not None:
+        return doc
+    doc = collection.find_one(query, **kwargs)
+    if doc is not None:
+        put(collection.name, doc, key)
+    return doc
+
+
+# ---------------------------------------------------------------------------
+# Query counting
+# ---------------------------------------------------------------------------
+
+_local = threading.local()
+
+
+def start_query_count():
+    """Begin counting Mongo commands issued by the current thread."""
+    _local.count = 0
+
+
+def query_count():
+    """Mongo commands issued by the current thread since start_query_count()."""
+    return getattr(_local, "count", 0)
+
+
+class QueryCounter(monitoring.CommandListener):
+    """
+    Counts Mongo round-trips per thread.
+
+    pymongo calls ``started`` synchronously on the thread that issued the
+    command, so a thread-local counter attributes queries to the request or
+    background task that made them.
+    """
+
+    def started(self, event):
+        if hasattr(_local, "count"):
+            _local.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
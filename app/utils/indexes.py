@@ -0,0 +1,183 @@
+import logging
+import os
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every index the server relies on, per collection. Each entry is
+# (name, keys, options). Names are explicit so verification can match them.
+INDEX_MANIFEST = {
+    "users-collection": [
+        ("username_1", [("username", ASCENDING)], {}),
+    ],
+    "balancesheet-collection": [
+        ("username_1", [("username", ASCENDING)], {}),
+    ],
+    "balancesheet-snapshots-collection": [
+        # BalanceSheet.get_prev_totals / load_history: latest first per user.
+        (
+            "username_1_takenAt_-1__id_-1",
+            [("username", ASCENDING), ("takenAt", DESCENDING), ("_id", DESCENDING)],
+            {},
+        ),
+        # Month close: one snapshot per user and period.
+        (
+            "username_1_period_1",
+            [("username", ASCENDING), ("period", ASCENDING)],
+            {"unique": True, "partialFilterExpression": {"period": {"$exists": True}}},
+        ),
+    ],
+    "bank-collection": [
+        ("customerId_1", [("customerId", ASCENDING)], {}),
+        ("customer_1", [("customer", ASCENDING)], {}),
+    ],
+    "bank-ledger-collection": [
+        # Bank.get_ledger: equality on customerId, keyset page on (date, _id).
+        (
+            "customerId_1_date_-1__id_-1",
+            [("customerId", ASCENDING), ("date", DESCENDING), ("_id", DESCENDING)],
+            {},
+        ),
+        # Bank._applied_operation: at most one entry per operationId (retried tasks).
+        (
+            "customerId_1_operationId_1",
+            [("customerId", ASCENDING), ("operationId", ASCENDING)],
+            {"unique": True, "partialFilterExpression": {"operationId": {"$exists": True}}},
+        ),
+    ],
+    "property-collection": [
+        ("player_id_1", [("player_id", ASCENDING)], {}),
+    ],
+    "farms-collection": [
+        ("username_1_name_1", [("username", ASCENDING), ("name", ASCENDING)], {}),
+        # FarmTimerScheduler: range on the real-clock and game-clock next events.
+        ("nextEventAt_1", [("nextEventAt", ASCENDING)], {}),
+        ("nextGameEventAt_1", [("nextGameEventAt", ASCENDING)], {}),
+    ],
+    "business-collection": [
+        ("username_1_name_1", [("username", ASCENDING), ("name", ASCENDING)], {}),
+    ],
+    "lotto-collection": [
+        ("username_1_submitted_at_-1", [("username", ASCENDING), ("submitted_at", DESCENDING)], {}),
+        # Lotto.load_pending_tickets: equality on status, range on result_at.
+        ("status_1_result_at_1", [("status", ASCENDING), ("result_at", ASCENDING)], {}),
+    ],
+    "jobs-collection": [
+        ("title_1_company_1", [("title", ASCENDING), ("company", ASCENDING)], {}),
+    ],
+    "game-time-collection": [
+        ("username_1", [("username", ASCENDING)], {}),
+    ],
+    "task-queue": [
+        # task_queue.claim: due queued tasks, and running tasks with an expired lease.
+        ("status_1_runAt_1", [("status", ASCENDING), ("runAt", ASCENDING)], {}),
+        ("status_1_leaseUntil_1", [("status", ASCENDING), ("leaseUntil", ASCENDING)], {}),
+        (
+            "idempotencyKey_1",
+            [("idempotencyKey", ASCENDING)],
+            {"unique": True, "partialFilterExpression": {"idempotencyKey": {"$exists": True}}},
+        ),
+        # Finished tasks are kept TASK_QUEUE_RETENTION_DAYS; dead ones stay for inspection.
+        (
+            "finishedAt_1",
+            [("finishedAt", ASCENDING)],
+            {
+                "expireAfterSeconds": int(float(os.getenv("TASK_QUEUE_RETENTION_DAYS", 7)) * 86400),
+                "partialFilterExpression": {"status": "done"},
+            },
+        ),
+    ],
+}
+
+
+def ensure_indexes(db, manifest=None):
+    """
+    Create every index in the manifest. Safe to run repeatedly: create_index is
+    a no-op when an identical index already exists.
+
+    Args:
+        db: pymongo Database.
+        manifest (dict): Defaults to INDEX_MANIFEST.
+
+    Returns:
+        dict: {"created": [...], "failed": [{"collection", "index", "error"}]}
+    """
+    manifest = manifest or INDEX_MANIFEST
+    created = []
+    failed = []
+    for collection_name, indexes in manifest.items():
+        collection = db[collection_name]
+        for name, keys, options in indexes:
+            try:
+                collection.create_index(keys, name=name, **options)
+                created.append(f"{collection_name}.{name}")
+            except OperationFailure as e:
+                # Usually an existing index with the same keys but another name/options.
+                logger.warning(f"Could not create index {collection_name}.{name}: {e}")
+                failed.append({"collection": collection_name, "index": name, "error": str(e)})
+    return {"created": created, "failed": failed}
+
+
+def verify_indexes(db, manifest=None):
+    """
+    Compare the live indexes with the manifest and report usage.
+
+    Missing indexes are manifest entries whose key pattern does not exist.
+    Unused indexes are live indexes (other than _id_) that $indexStats reports
+    zero accesses for since the server last restarted.
+
+    Returns:
+        dict: {"missing": [...], "unused": [...], "unexpected": [...]}
+    """
+    manifest = manifest or INDEX_MANIFEST
+    missing = []
+    unused = []
+    unexpected = []
+    for collection_name, indexes in manifest.items():
+        collection = db[collection_name]
+        live = {}
+        for index in collection.list_indexes():
+            live[index["name"]] = list(index["key"].items())
+
+        live_patterns = {tuple(keys) for keys in live.values()}
+        expected_patterns = set()
+        for name, keys, _options in indexes:
+            pattern = tuple((field, direction) for field, direction in keys)
+            expected_patterns.add(pattern)
+            if pattern not in live_patterns:
+                missing.append({"collection": collection_name, "index": name})
+
+        for name, keys in live.items():
+            if name != "_id_" and tuple(keys) not in expected_patterns:
+                unexpected.append({"collection": collection_name, "index": name})
+
+        try:
+            for stats in collection.aggregate([{"$indexStats": {}}]):
+                if stats["name"] == "_id_":
+                    continue
+                ops = stats.get("accesses", {}).get("ops", 0)
+                if ops == 0:
+                    unused.append(
+                        {
+                            "collection": collection_name,
+                            "index": stats["name"],
+                            "since": stats.get("accesses", {}).get("since"),
+                        }
+                    )
+        except OperationFailure as e:
+            logger.warning(f"$indexStats unavailable for {collection_name}: {e}")
+
+    return {"missing": missing, "unused": unused, "unexpected": unexpected}
+
+
+def ensure_indexes_safely(db):
+    """Startup wrapper: never let index creation take the worker down."""
+    try:
+        result = ensure_indexes(db)
+        logger.info(
+            f"Index bootstrap complete: {len(result['created'])} ensured, {len(result['failed'])} failed"
+        )
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
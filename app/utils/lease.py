@@ -0,0 +1,78 @@
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "scheduler-leases"
+
+
+class MongoLease:
+    """
+    A named, expiring lock stored in Mongo, used to elect one leader among the
+    gunicorn workers (and hosts) for a piece of background work.
+
+    The lease document is ``{_id: name, owner, expiresAt}``. ``acquire`` takes the
+    lease when it is free or expired and renews it when this process already
+    owns it; the holder must call it again well within ``ttl_seconds``. If the
+    holder dies the lease simply expires and another worker takes over.
+    """
+
+    def __init__(self, db, name, ttl_seconds=90, owner=None):
+        self.collection = db[LEASE_COLLECTION]
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.held = False
+
+    def acquire(self):
+        """
+        Take or renew the lease.
+
+        Returns:
+            bool: True if this process holds the lease afterwards.
+        """
+        now = datetime.utcnow()
+        try:
+            doc = self.collection.find_one_and_update(
+                {
+                    "_id": self.name,
+                    "$or": [{"owner": self.owner}, {"expiresAt": {"$lte": now}}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "expiresAt": now + timedelta(seconds=self.ttl_seconds),
+                        "renewedAt": now,
+                    }
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            held = doc is not None and doc.get("owner") == self.owner
+        except DuplicateKeyError:
+            # Someone else holds an unexpired lease, so the upsert collided on _id.
+            held = False
+        except Exception as e:
+            logger.error(f"Lease '{self.name}' could not be acquired: {e}")
+            held = False
+
+        if held != self.held:
+            logger.info(f"Lease '{self.name}' {'acquired' if held else 'lost'} by {self.owner}")
+        self.held = held
+        return held
+
+    def release(self):
+        """Give the lease up early so another worker can take over immediately."""
+        if not self.held:
+            return
+        try:
+            self.collection.delete_one({"_id": self.name, "owner": self.owner})
+        except Exception as e:
+            logger.error(f"Lease '{self.name}' could not be released: {e}")
+        self.held = False
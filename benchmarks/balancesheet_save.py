@@ -0,0 +1,115 @@
+"""
+Round trips and latency of BalanceSheet.save_to_db, before and after the
+single find_one_and_update save.
+
+"before" replays the previous save path (find_one for the previous sheet,
+update_one with upsert, find_one for the _id of a new sheet) against the same
+collection; "after" calls the current save_to_db, including the history
+snapshot insert a new sheet records. Round trips are counted with the app's
+QueryCounter command listener.
+
+Usage (point MONGO_DB_CONNECTION_STRING at a development database; the script
+only touches documents whose username starts with "bench-save-" and removes
+them afterwards):
+
+    python -m benchmarks.balancesheet_save --iterations 200
+"""
+
+import argparse
+import statistics
+import time
+
+from app import db
+from app.utils.identity_map import query_count, start_query_count
+from classes.BalanceSheet.index import BalanceSheet
+
+USER_PREFIX = "bench-save-"
+
+
+def legacy_save(bs, username):
+    """The save path before the single round-trip upsert."""
+    collection = db["balancesheet-collection"]
+    data = bs._to_document()
+    collection.find_one({"username": username})
+    data["username"] = username
+    if bs.id is not None:
+        data["_id"] = bs.id
+    collection.update_one(
+        {"username": username},
+        [{"$set": {key: {"$literal": value} for key, value in data.items()}}],
+        upsert=True,
+    )
+    if bs.id is None:
+        doc = collection.find_one({"username": username})
+        if doc and "_id" in doc:
+            bs.id = doc["_id"]
+
+
+def make_balancesheet():
+    return BalanceSheet(
+        assets=[{"name": "House", "income": 0, "value": 250000}],
+        liabilities=[
+            {
+                "name": "Mortgage",
+                "loanAmount": 200000,
+                "interestRate": 0.05,
+                "amortizationTerm": 30,
+            }
+        ],
+        income=[{"name": "Salary", "amount": 4000}],
+        expenses=[{"name": "Food", "amount": 600}],
+    )
+
+
+def run(label, save, iterations, fresh):
+    round_trips = []
+    timings = []
+    for i in range(iterations):
+        username = f"{USER_PREFIX}{label}-{i if fresh else 0}"
+        bs = make_balancesheet()
+        if not fresh and i > 0:
+            bs.id = db["balancesheet-collection"].find_one({"username": username})["_id"]
+        # Alternate a small expense so updates are real writes
+        bs.add_expense("Snacks", i % 2)
+        start_query_count()
+        started = time.perf_counter()
+        save(bs, username)
+        timings.append((time.perf_counter() - started) * 1000)
+        round_trips.append(query_count())
+    return {
+        "round_trips": statistics.mean(round_trips),
+        "p50_ms": statistics.median(timings),
+        "max_ms": max(timings),
+    }
+
+
+def cleanup():
+    query = {"username": {"$regex": f"^{USER_PREFIX}"}}
+    db["balancesheet-collection"].delete_many(query)
+    db["balancesheet-snapshots-collection"].delete_many(query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--iterations", type=int, default=100)
+    args = parser.parse_args()
+
+    cases = [
+        ("before", legacy_save),
+        ("after", lambda bs, username: bs.save_to_db(username)),
+    ]
+    try:
+        print(f"{'path':<8} {'case':<8} {'round trips':>12} {'p50 ms':>9} {'max ms':>9}")
+        for fresh in (True, False):
+            for label, save in cases:
+                result = run(f"{label}-{'new' if fresh else 'upd'}", save, args.iterations, fresh)
+                print(
+                    f"{label:<8} {'insert' if fresh else 'update':<8} "
+                    f"{result['round_trips']:>12.2f} {result['p50_ms']:>9.2f} {result['max_ms']:>9.2f}"
+                )
+    finally:
+        cleanup()
+
+
+if __name__ == "__main__":
+    main()
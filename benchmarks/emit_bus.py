@@ -0,0 +1,116 @@
+"""
+Throughput and latency of Socket.IO emits across worker processes through the
+emit bus (app/utils/emit_bus.py).
+
+Every worker process runs a python-socketio server on the bus, as a gunicorn
+worker would, and emits ``--emits`` room events while counting the events it
+receives from all workers. An emit counts as delivered once every worker has
+handled it (that is where a client in its room would get it), so each run
+expects workers * workers * emits deliveries.
+
+Usage (the Unix socket stand-in needs nothing else; pass a redis:// url to
+measure a Redis-protocol server):
+
+    python -m benchmarks.emit_bus --workers 2 3 4 --emits 2000
+    python -m benchmarks.emit_bus --url redis://localhost:6379/0
+"""
+
+import argparse
+import multiprocessing
+import statistics
+import time
+
+import socketio
+
+from app.utils.emit_bus import create_client_manager, start_unix_broker
+
+EVENT = "bench_emit"
+
+
+def worker(url, channel, index, workers, emits, barrier, results):
+    manager = create_client_manager(url, channel=channel)
+    latencies = []
+    original = manager._handle_emit
+
+    def handle_emit(message):
+        if message.get("event") == EVENT:
+            latencies.append(time.time() - message["data"][0]["sentAt"])
+        original(message)
+
+    manager._handle_emit = handle_emit
+    server = socketio.Server(async_mode="threading", client_manager=manager)
+    # A real worker starts listening on its first client connection
+    server.manager_initialized = True
+    manager.initialize()
+    # Let every listener subscribe before anyone emits
+    time.sleep(1)
+
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(emits):
+        server.emit(EVENT, {"worker": index, "i": i, "sentAt": time.time()}, room=f"bench-{i % 50}")
+    published = time.perf_counter() - started
+
+    expected = workers * emits
+    deadline = time.monotonic() + 60
+    while len(latencies) < expected and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results.put(
+        {
+            "published_seconds": published,
+            "delivered_seconds": time.perf_counter() - started,
+            "delivered": len(latencies),
+            "latencies": latencies,
+        }
+    )
+
+
+def run(url, workers, emits):
+    channel = f"bench-{workers}-{time.time_ns()}"
+    context = multiprocessing.get_context("fork")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(url, channel, i, workers, emits, barrier, results), daemon=True)
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    reports = [results.get(timeout=120) for _ in processes]
+    for process in processes:
+        process.join(timeout=5)
+
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    delivered = sum(report["delivered"] for report in reports)
+    seconds = max(report["delivered_seconds"] for report in reports)
+    return {
+        "emits_per_s": workers * emits / max(report["published_seconds"] for report in reports),
+        "deliveries_per_s": delivered / seconds,
+        "delivered_pct": 100 * delivered / (workers * workers * emits),
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="unix:///tmp/finance-game-emit-bench.sock")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 3, 4])
+    parser.add_argument("--emits", type=int, default=1000, help="Emits per worker.")
+    args = parser.parse_args()
+
+    if args.url.startswith("unix://"):
+        # Keep the broker in this process so no worker has to host it
+        start_unix_broker(args.url[len("unix://"):])
+
+    print(f"{'workers':>7} {'emits/s':>10} {'deliveries/s':>13} {'delivered %':>12} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in args.workers:
+        result = run(args.url, workers, args.emits)
+        print(
+            f"{workers:>7} {result['emits_per_s']:>10.0f} {result['deliveries_per_s']:>13.0f} "
+            f"{result['delivered_pct']:>12.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+# Periods per year for the supported compounding / payment frequencies.
+FREQUENCIES = {
+    "yearly": 1,
+    "semiannual": 2,
+    "quarterly": 4,
+    "monthly": 12,
+    "weekly": 52,
+    "daily": 365,
+}
+DEFAULT_COMPOUNDING_PER_YEAR = 52
+DEFAULT_PAYMENTS_PER_YEAR = 12
+
+AMORTIZATION_CACHE_SIZE = int(os.getenv("AMORTIZATION_CACHE_SIZE", 4096))
+# Number of full liability schedules kept in memory (a 30-year monthly
+# mortgage is 360 rows).
+SCHEDULE_CACHE_SIZE = int(os.getenv("AMORTIZATION_SCHEDULE_CACHE_SIZE", 256))
+
+
+def _periods(frequency, default):
+    if isinstance(frequency, (int, float)) and not isinstance(frequency, bool):
+        return frequency
+    return FREQUENCIES.get(frequency, default)
+
+
+def _periods_array(frequencies, default):
+    if isinstance(frequencies, (str, int, float)) or frequencies is None:
+        return float(_periods(frequencies, default))
+    return np.array([_periods(f, default) for f in frequencies], dtype=float)
+
+
+@lru_cache(maxsize=AMORTIZATION_CACHE_SIZE)
+def _payment_figures(loan_amount, interest_rate, term, comp_per_year, pay_per_year):
+    n = term * pay_per_year
+    r_comp = interest_rate / comp_per_year
+    r_pay = (1 + r_comp) ** (comp_per_year / pay_per_year) - 1
+
+    if r_pay == 0:
+        payment = loan_amount / n
+    else:
+        payment = loan_amount * (r_pay * (1 + r_pay) ** n) / ((1 + r_pay) ** n - 1)
+
+    total_payment = payment * n
+    return round(payment, 1), round(total_payment), round(total_payment - loan_amount)
+
+
+def amortize(
+    loan_amount,
+    interest_rate,
+    term,
+    compounding_frequency="weekly",
+    payment_frequency="monthly",
+):
+    """
+    Payment details for one loan. Results are memoized on
+    (principal, rate, term, compounding, payment frequency), so recomputing the
+    same liability on every balancesheet change is a dict lookup.
+
+    Args:
+        loan_amount (float): Principal amount.
+        interest_rate (float): Annual interest rate (decimal, e.g. 0.05 for 5%).
+        term (int|float): Amortization term in years.
+        compounding_frequency (str): One of FREQUENCIES.
+        payment_frequency (str): One of FREQUENCIES.
+
+    Returns:
+        dict: {
+            "loan_amount", "interest_rate", "amortization_term",
+            "compounding_frequency", "payment_frequency",
+            "payment", "total_amount", "interest_payment"
+        }
+    """
+    payment, total_amount, interest_payment = _payment_figures(
+        loan_amount,
+        interest_rate,
+        term,
+        _periods(compounding_frequency, DEFAULT_COMPOUNDING_PER_YEAR),
+        _periods(payment_frequency, DEFAULT_PAYMENTS_PER_YEAR),
+    )
+    return {
+        "loan_amount": loan_amount,
+        "interest_rate": interest_rate,
+        "amortization_term": term,
+        "compounding_frequency": compounding_frequency,
+        "payment_frequency": payment_frequency,
+        "payment": payment,
+        "total_amount": total_amount,
+        "interest_payment": interest_payment,
+    }
+
+
+def _numbers(values, name):
+    # np.asarray(..., dtype=float) turns None into NaN, which would then flow
+    # silently into the payments; fail like the scalar path does instead.
+    values = np.asarray(values, dtype=object)
+    if any(value is None for value in np.ravel(values)):
+        raise TypeError(f"{name} must be numbers, got None")
+    return values.astype(float)
+
+
+def periodic_rates(
+    interest_rates,
+    compounding_frequencies="weekly",
+    payment_frequencies="monthly",
+):
+    """
+    Effective interest rate per payment period, vectorized like
+    batch_payments().
+
+    Returns:
+        numpy.ndarray: One rate per loan.
+    """
+    rate = _numbers(interest_rates, "interest_rates")
+    comp_per_year = _periods_array(compounding_frequencies, DEFAULT_COMPOUNDING_PER_YEAR)
+    pay_per_year = _periods_array(payment_frequencies, DEFAULT_PAYMENTS_PER_YEAR)
+    return (1 + rate / comp_per_year) ** (comp_per_year / pay_per_year) - 1
+
+
+def batch_payments(
+    loan_amounts,
+    interest_rates,
+    terms,
+    compounding_frequencies="weekly",
+    payment_frequencies="monthly",
+):
+    """
+    Vectorized amortization for many loans at once (all liabilities of a
+    player, or the liabilities of many players). Each argument is a scalar or
+    a sequence; they are broadcast together like NumPy arrays.
+
+    Args:
+        loan_amounts: Principal amounts.
+        interest_rates: Annual interest rates (decimal).
+        terms: Amortization terms in years.
+        compounding_frequencies: Frequency names or periods per year.
+        payment_frequencies: Frequency names or periods per year.
+
+    Returns:
+        dict: "payment", "total_amount" and "interest_payment" as float arrays,
+        rounded like amortize().
+
+    Raises:
+        TypeError: A loan amount, interest rate or term is None.
+    """
+    principal = _numbers(loan_amounts, "loan_amounts")
+    pay_per_year = _periods_array(payment_frequencies, DEFAULT_PAYMENTS_PER_YEAR)
+    n = _numbers(terms, "terms") * pay_per_year
+    r_pay = periodic_rates(interest_rates, compounding_frequencies, payment_frequencies)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth = (1 + r_pay) ** n
+        payment = np.where(
+            r_pay == 0,
+            principal / n,
+            principal * (r_pay * growth) / (growth - 1),
+        )
+
+    total_payment = payment * n
+    return {
+        "payment": _round(payment, 1),
+        "total_amount": _round(total_payment),
+        "interest_payment": _round(total_payment - principal),
+    }
+
+
+def _round(values, ndigits=0):
+    # np.round scales by 10**ndigits before rounding half to even, which can
+    # disagree with Python's correctly rounded round() on values like 250.05.
+    # Round element-wise with round() so both paths give identical figures.
+    flat = np.ravel(values).tolist()
+    rounded = [round(v, ndigits) if math.isfinite(v) else v for v in flat]
+    return np.array(rounded, dtype=float).reshape(np.shape(values))
+
+
+def iter_schedule(
+    loan_amount,
+    interest_rate,
+    term,
+    compounding_frequency="weekly",
+    payment_frequency="monthly",
+):
+    """
+    Yield the repayment schedule one period at a time.
+
+    The payment is the unrounded amortize() payment; the last period pays off
+    whatever balance is left so the schedule always ends at zero.
+
+    Yields:
+        dict: {"period", "payment", "interest", "principal", "balance"},
+        amounts rounded to cents.
+    """
+    comp_per_year = _periods(compounding_frequency, DEFAULT_COMPOUNDING_PER_YEAR)
+    pay_per_year = _periods(payment_frequency, DEFAULT_PAYMENTS_PER_YEAR)
+    periods = math.ceil(term * pay_per_year)
+    if periods <= 0:
+        return
+    r_pay = (1 + interest_rate / comp_per_year) ** (comp_per_year / pay_per_year) - 1
+    if r_pay == 0:
+        payment = loan_amount / periods
+    else:
+        payment = loan_amount * (r_pay * (1 + r_pay) ** periods) / ((1 + r_pay) ** periods - 1)
+
+    balance = loan_amount
+    for period in range(1, periods + 1):
+        interest = balance * r_pay
+        principal = payment - interest
+        if period == periods:
+            principal = balance
+        balance -= principal
+        yield {
+            "period": period,
+            "payment": round(principal + interest, 2),
+            "interest": round(interest, 2),
+            "principal": round(principal, 2),
+            "balance": round(max(balance, 0.0), 2),
+        }
+
+
+def _schedule_terms(liability):
+    return (
+        liability.get("loanAmount"),
+        liability.get("interestRate"),
+        liability.get("amortizationTerm", 1),
+        liability.get("compoundingFrequency", "monthly"),
+        liability.get("paymentFrequency", "monthly"),
+    )
+
+
+class ScheduleCache:
+    """
+    LRU cache of full schedules keyed by (username, liability name). Each
+    entry remembers the terms it was built from, so a liability whose terms
+    changed never gets a stale schedule even before it is invalidated.
+    """
+
+    def __init__(self, max_size=SCHEDULE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, terms):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != terms:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, terms, rows):
+        with self._lock:
+            self._entries[key] = (terms, rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username, name=None):
+        """Drop one liability's schedule, or every schedule of the user."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == username and name in (None, k[1])]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+schedule_cache = ScheduleCache()
+
+
+def liability_schedule(username, liability):
+    """
+    Yield a liability's schedule rows, from the cache when its terms have not
+    changed. A fresh schedule is generated lazily and cached once it has been
+    consumed to the end.
+
+    Args:
+        username (str): Owner of the liability (part of the cache key).
+        liability (dict): The liability as stored on the balancesheet.
+    """
+    key = (username, liability.get("name"))
+    terms = _schedule_terms(liability)
+    rows = schedule_cache.get(key, terms)
+    if rows is not None:
+        yield from rows
+        return
+
+    rows = []
+    for row in iter_schedule(*terms):
+        rows.append(row)
+        yield row
+    schedule_cache.put(key, terms, tuple(rows))
+
+
+def cache_info():
+    """Hit/miss counters of the memoized scalar path."""
+    info = _payment_figures.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+        "schedules_cached": len(schedule_cache),
+    }
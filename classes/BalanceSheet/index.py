@@ -1,16 +1,158 @@
 # INSERT_YOUR_REWRITE_HERE
 
 import copy
+import os
+from datetime import datetime
+from pymongo import ReturnDocument
 from app import db
-from app.utils import sum_of_values
+from app.utils import identity_map, sum_of_values
 from app.utils.db_guard import db_call_guard
-import json
+from classes.BalanceSheet.line_items import LineItems, copy_item
+from classes.BalanceSheet.amortization import (
+    amortize,
+    batch_payments,
+    liability_schedule,
+    schedule_cache,
+)
+
+
+def _asset_value(item):
+    return item.get("value", 0) or 0
+
+
+def _liability_amount(item):
+    # "loanAmount" with a fallback to "amount" for backward compatibility
+    return item.get("loanAmount", item.get("amount", 0)) or 0
+
+
+def _line_amount(item):
+    return item.get("amount", 0) or 0
+
+
+# How each list contributes to its materialized total.
+_TOTAL_FIELDS = {
+    "assets": _asset_value,
+    "liabilities": _liability_amount,
+    "income": _line_amount,
+    "expenses": _line_amount,
+}
+
+# net_worth as stored on the document. Computed by Mongo from the stored fields
+# so that a save and a concurrent bank operation ($inc on bank_balance) cannot
+# leave it out of step.
+NET_WORTH_EXPR = {
+    "$subtract": [
+        {"$add": ["$total_assets", {"$ifNull": ["$bank_balance", 0]}]},
+        "$total_liabilities",
+    ]
+}
+
+balancesheet_snapshots_collection = db["balancesheet-snapshots-collection"]
+
+# Fields recorded in each history snapshot.
+SNAPSHOT_FIELDS = (
+    "total_assets",
+    "total_liabilities",
+    "total_income",
+    "total_expenses",
+    "cashflow",
+)
+# A save takes a snapshot only when some total moved by at least this much,
+# absolute and relative to its previous value.
+SNAPSHOT_MIN_CHANGE = float(os.getenv("BALANCESHEET_SNAPSHOT_MIN_CHANGE", 1))
+SNAPSHOT_MIN_RATIO = float(os.getenv("BALANCESHEET_SNAPSHOT_MIN_RATIO", 0.01))
+SNAPSHOT_PAGE_SIZE = 50
+
+
+def _document_totals(doc):
+    """Snapshot figures of a stored document, computing totals it lacks."""
+    totals = {}
+    for field, amount in _TOTAL_FIELDS.items():
+        stored = doc.get(f"total_{field}")
+        totals[f"total_{field}"] = (
+            stored if stored is not None else sum(amount(item) for item in doc.get(field) or [])
+        )
+    cashflow = doc.get("cashflow")
+    totals["cashflow"] = (
+        cashflow if cashflow is not None else totals["total_income"] - totals["total_expenses"]
+    )
+    return totals
+
+
+# Totals of documents saved before they were materialized.
+LEGACY_TOTAL_EXPRS = {
+    "total_assets": {"$sum": "$assets.value"},
+    "total_liabilities": {"$sum": "$liabilities.loanAmount"},
+    "total_income": {"$sum": "$income.amount"},
+    "total_expenses": {"$sum": "$expenses.amount"},
+}
+
+
+def _snapshot_stages(totals, taken_at):
+    """
+    Update-pipeline stages that decide, inside the same write, whether this
+    save is a meaningful change and if so move snapshot_totals / snapshotAt /
+    snapshot_deltas on the document. They run before the new fields are set,
+    so "$total_*" still refers to the stored values.
+
+    The last snapshot's figures live on the document, so small changes add up
+    until they cross the threshold. Documents without snapshot_totals (new or
+    written before the snapshot history) always take one.
+    """
+    previous = {
+        field: {
+            "$ifNull": [
+                f"$snapshot_totals.{field}",
+                {"$ifNull": [f"${field}", LEGACY_TOTAL_EXPRS.get(field, 0)]},
+            ]
+        }
+        for field in SNAPSHOT_FIELDS
+    }
+    deltas = {
+        field: {"$subtract": [{"$literal": totals[field]}, previous[field]]}
+        for field in SNAPSHOT_FIELDS
+    }
+    meaningful = {
+        "$or": [{"$eq": [{"$ifNull": ["$snapshot_totals", None]}, None]}]
+        + [
+            {
+                "$gte": [
+                    {"$abs": deltas[field]},
+                    {
+                        "$max": [
+                            SNAPSHOT_MIN_CHANGE,
+                            {"$multiply": [{"$abs": previous[field]}, SNAPSHOT_MIN_RATIO]},
+                        ]
+                    },
+                ]
+            }
+            for field in SNAPSHOT_FIELDS
+        ]
+    }
+    return [
+        {"$set": {"_take_snapshot": meaningful}},
+        {
+            "$set": {
+                "snapshot_deltas": {"$cond": ["$_take_snapshot", deltas, "$snapshot_deltas"]},
+                "snapshot_totals": {
+                    "$cond": ["$_take_snapshot", {"$literal": totals}, "$snapshot_totals"]
+                },
+                "snapshotAt": {"$cond": ["$_take_snapshot", {"$literal": taken_at}, "$snapshotAt"]},
+            }
+        },
+    ]
+
+
+def _to_mongo_precision(value):
+    # Mongo stores datetimes with millisecond precision
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
 
 
 class BalanceSheet:
     """
     Tracks the player's assets, liabilities, income, and expenses.
-    Uses arrays (lists of objects with 'name' and 'amount') for each property.
+    Each is a LineItems container (objects with 'name' and 'amount', indexed by
+    name) that serializes to the stored list-of-dicts format.
     """
 
     def __init__(
@@ -21,12 +163,21 @@ class BalanceSheet:
         expenses=None,
         id=None,
         player=None,
+        bank_balance=None,
     ):
-        # Each field is an array of dicts
-        self.assets = copy.deepcopy(assets) if assets is not None else []
-        self.liabilities = copy.deepcopy(liabilities) if liabilities is not None else []
-        self.income = copy.deepcopy(income) if income is not None else []
-        self.expenses = copy.deepcopy(expenses) if expenses is not None else []
+        # Running totals per list, kept in step by every mutation below
+        self._totals = {field: 0 for field in _TOTAL_FIELDS}
+        # Mirror of the player's bank balance, maintained by Bank operations
+        self.bank_balance = bank_balance
+        # Totals and deltas of the latest history snapshot, as stored on the
+        # document (see prev_totals)
+        self.snapshot_totals = None
+        self.snapshot_deltas = None
+        # Each field is an ordered, name-indexed container of dicts
+        self.assets = [copy_item(item) for item in assets or []]
+        self.liabilities = [copy_item(item) for item in liabilities or []]
+        self.income = [copy_item(item) for item in income or []]
+        self.expenses = [copy_item(item) for item in expenses or []]
         self.id = id  # Optional unique identifier
         self.player = player
 
@@ -46,8 +197,60 @@ class BalanceSheet:
             self.income = loaded.income
             self.expenses = loaded.expenses
             self.id = loaded.id
+            self.bank_balance = loaded.bank_balance
+            self.snapshot_totals = loaded.snapshot_totals
+            self.snapshot_deltas = loaded.snapshot_deltas
             self.player = player
 
+    @property
+    def assets(self):
+        return self._assets
+
+    @assets.setter
+    def assets(self, value):
+        self._assets = value if isinstance(value, LineItems) else LineItems(value)
+        self._recompute_total("assets")
+
+    @property
+    def liabilities(self):
+        return self._liabilities
+
+    @liabilities.setter
+    def liabilities(self, value):
+        self._liabilities = value if isinstance(value, LineItems) else LineItems(value)
+        self._recompute_total("liabilities")
+
+    @property
+    def income(self):
+        return self._income
+
+    @income.setter
+    def income(self, value):
+        self._income = value if isinstance(value, LineItems) else LineItems(value)
+        self._recompute_total("income")
+
+    @property
+    def expenses(self):
+        return self._expenses
+
+    @expenses.setter
+    def expenses(self, value):
+        self._expenses = value if isinstance(value, LineItems) else LineItems(value)
+        self._recompute_total("expenses")
+
+    def _recompute_total(self, field):
+        value_of = _TOTAL_FIELDS[field]
+        self._totals[field] = sum(value_of(item) for item in getattr(self, f"_{field}"))
+
+    def _recompute_totals(self):
+        """Rebuild every total from the lists (after bulk in-place edits)."""
+        for field in _TOTAL_FIELDS:
+            getattr(self, f"_{field}").mark_changed()
+            self._recompute_total(field)
+
+    def _adjust_total(self, field, delta):
+        self._totals[field] += delta
+
     @property
     def id(self):
         return self._id if hasattr(self, "_id") else None
@@ -57,6 +260,8 @@ class BalanceSheet:
         self._id = value
 
     def _find_item(self, arr, name):
+        if isinstance(arr, LineItems):
+            return arr.find(name)
         for i, item in enumerate(arr):
             if item.get("name") == name:
                 return i
@@ -67,8 +272,10 @@ class BalanceSheet:
         if idx is not None:
             self.assets[idx]["income"] += income
             self.assets[idx]["value"] += value
+            self._adjust_total("assets", value)
         else:
             self.assets.append({"name": name, "income": income, "value": value})
+            self._adjust_total("assets", value)
             if income > 0:
                 self.add_all_asset_incomes_to_income(
                     {"name": name, "income": income, "value": value}, username
@@ -84,6 +291,7 @@ class BalanceSheet:
         """
         if data["income"] > 0:
             self.income.append({"name": data["name"], "amount": data["income"]})
+            self._adjust_total("income", data["income"])
         else:
             pass
 
@@ -91,13 +299,14 @@ class BalanceSheet:
         idx = self._find_item(self.assets, name)
         if idx is not None:
             if amount is None:
-                self.assets.pop(idx)
+                self._adjust_total("assets", -_asset_value(self.assets.pop(idx)))
             else:
                 self.assets[idx]["amount"] -= amount
                 if self.assets[idx].get("amount", 0) <= 0:
-                    self.assets.pop(idx)
+                    self._adjust_total("assets", -_asset_value(self.assets.pop(idx)))
 
-            self.income = [i for i in self.income if i.get("name") != name]
+            removed = self.income.remove_names([name])
+            self._adjust_total("income", -sum(_line_amount(item) for item in removed))
 
             if username is not None:
                 self.save_to_db(username)
@@ -115,6 +324,7 @@ class BalanceSheet:
         if idx is not None:
             # Update existing liability, sum compatible fields, update/overwrite fields with new values if provided
             self.liabilities[idx]["loanAmount"] += loanAmount
+            self._adjust_total("liabilities", loanAmount)
             self.liabilities[idx]["interestRate"] = (
                 interestRate  # always update to latest or TO DO: handle as needed
             )
@@ -130,6 +340,7 @@ class BalanceSheet:
             for k, v in kwargs.items():
                 liability[k] = v
             self.liabilities.append(liability)
+            self._adjust_total("liabilities", _liability_amount(liability))
             self.add_liability_expenses_to_expenses(liability)
 
         if username is not None:
@@ -158,11 +369,13 @@ class BalanceSheet:
                 paymentFrequency=pay_freq,
             )
             payment = payment_info.get("payment", 0)
-            existing = next((e for e in self.expenses if e.get("name") == name), None)
+            existing = self.expenses.get(name)
             if existing:
+                self._adjust_total("expenses", payment - _line_amount(existing))
                 existing["amount"] = payment
             else:
                 self.expenses.append({"name": name, "amount": payment})
+                self._adjust_total("expenses", payment)
 
     def amortization_calculation(
         self,
@@ -173,7 +386,8 @@ class BalanceSheet:
         paymentFrequency="monthly",
     ):
         """
-        Calculate amortization schedule/payment details.
+        Calculate amortization schedule/payment details (memoized, see
+        classes/BalanceSheet/amortization.py).
 
         Args:
             loanAmount (float): Principal amount.
@@ -189,55 +403,25 @@ class BalanceSheet:
                 "payment", "total_amount", "interest_payment"
             }
         """
-        freq_map = {
-            "yearly": 1,
-            "semiannual": 2,
-            "quarterly": 4,
-            "monthly": 12,
-            "weekly": 52,
-            "daily": 365,
-        }
-
-        compPerYear = freq_map.get(compoundingFrequency, 52)
-        payPerYear = freq_map.get(paymentFrequency, 12)
-        n = amortizationTerm * payPerYear
-        r_comp = interestRate / compPerYear
-        compPerPay = compPerYear / payPerYear
-        r_pay = (1 + r_comp) ** compPerPay - 1
-
-        P = loanAmount
-
-        if r_pay == 0:
-            payment = P / n
-        else:
-            payment = P * (r_pay * (1 + r_pay) ** n) / ((1 + r_pay) ** n - 1)
-
-        totalPayment = payment * n
-        totalInterest = totalPayment - loanAmount
-
-        return {
-            "loan_amount": loanAmount,
-            "interest_rate": interestRate,
-            "amortization_term": amortizationTerm,
-            "compounding_frequency": compoundingFrequency,
-            "payment_frequency": paymentFrequency,
-            "payment": round(payment, 1),
-            "total_amount": round(totalPayment),
-            "interest_payment": round(totalInterest),
-        }
+        return amortize(
+            loanAmount,
+            interestRate,
+            amortizationTerm,
+            compoundingFrequency,
+            paymentFrequency,
+        )
 
     def payable_liabilities(self, liabilities):
-        total_payment = 0
-        for liab in liabilities:
-            amm = self.amortization_calculation(
-                liab.get("loanAmount"),
-                liab.get("interestRate"),
-                liab.get("amortizationTerm"),
-                liab.get("compoundingFrequency"),
-                liab.get("paymentFrequency"),
-            )
-            total_payment += amm.get("payment")
-        return {"total_payment": total_payment}
+        if not liabilities:
+            return {"total_payment": 0}
+        payments = batch_payments(
+            [liab.get("loanAmount") for liab in liabilities],
+            [liab.get("interestRate") for liab in liabilities],
+            [liab.get("amortizationTerm") for liab in liabilities],
+            [liab.get("compoundingFrequency") for liab in liabilities],
+            [liab.get("paymentFrequency") for liab in liabilities],
+        )
+        return {"total_payment": float(payments["payment"].sum())}
 
     def remove_liability(self, name, loanAmount=None, username=None):
         """
@@ -246,13 +430,15 @@ class BalanceSheet:
         idx = self._find_item(self.liabilities, name)
         if idx is not None:
             if loanAmount is None:
-                self.liabilities.pop(idx)
+                self._adjust_total("liabilities", -_liability_amount(self.liabilities.pop(idx)))
             else:
                 self.liabilities[idx]["loanAmount"] -= loanAmount
+                self._adjust_total("liabilities", -loanAmount)
                 if self.liabilities[idx]["loanAmount"] <= 0:
-                    self.liabilities.pop(idx)
+                    self._adjust_total("liabilities", -_liability_amount(self.liabilities.pop(idx)))
 
-            self.liabilities = [i for i in self.liabilities if i.get("name") != name]
+            removed = self.liabilities.remove_names([name])
+            self._adjust_total("liabilities", -sum(_liability_amount(item) for item in removed))
 
             if username is not None:
                 self.save_to_db(username)
@@ -263,6 +449,7 @@ class BalanceSheet:
             self.income[idx]["amount"] += amount
         else:
             self.income.append({"name": name, "amount": amount})
+        self._adjust_total("income", amount)
         if username is not None:
             self.save_to_db(username)
 
@@ -270,11 +457,12 @@ class BalanceSheet:
         idx = self._find_item(self.income, name)
         if idx is not None:
             if amount is None:
-                self.income.pop(idx)
+                self._adjust_total("income", -_line_amount(self.income.pop(idx)))
             else:
                 self.income[idx]["amount"] -= amount
+                self._adjust_total("income", -amount)
                 if self.income[idx]["amount"] <= 0:
-                    self.income.pop(idx)
+                    self._adjust_total("income", -_line_amount(self.income.pop(idx)))
             if username is not None:
                 self.save_to_db(username)
 
@@ -284,6 +472,7 @@ class BalanceSheet:
             self.expenses[idx]["amount"] += amount
         else:
             self.expenses.append({"name": name, "amount": amount})
+        self._adjust_total("expenses", amount)
         if username is not None:
             self.save_to_db(username)
 
@@ -291,54 +480,82 @@ class BalanceSheet:
         idx = self._find_item(self.expenses, name)
         if idx is not None:
             if amount is None:
-                self.expenses.pop(idx)
+                self._adjust_total("expenses", -_line_amount(self.expenses.pop(idx)))
             else:
                 self.expenses[idx]["amount"] -= amount
+                self._adjust_total("expenses", -amount)
                 if self.expenses[idx]["amount"] <= 0:
-                    self.expenses.pop(idx)
+                    self._adjust_total("expenses", -_line_amount(self.expenses.pop(idx)))
             if username is not None:
                 self.save_to_db(username)
 
+    def set_asset_value(self, name, value):
+        """
+        Set the value of an existing asset, keeping total_assets in step.
+
+        Returns:
+            bool: False if no asset with that name exists.
+        """
+        idx = self._find_item(self.assets, name)
+        if idx is None:
+            return False
+        self._adjust_total("assets", value - _asset_value(self.assets[idx]))
+        self.assets[idx]["value"] = value
+        return True
+
     def total_assets(self):
-        return sum(item["value"] for item in self.assets)
+        return self._totals["assets"]
 
     def total_liabilities(self):
-        # Sum using "loanAmount" key, fallback to "amount" for backward compatibility
-        return sum(
-            item.get("loanAmount", item.get("amount", 0)) for item in self.liabilities
-        )
+        return self._totals["liabilities"]
 
     def total_income(self):
-        return sum(item["amount"] for item in self.income)
+        return self._totals["income"]
 
     def total_expenses(self):
-        return sum(item["amount"] for item in self.expenses)
+        return self._totals["expenses"]
+
+    def _load_bank_balance(self):
+        # Only for documents written before bank_balance was materialized; the
+        # next save stores it and Bank operations keep it current from then on.
+        _bank = identity_map.find_one(
+            db["bank-collection"],
+            ("customer", self.player.username),
+            {"customer": self.player.username},
+        )
+        return (_bank or {}).get("balance", 0)
 
     def net_worth(self):
-        """Assets minus liabilities."""
-        if self.player:
-            _player = self.player.load_from_db(self.player.username).to_dict()
-            _bank = db["bank-collection"]
-            _bank = _bank.find_one({"customer": self.player.username})
-            return (self.total_assets() + _bank["balance"]) - self.total_liabilities()
-        else:
+        """Assets plus bank balance minus liabilities."""
+        if not self.player:
             return 0
+        if self.bank_balance is None:
+            self.bank_balance = self._load_bank_balance()
+        return (self.total_assets() + self.bank_balance) - self.total_liabilities()
 
     def cashflow(self):
         """Income minus liabilities."""
         return self.total_income() - self.total_expenses()
 
+    def _to_document(self):
+        """The persisted fields: the lists plus their materialized totals."""
+        return {
+            "assets": self.assets.snapshot(),
+            "liabilities": self.liabilities.snapshot(),
+            "income": self.income.snapshot(),
+            "expenses": self.expenses.snapshot(),
+            "total_assets": self.total_assets(),
+            "total_liabilities": self.total_liabilities(),
+            "total_income": self.total_income(),
+            "total_expenses": self.total_expenses(),
+            "cashflow": self.cashflow(),
+        }
+
     def to_dict(self):
         result = {
-            "assets": copy.deepcopy(self.assets),
-            "liabilities": copy.deepcopy(self.liabilities),
-            "income": copy.deepcopy(self.income),
-            "expenses": copy.deepcopy(self.expenses),
+            **self._to_document(),
             "net_worth": self.net_worth(),
-            "cashflow": self.cashflow(),
-            "prev_balancesheet": self.get_prev_balancesheet(
-                getattr(self.player, "username", None)
-            ),
+            "prev_totals": self.get_prev_totals(getattr(self.player, "username", None)),
             "id": self.id,
         }
         if self.id is not None:
@@ -354,25 +571,87 @@ class BalanceSheet:
             liability.get("paymentFrequency"),
         )
 
-    # INSERT_YOUR_CODE
-    def get_prev_balancesheet(self, username=None):
+    def iter_liability_schedule(self, name, username=None):
+        """
+        Period-by-period repayment rows (period, payment, interest, principal,
+        balance) for the named liability, generated lazily and cached per
+        liability.
+
+        Returns:
+            generator | None: None if there is no liability with that name.
+        """
+        idx = self._find_item(self.liabilities, name)
+        if idx is None:
+            return None
+        username = username or getattr(self.player, "username", None)
+        return liability_schedule(username, self.liabilities[idx])
+
+    def get_prev_totals(self, username=None):
         """
-        Fetch the previous balancesheet for the specified user (or self.player if present).
+        Totals of the balancesheet before its last meaningful change, read from
+        the latest history snapshot (its figures minus its deltas).
+
+        This replaces get_prev_balancesheet() and the ``prev_balancesheet``
+        field of to_dict(), which held a copy of the whole previous sheet; the
+        snapshots only keep totals, so to_dict() reports them as ``prev_totals``.
 
         Returns:
-            dict: The previous balancesheet as a dictionary, or None if not found.
+            dict: {"total_assets", "total_liabilities", "total_income",
+            "total_expenses", "cashflow", "changedAt"}, or None without history.
         """
         # Use self.player.username if username not provided
         target_username = username or getattr(self.player, "username", None)
         if not target_username:
             return None
-        collection = db["balancesheet-collection"]
-        bs = collection.find_one({"username": target_username}, sort=[("_id", -1)])
-        prev_bs = bs.get("prev_balancesheet")
+        snapshot = balancesheet_snapshots_collection.find_one(
+            {"username": target_username}, sort=[("takenAt", -1), ("_id", -1)]
+        )
+        if not snapshot:
+            return None
+        deltas = snapshot.get("deltas", {})
+        prev = {
+            field: snapshot.get(field, 0) - deltas.get(field, 0) for field in SNAPSHOT_FIELDS
+        }
+        taken_at = snapshot.get("takenAt")
+        prev["changedAt"] = taken_at.isoformat() if isinstance(taken_at, datetime) else taken_at
+        return prev
 
-        if prev_bs:
-            return json.loads(prev_bs)
-        return None
+    def prev_totals(self, username=None):
+        """
+        Like get_prev_totals() (without changedAt), but computed from the
+        latest snapshot's totals and deltas kept on the loaded document, so it
+        costs no query for balancesheets saved since those fields exist.
+        """
+        if self.snapshot_totals is None:
+            return self.get_prev_totals(username)
+        deltas = self.snapshot_deltas or {}
+        return {
+            field: (self.snapshot_totals.get(field, 0) or 0) - (deltas.get(field, 0) or 0)
+            for field in SNAPSHOT_FIELDS
+        }
+
+    @classmethod
+    def load_history(cls, username, limit=SNAPSHOT_PAGE_SIZE, before=None):
+        """
+        Snapshot history of a user's balancesheet, newest first.
+
+        Args:
+            username (str): The balancesheet owner.
+            limit (int): Maximum number of snapshots.
+            before (datetime): Only snapshots taken before this time.
+
+        Returns:
+            list[dict]: {"takenAt", totals..., "deltas"} records.
+        """
+        query = {"username": username}
+        if before is not None:
+            query["takenAt"] = {"$lt": before}
+        cursor = (
+            balancesheet_snapshots_collection.find(query, {"_id": 0, "username": 0})
+            .sort([("takenAt", -1), ("_id", -1)])
+            .limit(limit)
+        )
+        return list(cursor)
 
     def update_liability_in_db(self, username, updates):
         """
@@ -384,50 +663,34 @@ class BalanceSheet:
         # Build a lookup from update liabilities list by name
         updates_by_name = {liab.get("name"): liab for liab in updates if "name" in liab}
 
-        # Replace or add liabilities: build new liabilities list
-        new_liabilities = []
-
-        # Track existing names found in updates
-        updated_names = set()
-
-        # Replace existing liabilities if in updates, else keep as is
-        for liab in self.liabilities:
-            liab_name = liab.get("name")
-            if liab_name in updates_by_name:
-                # Use updated liability
-                new_liabilities.append(copy.deepcopy(updates_by_name[liab_name]))
-                updated_names.add(liab_name)
-            else:
-                # Keep original if not updated
-                new_liabilities.append(copy.deepcopy(liab))
-
-        # Add any new liabilities in updates not already present
+        # Replace existing liabilities in place, append new ones
         for name, liab in updates_by_name.items():
-            if name not in updated_names and name:
-                new_liabilities.append(copy.deepcopy(liab))
+            if name:
+                self.liabilities.upsert(copy.deepcopy(liab))
 
-        self.liabilities = new_liabilities
+        # Cached schedules of the changed liabilities are out of date.
+        for name in updates_by_name:
+            schedule_cache.invalidate(username, name)
 
-        for liability in self.liabilities:
-            if liability.get("loanAmount") <= 0:
-                # Remove the liability if loanAmount <= 0, along with matching expenses
-                liab_name = liability.get("name")
-                self.liabilities = [
-                    liab for liab in self.liabilities if liab.get("name") != liab_name
-                ]
-                self.expenses = [e for e in self.expenses if e.get("name") != liab_name]
-                continue
+        # Paid-off liabilities go, along with their expenses
+        paid_off = {
+            liab.get("name") for liab in self.liabilities if liab.get("loanAmount") <= 0
+        }
+        self.liabilities.remove_names(paid_off)
+        self.expenses.remove_names(paid_off)
 
+        # Replace each liability's expense entries with one carrying its payment
+        payments = []
+        for liability in self.liabilities:
             ammotization = self.get_ammotization_of_liablity(liability)
-            # Remove any existing expense entry with same name as liability
-            self.expenses = [
-                i for i in self.expenses if i.get("name", None) != liability.get("name")
-            ]
+            payments.append((liability.get("name"), ammotization.get("payment") if ammotization else None))
+        self.expenses.remove_names(name for name, _ in payments)
+        for name, payment in payments:
             # Only add an expense if payment value is not None
-            payment = ammotization.get("payment") if ammotization else None
             if payment is not None:
-                self.expenses.append({"name": liability.get("name"), "amount": payment})
+                self.expenses.append({"name": name, "amount": payment})
 
+        self._recompute_totals()
         self.save_to_db(username)
         return self
 
@@ -449,55 +712,84 @@ class BalanceSheet:
 
         # Build a lookup for incoming assets by name
         updates_by_name = {a["name"]: a for a in updates if "name" in a}
-        # Map current assets by name
-        current_assets_by_name = {a.get("name"): a for a in self.assets if "name" in a}
 
         # Update existing assets or add new ones
         for name, updated_asset in updates_by_name.items():
-            if name in current_assets_by_name:
-                current_assets_by_name[name].update(updated_asset)
+            current = self.assets.get(name)
+            if current is not None:
+                current.update(updated_asset)
             else:
                 self.assets.append(updated_asset)
 
         # No deletion: assets not in updates are preserved
 
+        self._recompute_totals()
         self.save_to_db(username)
         return self
 
-    def save_to_db(self, username):
+    def save_to_db(self, username, session=None):
         """
         Save the current balance sheet to the database under the given username.
         If a record exists, update it; otherwise, insert a new one.
+        Pass ``session`` to make the save part of a transaction.
+
+        The save is one find_one_and_update: the materialized totals are
+        written with the lists, bank_balance (owned by Bank operations) is only
+        seeded when the document does not have it yet, net_worth is derived
+        from the stored fields by Mongo, and the snapshot decision is made by
+        the same pipeline. The returned document carries the _id and tells
+        whether a history snapshot has to be recorded.
         """
 
-        with db_call_guard("BalanceSheet.save_to_db"):
+        with db_call_guard("BalanceSheet.save_to_db", key=username):
             collection = db["balancesheet-collection"]
-            data = self.to_dict()
-            data.pop("prev_balancesheet", None)
-
-            prev_balancesheet = collection.find_one({"username": username})
-
-            current_cashflow = data.get("cashflow", 0)
-            prev_cashflow = prev_balancesheet.get("cashflow", 0)
-
-            if not prev_balancesheet or (current_cashflow != prev_cashflow):
-                if not prev_balancesheet:
-                    prev_balancesheet = json.dumps(data)
-                prev_balancesheet = {**prev_balancesheet}
-                prev_balancesheet.pop("_id", None)
-                prev_balancesheet.pop("prev_balancesheet", None)
-                data["prev_balancesheet"] = json.dumps(prev_balancesheet)
+            data = self._to_document()
+            totals = _document_totals(data)
+            taken_at = _to_mongo_precision(datetime.utcnow())
 
             data["username"] = username
             # Only use _id if it exists
             if self.id is not None:
                 data["_id"] = self.id
-            collection.update_one({"username": username}, {"$set": data}, upsert=True)
-            # After upsert, assign _id if necessary
+            fields = {key: {"$literal": value} for key, value in data.items()}
+            # Version read by the month close, so it does not overwrite this save
+            fields["updatedAt"] = {"$literal": taken_at}
+            if self.bank_balance is not None:
+                fields["bank_balance"] = {
+                    "$ifNull": ["$bank_balance", {"$literal": self.bank_balance}]
+                }
+            doc = collection.find_one_and_update(
+                {"username": username},
+                _snapshot_stages(totals, taken_at)
+                + [
+                    {"$set": fields},
+                    {"$set": {"net_worth": NET_WORTH_EXPR}},
+                    # History lives in the snapshot collection
+                    {"$project": {"prev_balancesheet": 0, "_take_snapshot": 0}},
+                ],
+                projection={"_id": 1, "snapshotAt": 1, "snapshot_totals": 1, "snapshot_deltas": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                session=session,
+            )
+            identity_map.evict(collection.name)
+            if doc is None:
+                return
             if self.id is None:
-                doc = collection.find_one({"username": username})
-                if doc and "_id" in doc:
-                    self.id = doc["_id"]
+                self.id = doc.get("_id")
+            self.snapshot_totals = doc.get("snapshot_totals")
+            self.snapshot_deltas = doc.get("snapshot_deltas")
+            if doc.get("snapshotAt") == taken_at:
+                deltas = doc.get("snapshot_deltas") or {}
+                balancesheet_snapshots_collection.insert_one(
+                    {
+                        "username": username,
+                        "takenAt": taken_at,
+                        **totals,
+                        "deltas": {field: delta for field, delta in deltas.items() if delta != 0},
+                    },
+                    session=session,
+                )
 
     @classmethod
     def load_from_db(cls, username=None, id=None):
@@ -506,7 +798,7 @@ class BalanceSheet:
         Returns a BalanceSheet instance, or None if not found.
         """
 
-        with db_call_guard("BalanceSheet.load_from_db"):
+        with db_call_guard("BalanceSheet.load_from_db", key=username if username is not None else id):
             collection = db["balancesheet-collection"]
             query = {}
             if id is not None:
@@ -519,7 +811,17 @@ class BalanceSheet:
                     "Either 'username' or 'id' must be provided to load BalanceSheet."
                 )
 
-            doc = collection.find_one(query)
+            key = ("_id", id) if id is not None else ("username", username)
+            doc = identity_map.get(collection.name, key)
+            if doc is None:
+                doc = collection.find_one(query)
+                if doc:
+                    identity_map.put(
+                        collection.name,
+                        doc,
+                        ("_id", doc.get("_id")),
+                        ("username", doc.get("username")),
+                    )
             if doc:
                 _id = doc.pop("_id", None)
                 doc.pop("username", None)
@@ -547,5 +849,8 @@ class BalanceSheet:
             id=d.get(
                 "id", None
             ),  # Accept id from dict if available (as string or ObjectId)
+            bank_balance=d.get("bank_balance"),
         )
+        instance.snapshot_totals = d.get("snapshot_totals")
+        instance.snapshot_deltas = d.get("snapshot_deltas")
         return instance
@@ -0,0 +1,148 @@
+import copy
+from collections.abc import MutableSequence
+
+
+def copy_item(item):
+    """Copy a line item: a new dict, deep-copying only nested values."""
+    return {
+        key: copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+        for key, value in item.items()
+    }
+
+
+class LineItems(MutableSequence):
+    """
+    Ordered balancesheet line items ({"name", ...} dicts) with a name index.
+
+    Behaves like the list it replaces (indexing, append, pop, iteration,
+    comprehensions), so callers and the stored list-of-dicts format do not
+    change, but lookups by name are dict lookups instead of list scans.
+
+    snapshot() returns fresh copies of the items on every call, so items
+    edited in place (through iteration, indexing or get()) are always picked
+    up, and what to_dict() hands out can be modified without touching the
+    container or later snapshots.
+    """
+
+    def __init__(self, items=None):
+        self._items = list(items) if items is not None else []
+        self._index = None
+
+    # -- MutableSequence ---------------------------------------------------
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return LineItems(self._items[i])
+        return self._items[i]
+
+    def __setitem__(self, i, item):
+        self._items[i] = item
+        self._changed()
+
+    def __delitem__(self, i):
+        del self._items[i]
+        self._changed()
+
+    def insert(self, i, item):
+        self._items.insert(i, item)
+        self._changed()
+
+    def append(self, item):
+        # Appending keeps the index valid: only a new name needs adding.
+        self._items.append(item)
+        if self._index is not None:
+            self._index.setdefault(item.get("name"), len(self._items) - 1)
+
+    def __eq__(self, other):
+        if isinstance(other, LineItems):
+            return self._items == other._items
+        if isinstance(other, list):
+            return self._items == other
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LineItems({self._items!r})"
+
+    def __deepcopy__(self, memo):
+        return LineItems([copy.deepcopy(item, memo) for item in self._items])
+
+    # -- name index --------------------------------------------------------
+
+    def _changed(self):
+        self._index = None
+
+    def mark_changed(self):
+        """Drop the cached name index after in-place edits of item names."""
+        self._changed()
+
+    def _name_index(self):
+        if self._index is None:
+            index = {}
+            for i, item in enumerate(self._items):
+                index.setdefault(item.get("name"), i)
+            self._index = index
+        return self._index
+
+    def find(self, name):
+        """Position of the first item with this name, or None."""
+        return self._name_index().get(name)
+
+    def get(self, name):
+        """The first item with this name (live, may be modified), or None."""
+        i = self.find(name)
+        if i is None:
+            return None
+        return self._items[i]
+
+    def upsert(self, item):
+        """
+        Replace the item with the same name in place, or append.
+
+        Names are meant to be unique; if earlier saves left duplicates, the
+        first one is replaced and the later ones are dropped, so the name ends
+        up with exactly this item.
+
+        Returns:
+            dict | None: The replaced (first) item, or None if it was appended.
+        """
+        name = item.get("name")
+        i = self.find(name)
+        if i is None:
+            self.append(item)
+            return None
+        previous = self._items[i]
+        self._items[i] = item
+        duplicates = [j for j in range(i + 1, len(self._items)) if self._items[j].get("name") == name]
+        if duplicates:
+            for j in reversed(duplicates):
+                del self._items[j]
+            self._changed()
+        return previous
+
+    def remove_names(self, names):
+        """
+        Remove every item whose name is in ``names`` in one pass.
+
+        Returns:
+            list: The removed items.
+        """
+        names = set(names)
+        kept, removed = [], []
+        for item in self._items:
+            (removed if item.get("name") in names else kept).append(item)
+        if removed:
+            self._items = kept
+            self._changed()
+        return removed
+
+    # -- serialization -----------------------------------------------------
+
+    def snapshot(self):
+        """The items as a new list of new copies, for to_dict and the database."""
+        return [copy_item(item) for item in self._items]
@@ -0,0 +1,192 @@
+from datetime import datetime
+
+import numpy as np
+
+# Bump when a rule below changes: every cached factor of an older version is
+# recomputed on the next read (or by `flask --app wsgi rescore-credit`).
+CREDIT_RULES_VERSION = 1
+
+BASE_SCORE = 500  # more realistic starting point
+MIN_SCORE = 300
+MAX_SCORE = 850
+
+# Score a loan needs by its size relative to the player's income: a loan
+# below REQUIRED_SCORE_RATIOS[i] times the income needs REQUIRED_SCORES[i],
+# anything larger the last score.
+REQUIRED_SCORE_RATIOS = (0.1, 0.3, 0.6, 1.0)
+REQUIRED_SCORES = (500, 580, 650, 700, 760)
+
+# Factors in the order they are applied.
+FACTORS = ("late_payments", "dti", "cashflow", "liquidity", "trend")
+
+
+def _late_payments(inputs):
+    return -min(inputs["late_payments"] * 30, 150)
+
+
+def _dti(inputs):
+    dti = inputs["liabilities"] / max(inputs["income"], 1)
+    if dti < 0.3:
+        return 120
+    if dti < 0.5:
+        return 60
+    if dti < 0.8:
+        return -50
+    return -120
+
+
+def _cashflow(inputs):
+    income = max(inputs["income"], 1)
+    cash_flow = income - inputs["expenses"]
+    if cash_flow > 0:
+        return 80
+    return -min(abs(cash_flow) / income * 100, 100)
+
+
+def _liquidity(inputs):
+    return 60 if inputs["assets"] > inputs["liabilities"] else -80
+
+
+def _trend(inputs):
+    previous = inputs["previous"]
+    if not previous:
+        return 0
+    income = max(inputs["income"], 1)
+    liabilities = inputs["liabilities"]
+    expenses = inputs["expenses"]
+    previous_liabilities = previous["total_liabilities"]
+    previous_income = previous["total_income"]
+    previous_expenses = previous["total_expenses"]
+
+    points = 0
+    # Rising debt
+    if liabilities > previous_liabilities:
+        increase_ratio = (liabilities - previous_liabilities) / max(previous_liabilities, 1)
+        points -= min(increase_ratio * 100, 80)
+    # Income drop
+    if income < previous_income:
+        drop_ratio = (previous_income - income) / max(previous_income, 1)
+        points -= min(drop_ratio * 120, 100)
+    # Expense growth
+    if expenses > previous_expenses:
+        points -= min((expenses - previous_expenses) / income * 50, 50)
+    # Improvement bonus (good trends)
+    if (
+        liabilities < previous_liabilities
+        and income >= previous_income
+        and expenses <= previous_expenses
+    ):
+        points += 50
+    return points
+
+
+_RULES = {
+    "late_payments": _late_payments,
+    "dti": _dti,
+    "cashflow": _cashflow,
+    "liquidity": _liquidity,
+    "trend": _trend,
+}
+
+
+def factor_inputs(late_payments, totals, previous=None):
+    """
+    The inputs each factor depends on.
+
+    Args:
+        late_payments (int): The bank's late payment count.
+        totals (dict): total_assets, total_liabilities, total_income and
+            total_expenses of the balancesheet.
+        previous (dict): The same totals before the last meaningful change,
+            or None without history.
+
+    Returns:
+        dict: {factor: inputs}
+    """
+    assets = totals.get("total_assets", 0) or 0
+    liabilities = totals.get("total_liabilities", 0) or 0
+    income = totals.get("total_income", 0) or 0
+    expenses = totals.get("total_expenses", 0) or 0
+    if previous:
+        previous = {
+            field: previous.get(field, 0) or 0
+            for field in ("total_liabilities", "total_income", "total_expenses")
+        }
+    return {
+        "late_payments": {"late_payments": late_payments or 0},
+        "dti": {"liabilities": liabilities, "income": income},
+        "cashflow": {"income": income, "expenses": expenses},
+        "liquidity": {"assets": assets, "liabilities": liabilities},
+        "trend": {
+            "liabilities": liabilities,
+            "income": income,
+            "expenses": expenses,
+            "previous": previous or None,
+        },
+    }
+
+
+def score_factors(inputs, cached=None, force=False):
+    """
+    Score from per-factor inputs, reusing the cached points of every factor
+    whose inputs did not change.
+
+    Args:
+        inputs (dict): factor_inputs() output.
+        cached (dict): The stored result of a previous call, or None.
+        force (bool): Recompute every factor.
+
+    Returns:
+        tuple: (result, recalculated) where result is the document to store,
+        {"score", "version", "factors": {factor: {"points", "inputs"}},
+        "computedAt"}, and recalculated lists the factors that were computed.
+    """
+    if not cached or cached.get("version") != CREDIT_RULES_VERSION:
+        cached = {}
+    cached_factors = cached.get("factors") or {}
+
+    factors, recalculated = {}, []
+    for name in FACTORS:
+        previous = cached_factors.get(name)
+        if not force and previous and previous.get("inputs") == inputs[name]:
+            factors[name] = previous
+            continue
+        factors[name] = {"points": _RULES[name](inputs[name]), "inputs": inputs[name]}
+        recalculated.append(name)
+
+    score = BASE_SCORE + sum(factor["points"] for factor in factors.values())
+    result = {
+        "score": max(MIN_SCORE, min(score, MAX_SCORE)),
+        "version": CREDIT_RULES_VERSION,
+        "factors": factors,
+        "computedAt": cached.get("computedAt") if not recalculated else datetime.utcnow(),
+    }
+    return result, recalculated
+
+
+def required_scores(loan_amounts, income):
+    """
+    Credit score required for each loan amount (scalar or array).
+
+    Returns:
+        numpy.ndarray: One required score per amount.
+    """
+    loan_ratio = np.asarray(loan_amounts, dtype=float) / max(income, 1)
+    return np.asarray(REQUIRED_SCORES)[
+        np.searchsorted(REQUIRED_SCORE_RATIOS, loan_ratio, side="right")
+    ]
+
+
+def approval_limit(score, income):
+    """
+    Loan amount below which a player with this score is approved, or None
+    when every amount is.
+    """
+    if score >= REQUIRED_SCORES[-1]:
+        return None
+    limit = 0.0
+    for ratio, required in zip(REQUIRED_SCORE_RATIOS, REQUIRED_SCORES):
+        if score < required:
+            break
+        limit = ratio * max(income, 1)
+    return limit
@@ -1,24 +1,33 @@
-import json
+from datetime import datetime, timedelta
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
 from app import db
-from app.utils import sum_of_values
+from app.utils import identity_map
+from classes.Bank.credit_score import factor_inputs, required_scores, score_factors
 
 bank_collection = db["bank-collection"]
-bank_logs_collection = db["bank-logs-collection"]
+bank_ledger_collection = db["bank-ledger-collection"]
+balancesheet_collection = db["balancesheet-collection"]
+
+# Number of recent operations kept inline on the bank document (Banklog).
+# The full history lives in bank-ledger-collection, one document per operation.
+BANK_LOG_TAIL = 20
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 200
+
+
+class InsufficientFunds(ValueError):
+    """The balance does not cover a debit made with require_funds."""
 
 
 class Bank:
     def __init__(self, initial_balance: float = 1000, customer=None):
         self._player = customer
         self.late_payments = 0  # Default property; will load actual from DB if present
-        self.bank = bank_collection.find_one(
-            {"customerId": getattr(self._player, "id", None)}
-        )
-        # Load logs from bank ID if available
-        if self.bank and "_id" in self.bank:
-            logs_doc = bank_logs_collection.find_one({"bankId": self.bank["_id"]})
-            self.bank_logs = logs_doc["logs"] if logs_doc and "logs" in logs_doc else []
-        else:
-            self.bank_logs = []
+        self.bank = self._find_bank_doc(getattr(self._player, "id", None))
+        # Recent operations come from the inline Banklog tail
+        self.bank_logs = (self.bank or {}).get("Banklog", [])
         self._operation_logs = self.bank_logs
         self._balance = (
             self.bank["balance"]
@@ -28,6 +37,32 @@ class Bank:
         # Load late_payments from DB if present (make sure load_bank_data handles it)
         self.load_bank_data()
 
+    @classmethod
+    def from_document(cls, customer, bank_doc):
+        """
+        Build a Bank from an already fetched bank-collection document without
+        touching the db (used by joined reads such as the player profile).
+        Only the inline Banklog tail is available; use get_ledger() for history.
+        """
+        bank = cls.__new__(cls)
+        bank._player = customer
+        bank.bank = bank_doc
+        bank._balance = (bank_doc or {}).get("balance", 0)
+        bank.late_payments = (bank_doc or {}).get("late_payments", 0)
+        bank._operation_logs = (bank_doc or {}).get("Banklog", [])
+        bank.bank_logs = bank._operation_logs
+        return bank
+
+    @staticmethod
+    def _find_bank_doc(customer_id):
+        return identity_map.find_one(
+            bank_collection, ("customerId", customer_id), {"customerId": customer_id}
+        )
+
+    @staticmethod
+    def _evict_cached_docs():
+        identity_map.evict(bank_collection.name)
+
     def _create_new_account(self):
         data = {
             "balance": self._balance,
@@ -39,63 +74,380 @@ class Bank:
         }
         return data
 
-    def _log_operation(self, entry: dict):
-        log_entry = entry.copy()
-        from datetime import datetime
+    def _customer_id(self):
+        customer_id = getattr(self._player, "_id", None)
+        if customer_id is None and self._player is not None:
+            player = self._player.get_player(self._player.username)
+            customer_id = getattr(player, "_id", None)
+        if customer_id is None:
+            raise ValueError("Cannot update bank data: customer ID not found.")
+        return customer_id
+
+    def _apply_operation(self, delta, entry, require_funds=False, late_payments_delta=0, operation_id=None):
+        """
+        Atomically apply a balance change and append it to the Banklog tail.
+
+        One conditional update replaces the old read-modify-write cycle
+        (replace_one of the whole document followed by a reload), so payments
+        made concurrently from different workers cannot overwrite each other.
+        The balance change is an ``$inc``; withdrawals are guarded with
+        ``balance >= amount`` in the filter; the Banklog ``$push`` is capped with
+        ``$slice``. Both are expressed as an update pipeline ($add /
+        $concatArrays) so the log entry can record the post-update balance in
+        the same write.
+
+        Args:
+            delta (float): Signed change to the balance.
+            entry (dict): Log entry (type, amount, ...); date/balanceAfter are added.
+            require_funds (bool): Fail unless the balance covers ``-delta``.
+            late_payments_delta (int): Signed change to late_payments.
+            operation_id (str): Optional; applies the operation at most once.
+                A second call with the same id (a retried task) finds the
+                ledger or Banklog entry of the first and returns it instead.
+
+        Returns:
+            dict: The log entry as stored.
+
+        Raises:
+            InsufficientFunds: ``require_funds`` and the balance is too low.
+        """
+        customer_id = self._customer_id()
+        query = {"customerId": customer_id}
+        if require_funds:
+            query["balance"] = {"$gte": -delta}
+        if operation_id is not None:
+            applied = self._applied_operation(customer_id, operation_id)
+            if applied is not None:
+                return applied
+            entry = {**entry, "operationId": operation_id}
+            # Covers a run that stopped between this update and its ledger entry
+            query["Banklog.operationId"] = {"$ne": operation_id}
+
+        now = datetime.utcnow()
+        log_entry = {key: {"$literal": value} for key, value in entry.items()}
+        log_entry["date"] = {"$literal": now}
+        log_entry["balanceAfter"] = "$balance"
+
+        update = [
+            {
+                "$set": {
+                    "balance": {"$add": [{"$ifNull": ["$balance", 0]}, delta]},
+                    "late_payments": {
+                        "$add": [{"$ifNull": ["$late_payments", 0]}, late_payments_delta]
+                    },
+                    "customer": {"$literal": f"{getattr(self._player, 'username', '')}".strip()},
+                }
+            },
+            {
+                "$set": {
+                    "Banklog": {
+                        "$slice": [
+                            {"$concatArrays": [{"$ifNull": ["$Banklog", []]}, [log_entry]]},
+                            -BANK_LOG_TAIL,
+                        ]
+                    }
+                }
+            },
+        ]
+        bank_doc = bank_collection.find_one_and_update(
+            query,
+            update,
+            upsert=not require_funds and operation_id is None,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._evict_cached_docs()
+        if bank_doc is None and operation_id is not None:
+            applied = self._applied_operation(customer_id, operation_id)
+            if applied is not None:
+                return applied
+        if bank_doc is None:
+            raise InsufficientFunds("Insufficient funds for this operation")
+
+        self.bank = bank_doc
+        self._balance = bank_doc.get("balance", 0)
+        self.late_payments = bank_doc.get("late_payments", 0)
+        self._operation_logs = bank_doc.get("Banklog", [])
+        stored_entry = self._operation_logs[-1]
+
+        self.bank_logs = self._operation_logs
+        self._append_to_ledger(bank_doc, entry, now, delta)
+        self._sync_balancesheet(delta)
+        return stored_entry
+
+    def _applied_operation(self, customer_id, operation_id):
+        """
+        The stored log entry of an operation already applied under
+        ``operation_id``, or None. A Banklog entry without its ledger entry
+        (the earlier run stopped in between) gets the ledger entry written now.
+        """
+        ledger_entry = bank_ledger_collection.find_one(
+            {"customerId": customer_id, "operationId": operation_id}
+        )
+        if ledger_entry is not None:
+            bank_doc = bank_collection.find_one({"customerId": customer_id})
+        else:
+            bank_doc = bank_collection.find_one(
+                {"customerId": customer_id, "Banklog.operationId": operation_id}
+            )
+        if bank_doc is None:
+            return None
+        self.bank = bank_doc
+        self._balance = bank_doc.get("balance", 0)
+        self.late_payments = bank_doc.get("late_payments", 0)
+        self._operation_logs = bank_doc.get("Banklog", [])
+        self.bank_logs = self._operation_logs
+        if ledger_entry is not None:
+            return {
+                key: value
+                for key, value in ledger_entry.items()
+                if key not in ("_id", "customerId", "bankId", "customer", "delta")
+            }
 
-        log_entry["date"] = datetime.utcnow()
-        self._operation_logs.append(log_entry)
-        self._operation_logs = self._operation_logs[-20:]
+        stored_entry = next(
+            entry for entry in self._operation_logs if entry.get("operationId") == operation_id
+        )
+        entry = {k: v for k, v in stored_entry.items() if k not in ("date", "balanceAfter")}
+        delta = entry["amount"] if entry.get("type") == "deposit" else -entry["amount"]
+        self._append_to_ledger(
+            bank_doc, entry, stored_entry.get("date"), delta, stored_entry.get("balanceAfter")
+        )
+        return stored_entry
+
+    @staticmethod
+    def _append_to_ledger(bank_doc, entry, date, delta, balance_after=None):
+        """
+        Insert one ledger document for the operation. The ledger is append-only:
+        entries are never updated, so each operation costs one small insert
+        regardless of how long the history is. An entry with an operationId is
+        inserted only if the ledger does not have one with that id yet.
+        """
+        ledger_entry = dict(entry)
+        ledger_entry.update(
+            {
+                "customerId": bank_doc.get("customerId"),
+                "bankId": bank_doc["_id"],
+                "customer": bank_doc.get("customer"),
+                "date": date,
+                "delta": delta,
+                "balanceAfter": bank_doc.get("balance", 0) if balance_after is None else balance_after,
+            }
+        )
+        try:
+            if "operationId" in ledger_entry:
+                bank_ledger_collection.update_one(
+                    {"customerId": ledger_entry["customerId"], "operationId": ledger_entry["operationId"]},
+                    {"$setOnInsert": ledger_entry},
+                    upsert=True,
+                )
+            else:
+                bank_ledger_collection.insert_one(ledger_entry)
+        except Exception as e:
+            # The balance is already committed; a missing ledger line must not
+            # fail the operation, but it should be visible in the logs.
+            print(f"Failed to append bank ledger entry for {bank_doc.get('customerId')}: {e}")
+
+    @staticmethod
+    def _ledger_entry_to_dict(doc):
+        entry = {k: v for k, v in doc.items() if k not in ("_id", "bankId")}
+        entry["id"] = str(doc["_id"])
+        if isinstance(entry.get("date"), datetime):
+            entry["date"] = entry["date"].isoformat()
+        return entry
+
+    @staticmethod
+    def _parse_ledger_cursor(cursor):
+        """
+        A ledger cursor is "<date isoformat>_<entry id>" of the last entry on
+        the previous page.
+
+        Raises:
+            ValueError: The cursor is malformed.
+        """
+        try:
+            date_part, id_part = cursor.rsplit("_", 1)
+            return datetime.fromisoformat(date_part), ObjectId(id_part)
+        except (AttributeError, ValueError, InvalidId):
+            raise ValueError("Invalid ledger cursor")
+
+    @classmethod
+    def get_ledger(cls, customer_id, limit=LEDGER_PAGE_SIZE, cursor=None):
+        """
+        One page of ledger entries, newest first, using a keyset cursor on
+        (date, _id) so every page is an index range scan on
+        {customerId, date, _id} however deep the client pages.
+
+        Args:
+            customer_id (str): The player id the account belongs to.
+            limit (int): Page size, capped at LEDGER_MAX_PAGE_SIZE.
+            cursor (str): next_cursor from the previous page, or None.
+
+        Returns:
+            dict: {"entries": [...], "next_cursor": str | None}
+        """
+        limit = max(1, min(int(limit), LEDGER_MAX_PAGE_SIZE))
+        query = {"customerId": customer_id}
+        if cursor:
+            date, entry_id = cls._parse_ledger_cursor(cursor)
+            query["$or"] = [
+                {"date": {"$lt": date}},
+                {"date": date, "_id": {"$lt": entry_id}},
+            ]
+
+        # Fetch one extra document to know whether another page exists.
+        docs = list(
+            bank_ledger_collection.find(query)
+            .sort([("date", DESCENDING), ("_id", DESCENDING)])
+            .limit(limit + 1)
+        )
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            last = docs[-1]
+            next_cursor = f"{last['date'].isoformat()}_{last['_id']}"
+        return {
+            "entries": [cls._ledger_entry_to_dict(doc) for doc in docs],
+            "next_cursor": next_cursor,
+        }
+
+    @classmethod
+    def get_ledger_rollup(cls, customer_id, limit=LEDGER_PAGE_SIZE, cursor=None):
+        """
+        Per-day totals of the ledger, newest day first, computed by the
+        database so only one row per day goes over the wire.
+
+        Each $group only sees a bounded date window ending at the newest entry
+        not yet rolled up, so a page costs about ``limit`` days of entries
+        rather than the account's whole history.
+
+        Args:
+            customer_id (str): The player id the account belongs to.
+            limit (int): Number of days, capped at LEDGER_MAX_PAGE_SIZE.
+            cursor (str): next_cursor from the previous page (a YYYY-MM-DD day).
+
+        Returns:
+            dict: {"days": [{day, count, credits, debits, net, closingBalance}],
+            "next_cursor": str | None}
+        """
+        limit = max(1, min(int(limit), LEDGER_MAX_PAGE_SIZE))
+        match = {"customerId": customer_id}
+        if cursor:
+            try:
+                match["date"] = {"$lt": datetime.strptime(cursor, "%Y-%m-%d")}
+            except (TypeError, ValueError):
+                raise ValueError("Invalid ledger cursor")
+
+        def newest(query):
+            return bank_ledger_collection.find_one(query, {"date": 1}, sort=[("date", DESCENDING)])
+
+        rows = []
+        older = newest(match)
+        while older is not None and len(rows) <= limit:
+            # Window of the days still needed, ending after the newest entry's day
+            upper = datetime(older["date"].year, older["date"].month, older["date"].day) + timedelta(days=1)
+            lower = upper - timedelta(days=limit + 1 - len(rows))
+            pipeline = [
+                {"$match": {"customerId": customer_id, "date": {"$gte": lower, "$lt": upper}}},
+                {"$sort": {"date": ASCENDING, "_id": ASCENDING}},
+                {
+                    "$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                        "count": {"$sum": 1},
+                        "credits": {"$sum": {"$cond": [{"$gt": ["$delta", 0]}, "$delta", 0]}},
+                        "debits": {"$sum": {"$cond": [{"$lt": ["$delta", 0]}, {"$abs": "$delta"}, 0]}},
+                        "net": {"$sum": "$delta"},
+                        "closingBalance": {"$last": "$balanceAfter"},
+                    }
+                },
+                {"$sort": {"_id": DESCENDING}},
+            ]
+            rows.extend(bank_ledger_collection.aggregate(pipeline))
+            older = newest({"customerId": customer_id, "date": {"$lt": lower}})
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = rows[-1]["_id"]
+        days = []
+        for row in rows:
+            day = {k: v for k, v in row.items() if k != "_id"}
+            day["day"] = row["_id"]
+            days.append(day)
+        return {"days": days, "next_cursor": next_cursor}
+
+    def _sync_balancesheet(self, delta):
+        """
+        Move the balancesheet's materialized bank_balance and net_worth by the
+        same delta. Documents that have not stored bank_balance yet are left
+        alone; BalanceSheet seeds it on their next save.
+        """
+        username = getattr(self._player, "username", None)
+        if not username:
+            return
+        balancesheet_collection.update_one(
+            {"username": username, "bank_balance": {"$exists": True}},
+            {"$inc": {"bank_balance": delta, "net_worth": delta}},
+        )
+        identity_map.evict(balancesheet_collection.name)
+        bs = getattr(self._player, "balancesheet", None)
+        if bs is not None and getattr(bs, "bank_balance", None) is not None:
+            bs.bank_balance = self._balance
 
     def deposit(self, amount: float, sender=None, message=None):
         if amount <= 0:
             raise ValueError("Deposit amount must be positive")
-        self._balance += amount
-
-        self._log_operation(
+        self._apply_operation(
+            amount,
             {
                 "type": "deposit",
                 "amount": amount,
-                "balanceAfter": self._balance,
                 "from": sender,
                 "message": message,
-            }
+            },
         )
-        self.save_bank_data()
 
     def withdraw(self, amount: float):
         if amount <= 0:
             raise ValueError("Withdraw amount must be positive")
-        if amount > self._balance:
-            raise ValueError("Insufficient funds for withdrawal")
-        self._balance -= amount
-        self._log_operation(
-            {"type": "withdraw", "amount": amount, "balanceAfter": self._balance}
-        )
-        self.save_bank_data()
+        try:
+            self._apply_operation(
+                -amount, {"type": "withdraw", "amount": amount}, require_funds=True
+            )
+        except InsufficientFunds:
+            raise InsufficientFunds("Insufficient funds for withdrawal")
 
-    def make_payment(self, amount: float, recipient: str, late_payment: bool = None):
+    def make_payment(self, amount: float, recipient: str, late_payment: bool = None, operation_id=None):
+        """
+        Pay ``amount`` to ``recipient`` out of the balance.
+
+        Args:
+            operation_id (str): Optional; a payment made again with the same
+                id (a retried task) is not debited a second time.
+
+        Raises:
+            ValueError: The amount is not positive.
+            InsufficientFunds: The balance does not cover the payment.
+        """
         if amount <= 0:
             raise ValueError("Payment amount must be positive")
-        if amount > self._balance:
-            raise ValueError("Insufficient funds for payment")
-        self._balance -= amount
 
+        late_payments_delta = 0
         if late_payment is not None:
-            if late_payment:
-                self.late_payments += 1
-            else:
-                self.late_payments -= 1
+            late_payments_delta = 1 if late_payment else -1
 
-        self._log_operation(
-            {
-                "type": "payment",
-                "amount": amount,
-                "to": recipient,
-                "balanceAfter": self._balance,
-            }
-        )
-        self.save_bank_data()
+        try:
+            self._apply_operation(
+                -amount,
+                {
+                    "type": "payment",
+                    "amount": amount,
+                    "to": recipient,
+                },
+                require_funds=True,
+                late_payments_delta=late_payments_delta,
+                operation_id=operation_id,
+            )
+        except InsufficientFunds:
+            raise InsufficientFunds("Insufficient funds for payment")
 
     def get_logs(self):
         return self._operation_logs[:]
@@ -124,26 +476,16 @@ class Bank:
         if customer_id:
             # Delete the bank account document
             bank_collection.delete_one({"customerId": customer_id})
-            # Delete any associated logs
-            bank_logs_collection.delete_many(
-                {"bankId": self.bank["_id"]}
-            ) if self.bank and "_id" in self.bank else None
+            self._evict_cached_docs()
+            # Delete the account's ledger history
+            bank_ledger_collection.delete_many({"customerId": customer_id})
             self.bank = None
             self.bank_logs = []
     
     def required_credit_score(self, loan_amount, bs):
-        loan_ratio = loan_amount / max(sum_of_values(bs.income, "amount"), 1)
-
-        if loan_ratio < 0.1:
-            return 500   # very small loan
-        elif loan_ratio < 0.3:
-            return 580
-        elif loan_ratio < 0.6:
-            return 650
-        elif loan_ratio < 1.0:
-            return 700
-        else:
-            return 760   # large / risky loan
+        # Thresholds by loan-to-income ratio, see REQUIRED_SCORE_RATIOS; the
+        # income is the balancesheet total, as in /loan-curve
+        return int(required_scores(loan_amount, bs.total_income()))
 
     def request_loan_from_bank(
         self, amount=None, interest_rate=None, term_months=None, reason=None, bs=None
@@ -183,14 +525,12 @@ class Bank:
         except Exception:
             raise ValueError("Invalid values for loan request.")
 
-        # Add funds to balance
         print(
             ">>>>>>>>>>>>> BALANCE BEFORE LOAN: ",
             self._balance,
             " >> LOAN AMOUNT => ",
             amount,
         )
-        self._balance += amount
 
         # Add liability to player's balancesheet
         player = getattr(self, "_player", None)
@@ -248,23 +588,22 @@ class Bank:
             print(
                 f"[DEBUG] Bank class => request_loan_from_bank: We assume liability updated? {bs.id} | {self._balance} -----------------------------------------"
             )
-            print(">>>>>>>>>>>>> BALANCE AFTER LOAN: ", self._balance)
 
         else:
             raise ValueError("Player's balancesheet does not support liabilities.")
 
-        # Log and persist
-        self._log_operation(
+        # Credit the loan and log it in one atomic update
+        self._apply_operation(
+            amount,
             {
                 "type": "loan_request",
                 "amount": amount,
                 "interestRate": interest_rate,
                 "termMonths": term_months,
-                "balanceAfter": self._balance,
                 "reason": reason,
-            }
+            },
         )
-        self.save_bank_data()
+        print(">>>>>>>>>>>>> BALANCE AFTER LOAN: ", self._balance)
         # Try saving balancesheet
         if hasattr(bs, "save_to_db"):
             try:
@@ -295,7 +634,7 @@ class Bank:
         if not customer_id:
             raise ValueError("Cannot load bank data: customer ID not found.")
 
-        bank_doc = bank_collection.find_one({"customerId": customer_id})
+        bank_doc = self._find_bank_doc(customer_id)
         if bank_doc:
             self.bank = bank_doc
             self._balance = bank_doc.get("balance", self._balance)
@@ -306,147 +645,55 @@ class Bank:
             self._balance = 0
             self._operation_logs = []
             self.late_payments = 0
-
-        # Load logs from the bank_logs_collection, if exists
-        if self.bank and "_id" in self.bank:
-            logs_doc = bank_logs_collection.find_one({"bankId": self.bank["_id"]})
-            self.bank_logs = logs_doc["logs"] if logs_doc and "logs" in logs_doc else []
-        else:
-            self.bank_logs = []
+        self.bank_logs = self._operation_logs
 
     def calculate_credit_score(self, bs):
         """
         bs: current BalanceSheet
         """
+        return self.credit_score_details(bs)["score"]
 
-        prev_bs = bs.load_from_db(username=bs.player.username)
-        if prev_bs:
-            prev_bs = prev_bs.to_dict().get("prev_balancesheet", None)
-            if prev_bs:
-                prev_bs = json.loads(prev_bs)
-                prev_bs = bs.from_dict(prev_bs).to_dict()
-        else:
-            prev_bs = None
-
-
-        current_liabilities = sum_of_values(bs.liabilities, "loanAmount")
-        current_assets = sum_of_values(bs.assets, "value")
-        income = sum_of_values(bs.income, "amount")
-        expenses = sum_of_values(bs.expenses, "amount")
-
-
-        score = 500  # more realistic starting point
-
-        # ---------- 1. Payment behavior ----------
-        # Use Bank's late_payments property if BalanceSheet doesn't have it
-        late_payments_count = getattr(bs, "late_payments", None)
-        if late_payments_count is None:
-            late_payments_count = self.late_payments
-
-        score -= min(late_payments_count * 30, 150)
-
-        # ---------- 2. Debt-to-Income (DTI) ----------
-        income = max(income, 1)
-        dti = current_liabilities / income
-
-        if dti < 0.3:
-            score += 120
-        elif dti < 0.5:
-            score += 60
-        elif dti < 0.8:
-            score -= 50
-        else:
-            score -= 120
-
-        # ---------- 3. Cash flow ----------
-        cash_flow = income - expenses
-
-        if cash_flow > 0:
-            score += 80
-        else:
-            score -= min(abs(cash_flow) / income * 100, 100)
-
-        # ---------- 4. Liquidity (assets vs liabilities) ----------
-        if current_assets > current_liabilities:
-            score += 60
-        else:
-            score -= 80
-
-        # ---------- 5. Behavioral changes (trend-based penalties/bonuses) ----------
-        if prev_bs:
-            # Rising debt
-            previous_liabilities = sum_of_values(prev_bs.liabilities, "loanAmount")
-            previous_assets = sum_of_values(prev_bs.assets, "value")
-            previous_income = sum_of_values(prev_bs.income, "amount")
-            previous_expenses = sum_of_values(prev_bs.expenses, "amount")
+    def credit_score_details(self, bs, force=False, save=True):
+        """
+        Credit score with its factors (late payments, DTI, cash flow,
+        liquidity, trend).
 
+        The score and each factor's points are cached on the bank document
+        together with the inputs they were computed from. Only factors whose
+        inputs changed (or whose rules version is outdated) are recomputed,
+        and the document is only written when something was.
 
-            if current_liabilities > previous_liabilities:
-                increase_ratio = (current_liabilities - previous_liabilities) / max(
-                    previous_liabilities, 1
-                )
-                score -= min(increase_ratio * 100, 80)
-
-            # Income drop
-            if income < previous_income:
-                drop_ratio = (previous_income - income) / max(previous_income, 1)
-                score -= min(drop_ratio * 120, 100)
-
-            # Expense growth
-            if expenses > previous_expenses:
-                score -= min((expenses - previous_expenses) / income * 50, 50)
-
-            # Improvement bonus (good trends)
-            if (
-                current_liabilities < previous_liabilities
-                and income >= previous_income
-                and expenses <= previous_expenses
-            ):
-                score += 50
-        print(
-            f" >> calculate_credit_score: score => {score} -----------------------------------------"
-        )
-        # ---------- 6. Clamp to realistic bounds ----------
-        return max(300, min(score, 850))
+        Args:
+            save (bool): Write recomputed factors back to the bank document;
+                False for read-only callers.
 
-    def save_bank_data(self):
+        Returns:
+            dict: {"score", "factors": {factor: points}, "recalculated": [factor, ...]}
         """
-        Update bank data if it exists, or create a new entry if not.
-        Also persists the late_payments field.
-        """
-        customer_id = getattr(self._player, "_id", None)
-
-        if not self._player or customer_id is None:
-            player = self._player.get_player(self._player.username)
-            customer_id = player._id
-
-        bank_data = {
-            "balance": self._balance,
-            "late_payments": self.late_payments,
-            "Banklog": self._operation_logs,
-            "customerId": customer_id,
-            "customer": f"{getattr(self._player, 'username', '')}".strip(),
+        username = getattr(bs.player, "username", None) or getattr(self._player, "username", None)
+        totals = {
+            "total_assets": bs.total_assets(),
+            "total_liabilities": bs.total_liabilities(),
+            "total_income": bs.total_income(),
+            "total_expenses": bs.total_expenses(),
         }
-        # Try to update, or insert if not exists (upsert=True)
-        result = bank_collection.replace_one(
-            {"customerId": customer_id}, bank_data, upsert=True
+        # Totals before the last meaningful change, from the snapshot history
+        inputs = factor_inputs(self.late_payments, totals, bs.prev_totals(username))
+
+        cached = (self.bank or {}).get("credit_score")
+        result, recalculated = score_factors(inputs, cached, force=force)
+        if save and recalculated and self.bank and self.bank.get("_id") is not None:
+            bank_collection.update_one({"_id": self.bank["_id"]}, {"$set": {"credit_score": result}})
+            self._evict_cached_docs()
+            self.bank["credit_score"] = result
+        print(
+            f" >> calculate_credit_score: score => {result['score']} (recalculated: {recalculated}) -----------------------------------------"
         )
-        # Store all logs in a single document per bank to optimize performance
-        if self._operation_logs:
-            bank_id = (
-                result.upserted_id
-                if result.upserted_id
-                else self.bank["_id"]
-                if self.bank and "_id" in self.bank
-                else None
-            )
-            # Upsert a single document containing all logs for the bank
-            bank_logs_collection.replace_one(
-                {"bankId": bank_id},
-                {"bankId": bank_id, "logs": self._operation_logs},
-                upsert=True,
-            )
-        self.load_bank_data()
+        return {
+            "score": result["score"],
+            "factors": {name: factor["points"] for name, factor in result["factors"].items()},
+            "recalculated": recalculated,
+        }
 
     def to_dict(self, include_logs=False):
         """
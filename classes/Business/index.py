@@ -1,4 +1,5 @@
 from app import db
+from app.utils.change_tracking import ChangeTracker
 from app.utils.db_guard import db_call_guard
 from bson import ObjectId
 from datetime import datetime
@@ -7,7 +8,7 @@ from datetime import datetime
 business_collection = db["business-collection"]
 
 
-class Business:
+class Business(ChangeTracker):
     """
     Base Business class for managing business entities.
     Provides money account management and storage functionality.
@@ -158,6 +159,16 @@ class Business:
             "storage": self.storage
         }
     
+    def _document(self):
+        """The document save_to_db writes: toDict() plus any stored-only fields."""
+        return self.toDict()
+
+    def _persisted_view(self):
+        """_document() without the id, i.e. the fields save_to_db writes."""
+        data = self._document()
+        data.pop("id", None)
+        return data
+
     def load(self, data):
         """
         Load business data from dictionary.
@@ -183,34 +194,44 @@ class Business:
         Save business to database.
         """
         try:
-            with db_call_guard("Business.save_to_db"):
-                data = self.toDict()
-                # Remove id from data for MongoDB operations
-                business_id = data.pop("id", None)
-                
-                if business_id:
-                    _id = business_id
-                    if _id and not isinstance(_id, ObjectId):
-                        try:
-                            _id = ObjectId(_id)
-                        except:
-                            pass
-                    
-                    result = business_collection.update_one(
-                        {"_id": _id},
-                        {"$set": data}
-                    )
-                    if result.modified_count == 0 and result.matched_count == 0:
-                        # If not found, insert as new
-                        data["_id"] = _id
-                        business_collection.insert_one(data)
-                else:
-                    # Insert new document
-                    result = business_collection.insert_one(data)
-                    self._id = result.inserted_id
+            with db_call_guard("Business.save_to_db", key=self.username or self._id):
+                self._save_tracked(business_collection)
         except Exception as e:
             print(f"Exception occurred in Business.save_to_db: {e}")
             raise
+
+    def _save_tracked(self, collection):
+        """
+        Persist _document() to ``collection``, writing only what changed since the
+        last load/save: scalar and array-element edits become (positional)
+        $set, appended logs/plots/animals become $push, and an unchanged object
+        is not written at all. Objects without a snapshot get a full $set.
+        """
+        data = self._document()
+        # Remove id from data for MongoDB operations
+        business_id = data.pop("id", None)
+
+        if business_id:
+            _id = business_id
+            if _id and not isinstance(_id, ObjectId):
+                try:
+                    _id = ObjectId(_id)
+                except:
+                    pass
+
+            update = self._tracked_update(data)
+            if update is None:
+                update = {"$set": data}
+            if update:
+                result = collection.update_one({"_id": _id}, update)
+                if result.matched_count == 0:
+                    # If not found, insert as new
+                    collection.insert_one({**data, "_id": _id})
+        else:
+            # Insert new document (a copy: insert_one adds _id to its argument)
+            result = collection.insert_one(dict(data))
+            self._id = result.inserted_id
+        self._mark_persisted(data)
     
     @classmethod
     def load_from_db(cls, business_id=None, username=None, name=None):
@@ -226,7 +247,7 @@ class Business:
             Business instance or None if not found
         """
         try:
-            with db_call_guard("Business.load_from_db"):
+            with db_call_guard("Business.load_from_db", key=username or business_id):
                 query = {}
                 if business_id:
                     if not isinstance(business_id, ObjectId):
@@ -248,6 +269,7 @@ class Business:
                     instance = cls()
                     instance.load(doc)
                     instance._id = doc.get("_id")
+                    instance._mark_persisted(instance._persisted_view())
                     return instance
         except Exception as e:
             print(f"Exception occurred in Business.load_from_db: {e}")
@@ -265,13 +287,14 @@ class Business:
             List of Business instances
         """
         try:
-            with db_call_guard("Business.load_all_by_username"):
+            with db_call_guard("Business.load_all_by_username", key=username):
                 cursor = business_collection.find({"username": username})
                 businesses = []
                 for doc in cursor:
                     instance = cls()
                     instance.load(doc)
                     instance._id = doc.get("_id")
+                    instance._mark_persisted(instance._persisted_view())
                     businesses.append(instance)
                 return businesses
         except Exception as e:
@@ -2,7 +2,7 @@ from app import db
 from app.utils.db_guard import db_call_guard
 from classes.Business.index import Business
 from bson import ObjectId
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import random
 
 
@@ -39,6 +39,36 @@ CROP_GROWTH_TIMES = {
 }
 
 
+def _parse_date(value):
+    """ISO string or datetime -> naive UTC datetime, or None if missing/unparseable."""
+    if not value:
+        return None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _to_mongo_precision(value):
+    # Mongo stores datetimes with millisecond precision; truncating keeps the
+    # computed value equal to the stored one so unchanged farms are not rewritten.
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+NEXT_EVENT_FIELDS = ("nextEventAt", "nextGameEventAt")
+
+# Game days between two pregnancy chances of an animal that is not pregnant.
+PREGNANCY_CHECK_DAYS = 30
+
+
 class Farm(Business):
     """
     Farm Class - Extends Business
@@ -382,6 +412,13 @@ class Farm(Business):
                 except Exception as e:
                     print(f"Error checking pregnancy: {e}")
             elif not animal.get("isPregnant") and animal.get("birthCount", 0) < 5:
+                # One chance per PREGNANCY_CHECK_DAYS, so repeated timer updates
+                # in the same game month do not re-roll it
+                nextCheck = _parse_date(animal.get("nextPregnancyCheck"))
+                if nextCheck is not None and _parse_date(currentGameDate) < nextCheck:
+                    continue
+                animal["nextPregnancyCheck"] = (currentGameDate + timedelta(days=PREGNANCY_CHECK_DAYS)).isoformat()
+                
                 # Check if animal can get pregnant (base probability 50%, decreases by 10% per birth)
                 baseProbability = 0.5
                 probability = max(0, baseProbability - (animal.get("birthCount", 0) * 0.1))
@@ -635,6 +672,153 @@ class Farm(Business):
                         "unit": "units",
                     })
     
+    def getNextEventAt(self):
+        """
+        Earliest real-clock event: the next harvestDate of a growing plant.
+        
+        Returns:
+            datetime or None if nothing is growing
+        """
+        dates = [
+            _parse_date(plant.get("harvestDate"))
+            for plant in self.plants
+            if plant.get("status") in ["growing", "planted"]
+        ]
+        dates = [d for d in dates if d is not None]
+        return min(dates) if dates else None
+    
+    def getNextGameEventAt(self):
+        """
+        Earliest game-clock event: a gestation end, an animal expirationDate
+        or the next pregnancy chance.
+        
+        Returns:
+            datetime or None if the farm has no animals
+        """
+        dates = []
+        for animal in self.animals:
+            dates.append(_parse_date(animal.get("expirationDate")))
+            config = ANIMAL_CONFIGS.get(animal.get("type"))
+            pregnancyStart = _parse_date(animal.get("pregnancyStartDate"))
+            if animal.get("isPregnant") and config and pregnancyStart:
+                dates.append(pregnancyStart + timedelta(days=config["gestationMonths"] * 30))
+            elif not animal.get("isPregnant") and animal.get("birthCount", 0) < 5:
+                dates.append(_parse_date(animal.get("nextPregnancyCheck")))
+        dates = [d for d in dates if d is not None]
+        return min(dates) if dates else None
+    
+    def isDue(self, now, currentGameDate):
+        """
+        Whether the farm's next event is at or before now on either clock.
+        
+        Args:
+            now: Current real time (naive UTC datetime)
+            currentGameDate: Current game date
+        """
+        nextEventAt = self.getNextEventAt()
+        nextGameEventAt = self.getNextGameEventAt()
+        return (nextEventAt is not None and nextEventAt <= _parse_date(now)) or (
+            nextGameEventAt is not None and nextGameEventAt <= _parse_date(currentGameDate)
+        )
+    
+    def _document(self):
+        """
+        Stored document: toDict() plus the indexed next-event fields the farm
+        timer scheduler queries (nextEventAt on the real clock, nextGameEventAt
+        on the game clock). They are derived, so they are not part of toDict().
+        """
+        data = super()._document()
+        data["nextEventAt"] = _to_mongo_precision(self.getNextEventAt())
+        data["nextGameEventAt"] = _to_mongo_precision(self.getNextGameEventAt())
+        return data
+    
+    def _mark_loaded(self, doc):
+        """
+        Change-tracking snapshot after a load, taking the next-event fields as
+        stored so that farms saved before they existed get them on the next save.
+        """
+        view = self._persisted_view()
+        for field in NEXT_EVENT_FIELDS:
+            if field in doc:
+                view[field] = doc[field]
+            else:
+                view.pop(field, None)
+        self._mark_persisted(view)
+    
+    @classmethod
+    def load_due(cls, now, game_now, limit=None, exclude_ids=None):
+        """
+        Load farms whose next event is due on either clock, plus farms saved
+        before the next-event fields existed (saving them fills the fields in),
+        earliest nextEventAt first.
+        
+        Args:
+            now: Current real time (naive UTC datetime)
+            game_now: Current game date
+            limit: Optional maximum number of farms
+            exclude_ids: Optional farm _ids to leave out (already handled)
+        
+        Returns:
+            List of Farm instances
+        """
+        try:
+            with db_call_guard("Farm.load_due"):
+                query = {
+                    "$or": [
+                        {"nextEventAt": {"$lte": now}},
+                        {"nextGameEventAt": {"$lte": game_now}},
+                        {"nextEventAt": {"$exists": False}},
+                    ]
+                }
+                if exclude_ids:
+                    query["_id"] = {"$nin": list(exclude_ids)}
+                cursor = farm_collection.find(query).sort([("nextEventAt", 1), ("nextGameEventAt", 1)])
+                if limit:
+                    cursor = cursor.limit(limit)
+                farms = []
+                for doc in cursor:
+                    instance = cls()
+                    instance.load(doc)
+                    instance._id = doc.get("_id")
+                    instance._mark_loaded(doc)
+                    farms.append(instance)
+                return farms
+        except Exception as e:
+            print(f"Exception occurred in Farm.load_due: {e}")
+            return []
+    
+    @classmethod
+    def next_event_at(cls, game_now):
+        """
+        When the farm timer scheduler should next wake up: the earliest
+        nextEventAt, or now if a game-clock event (or a farm without the
+        fields) is already due.
+        
+        Returns:
+            datetime or None if no event is pending
+        """
+        try:
+            due_now = farm_collection.find_one(
+                {
+                    "$or": [
+                        {"nextGameEventAt": {"$lte": game_now}},
+                        {"nextEventAt": {"$exists": False}},
+                    ]
+                },
+                {"_id": 1},
+            )
+            if due_now:
+                return datetime.utcnow()
+            doc = farm_collection.find_one(
+                {"nextEventAt": {"$ne": None}},
+                {"nextEventAt": 1},
+                sort=[("nextEventAt", 1)],
+            )
+            return doc.get("nextEventAt") if doc else None
+        except Exception as e:
+            print(f"Exception occurred in Farm.next_event_at: {e}")
+            return None
+    
     def toDict(self):
         """Convert to dictionary including farm-specific fields."""
         base = super().toDict()
@@ -662,31 +846,8 @@ class Farm(Business):
     def save_to_db(self):
         """Save the current farm state to the database."""
         try:
-            with db_call_guard("Farm.save_to_db"):
-                data = self.toDict()
-                # Remove id from data for MongoDB operations
-                farm_id = data.pop("id", None)
-                
-                if farm_id:
-                    _id = farm_id
-                    if _id and not isinstance(_id, ObjectId):
-                        try:
-                            _id = ObjectId(_id)
-                        except:
-                            pass
-                    
-                    result = farm_collection.update_one(
-                        {"_id": _id},
-                        {"$set": data}
-                    )
-                    if result.modified_count == 0 and result.matched_count == 0:
-                        # If not found, insert as new
-                        data["_id"] = _id
-                        farm_collection.insert_one(data)
-                else:
-                    # Insert new document
-                    result = farm_collection.insert_one(data)
-                    self._id = result.inserted_id
+            with db_call_guard("Farm.save_to_db", key=self.username or self._id):
+                self._save_tracked(farm_collection)
         except Exception as e:
             print(f"Exception occurred in Farm.save_to_db: {e}")
             raise
@@ -705,7 +866,7 @@ class Farm(Business):
             Farm instance or None if not found
         """
         try:
-            with db_call_guard("Farm.load_from_db"):
+            with db_call_guard("Farm.load_from_db", key=username or farm_id):
                 query = {}
                 if farm_id:
                     if not isinstance(farm_id, ObjectId):
@@ -728,6 +889,7 @@ class Farm(Business):
                     instance.load(doc)
                     instance._id = doc.get("_id")
                     instance.username = username
+                    instance._mark_loaded(doc)
                     return instance
         except Exception as e:
             print(f"Exception occurred in Farm.load_from_db: {e}")
@@ -745,13 +907,14 @@ class Farm(Business):
             List of Farm instances
         """
         try:
-            with db_call_guard("Farm.load_all_by_username"):
+            with db_call_guard("Farm.load_all_by_username", key=username):
                 cursor = farm_collection.find({"username": username})
                 farms = []
                 for doc in cursor:
                     instance = cls()
                     instance.load(doc)
                     instance._id = doc.get("_id")
+                    instance._mark_loaded(doc)
                     farms.append(instance)
                 return farms
         except Exception as e:
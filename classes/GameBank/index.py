@@ -1,60 +1,64 @@
 from app import db
-from app.utils.db_guard import db_call_guard
+from classes.GameBank import shards
 from classes.Player.index import Player
 from classes.Bank.index import Bank
 
 class GameBank:
-    def __init__(self, balance=1000000):
+    def __init__(self, balance=shards.INITIAL_BALANCE):
         self.balance = balance
         self.properties = [] #/Not yet implemented
         self.stock = []  #Not yet implemented
+        self.name = 'GAME BANK'
         self.load_from_db()
 
     def load_from_db(self):
         """
-        Loads bank data from the db or initializes if not exists.
+        Loads the bank balance (summed over its counter shards, briefly
+        cached) from the db, creating the shards if they do not exist yet.
         """
-        with db_call_guard("GameBank.load_from_db"):
-            bank_collection = db['game-bank']
-            bank_data = bank_collection.find_one({"_id": "main"})
-            if bank_data:
-                self.balance = bank_data.get("balance", self.balance)
-                self.name = 'GAME BANK'
-            else:
-                self.save_to_db()
+        bank_collection = db['game-bank']
+        shards.ensure_shards(bank_collection, self.balance)
+        self.balance = shards.total_balance(bank_collection)
 
-    def save_to_db(self):
+    def withdraw(self, amount):
         """
-        Saves the current bank state to the db.
+        Takes an amount out of the bank's balance.
+
+        Raises:
+            ValueError: The bank does not have enough balance.
+        """
+        shards.debit(db['game-bank'], amount)
+        self.balance -= amount
+
+    def deposit(self, amount):
+        """
+        Adds an amount to the bank's balance.
         """
-        with db_call_guard("GameBank.save_to_db"):
-            bank_collection = db['game-bank']
-            bank_collection.replace_one(
-                {"_id": "main"},
-                {"_id": "main", "balance": self.balance},
-                upsert=True
-            )
+        shards.credit(db['game-bank'], amount)
+        self.balance += amount
 
     def pay_player(self, player_username, amount, proxy=None, message=None):
         """
         Pays a player from the bank's balance.
         """
-        if amount > self.balance:
-            raise ValueError("Bank does not have enough balance.")
         player = Player(username=player_username)
         player_data = player.get_player(player_username)
         if not player:
             raise ValueError(f"Player '{player_username}' not found.")
         bank = Bank(customer=player)
-        bank.deposit(amount=amount, sender=proxy if proxy != None else self.name, message=message)
-        self.balance -= amount
-        self.save_to_db()
+        self.withdraw(amount)
+        try:
+            bank.deposit(amount=amount, sender=proxy if proxy != None else self.name, message=message)
+        except Exception:
+            self.deposit(amount)
+            raise
 
     def sell_asset_to_player(self, player_username, asset, price, asset_type):
         """
         Sells an asset (property, crypto, commodities, business, stock) to the player in exchange for score/points.
         """
-        if price > self.balance:
+        # The cached self.balance may be stale; other workers move the shards
+        if price > shards.total_balance(db['game-bank'], refresh=True):
             raise ValueError("Bank does not have enough balance to cover the asset (simulation purpose).")
         player = Player.get_player(player_username)
         if not player:
@@ -64,7 +68,6 @@ class GameBank:
 
         # Deduct from player, add to bank
         player.score -= price
-        self.balance += price
         # Add asset to player
         if asset_type == "property":
             player.add_property(asset)
@@ -78,8 +81,8 @@ class GameBank:
             player.add_stock(asset)
         else:
             raise ValueError(f"Unknown asset type: {asset_type}")
+        self.deposit(price)
         player.save_to_db()
-        self.save_to_db()
 
 
     def give_loan_to_player(self, player_username, amount):
@@ -87,15 +90,15 @@ class GameBank:
         Gives a loan to a player if the bank has enough balance.
         The player receives 'amount', but could repay later (repay logic not included).
         """
-        if amount > self.balance:
-            raise ValueError("Bank does not have enough balance to give this loan.")
         player = Player.get_player(player_username)
         if not player:
             raise ValueError(f"Player '{player_username}' not found.")
+        try:
+            self.withdraw(amount)
+        except ValueError:
+            raise ValueError("Bank does not have enough balance to give this loan.")
         # For simplicity, loan is added to player score. You could add loan tracking later.
         player.increase_score(amount)
-        self.balance -= amount
-        self.save_to_db()
 
     @classmethod
     def get_bank(cls):
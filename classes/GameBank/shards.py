@@ -0,0 +1,168 @@
+import os
+import random
+import threading
+import time
+
+# The game bank balance is split across GAME_BANK_SHARDS counter documents
+# ({_id: "main:<n>", bank: "main", balance}) in the game-bank collection, so
+# concurrent salaries, loans and sales $inc different documents instead of all
+# rewriting {_id: "main"}. That document stays as the bank's metadata (shard
+# count) and holds the legacy balance until it is migrated.
+# Raising GAME_BANK_SHARDS later is safe: credits create missing shards, and
+# the balance and overdraft checks always cover every shard that exists.
+GAME_BANK_SHARDS = int(os.getenv("GAME_BANK_SHARDS", 8))
+
+# How long the aggregated balance is served from memory.
+GAME_BANK_BALANCE_TTL = float(os.getenv("GAME_BANK_BALANCE_TTL", 2))
+
+BANK_ID = "main"
+
+# Balance of a game bank created from scratch.
+INITIAL_BALANCE = 1000000
+
+_cache_lock = threading.Lock()
+_cached_balance = {"value": None, "expires": 0.0}
+
+# Collections (full names) known to have their shards seeded.
+_seeded = set()
+
+
+def shard_id(n):
+    return f"{BANK_ID}:{n}"
+
+
+def _invalidate():
+    with _cache_lock:
+        _cached_balance["expires"] = 0.0
+
+
+def ensure_shards(collection, initial_balance):
+    """
+    Create the counter shards, splitting the legacy balance of {_id: "main"}
+    (or ``initial_balance`` for a new game bank) evenly across them.
+
+    Safe to call from several workers at once: every shard is created with
+    $setOnInsert from the same split, and the legacy balance is only dropped
+    once every shard exists.
+    """
+    meta = collection.find_one({"_id": BANK_ID}) or {}
+    shards = meta.get("shards")
+    if shards:
+        _seeded.add(collection.full_name)
+        return shards
+
+    balance = meta.get("balance", initial_balance)
+    shards = GAME_BANK_SHARDS
+    share = round(balance / shards, 2)
+    for n in range(shards):
+        # The last shard takes the rounding remainder
+        amount = share if n < shards - 1 else round(balance - share * (shards - 1), 2)
+        collection.update_one(
+            {"_id": shard_id(n)},
+            {"$setOnInsert": {"bank": BANK_ID, "shard": n, "balance": amount}},
+            upsert=True,
+        )
+    collection.update_one(
+        {"_id": BANK_ID},
+        {"$set": {"shards": shards}, "$unset": {"balance": ""}},
+        upsert=True,
+    )
+    _seeded.add(collection.full_name)
+    _invalidate()
+    return shards
+
+
+def _require_shards(collection):
+    # A credit that created a shard before ensure_shards seeded it would make
+    # the seeding's $setOnInsert skip that shard and lose its legacy share.
+    if collection.full_name not in _seeded:
+        ensure_shards(collection, INITIAL_BALANCE)
+
+
+def total_balance(collection, refresh=False):
+    """
+    Sum of all shards, cached for GAME_BANK_BALANCE_TTL seconds.
+
+    Returns:
+        float: The game bank balance.
+    """
+    now = time.monotonic()
+    with _cache_lock:
+        if not refresh and _cached_balance["expires"] > now:
+            return _cached_balance["value"]
+    rows = list(
+        collection.aggregate(
+            [
+                {"$match": {"bank": BANK_ID}},
+                {"$group": {"_id": None, "balance": {"$sum": "$balance"}}},
+            ]
+        )
+    )
+    value = round(rows[0]["balance"], 2) if rows else 0.0
+    with _cache_lock:
+        _cached_balance.update(value=value, expires=now + GAME_BANK_BALANCE_TTL)
+    return value
+
+
+def credit(collection, amount, session=None):
+    """Add ``amount`` to a random shard (seeding the shards first if needed)."""
+    _require_shards(collection)
+    n = random.randrange(GAME_BANK_SHARDS)
+    collection.update_one(
+        {"_id": shard_id(n)},
+        {"$inc": {"balance": amount}, "$setOnInsert": {"bank": BANK_ID, "shard": n}},
+        upsert=True,
+        session=session,
+    )
+    _invalidate()
+
+
+def debit(collection, amount, session=None):
+    """
+    Take ``amount`` out of the game bank without letting any shard go below
+    zero.
+
+    A random shard that covers the whole amount is debited with one guarded
+    $inc. Otherwise the amount is reserved piece by piece from the fullest
+    shards; if they cannot cover it together, every piece is given back.
+
+    The shards are seeded first if needed, so an unmigrated legacy balance
+    is not overlooked.
+
+    Raises:
+        ValueError: The game bank does not have enough balance.
+    """
+    _require_shards(collection)
+    order = list(range(GAME_BANK_SHARDS))
+    random.shuffle(order)
+    for n in order[:2]:
+        taken = collection.update_one(
+            {"_id": shard_id(n), "balance": {"$gte": amount}},
+            {"$inc": {"balance": -amount}},
+            session=session,
+        )
+        if taken.matched_count:
+            _invalidate()
+            return
+
+    reserved, remaining = [], round(amount, 2)
+    for shard in collection.find(
+        {"bank": BANK_ID, "balance": {"$gt": 0}}, {"balance": 1}, session=session
+    ).sort("balance", -1):
+        take = round(min(shard["balance"], remaining), 2)
+        taken = collection.update_one(
+            {"_id": shard["_id"], "balance": {"$gte": take}},
+            {"$inc": {"balance": -take}},
+            session=session,
+        )
+        if taken.matched_count:
+            reserved.append((shard["_id"], take))
+            remaining = round(remaining - take, 2)
+        if remaining <= 0:
+            break
+
+    _invalidate()
+    if remaining > 0:
+        for _id, take in reserved:
+            collection.update_one({"_id": _id}, {"$inc": {"balance": take}}, session=session)
+        raise ValueError("Bank does not have enough balance.")
@@ -69,7 +69,7 @@ class GameState:
     def load_from_db(self):
         """Load game state from database."""
         try:
-            with db_call_guard("GameState.load_from_db"):
+            with db_call_guard("GameState.load_from_db", key="game-state:main"):
                 doc = game_state_collection.find_one({"_id": "main"})
                 if doc:
                     current_date_str = doc.get("current_date")
@@ -95,7 +95,7 @@ class GameState:
     def save_to_db(self):
         """Save game state to database."""
         try:
-            with db_call_guard("GameState.save_to_db"):
+            with db_call_guard("GameState.save_to_db", key="game-state:main"):
                 data = self.to_dict()
                 game_state_collection.replace_one(
                     {"_id": "main"},
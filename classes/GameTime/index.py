@@ -76,7 +76,7 @@ class GameTime:
         Save game time to database.
         """
         try:
-            with db_call_guard("GameTime.save_to_db"):
+            with db_call_guard("GameTime.save_to_db", key=self.username):
                 if not self.username:
                     raise ValueError("Username is required to save game time")
                 
@@ -108,7 +108,7 @@ class GameTime:
             GameTime instance or None if not found
         """
         try:
-            with db_call_guard("GameTime.load_from_db"):
+            with db_call_guard("GameTime.load_from_db", key=username):
                 if not username:
                     return None
                 
@@ -1,6 +1,7 @@
-import threading
 from app import db, socketio
 from app.BackgroundThreads import async_apply_and_hire
+from app.BackgroundThreads.task_queue import dispatch
+from app.utils import identity_map
 from app.utils.db_guard import db_call_guard
 from classes.Player.index import Player
 from bson import ObjectId
@@ -129,7 +130,7 @@ class Job:
         Save this job to the job collection in db.
         If a job with the same title and company exists, replace it.
         """
-        with db_call_guard("Job.save_to_db"):
+        with db_call_guard("Job.save_to_db", key=self._id or f"{self.title}|{self.company}"):
             job_collection = db["jobs-collection"]
             result = None
 
@@ -161,6 +162,7 @@ class Job:
                         # If a new document was inserted, capture its _id
             if result and hasattr(result, "upserted_id") and result.upserted_id:
                 self._id = result.upserted_id
+            identity_map.evict(job_collection.name)
 
     @classmethod
     def load_from_db(cls, title=None, company=None, id=None):
@@ -169,36 +171,50 @@ class Job:
         Load a job by title and company from the db.
         Returns a Job instance if found, else None.
         """
-        with db_call_guard("Job.load_from_db"):
+        with db_call_guard("Job.load_from_db", key=id if id is not None else f"{title}|{company}"):
             job_collection = db["jobs-collection"]
 
             if id is not None:
                 object_id = cls._to_object_id(id)
-                job_data = job_collection.find_one({"_id": object_id})
+                job_data = identity_map.find_one(
+                    job_collection, ("_id", object_id), {"_id": object_id}
+                )
             else:
-                job_data = job_collection.find_one({"title": title, "company": company})
+                job_data = identity_map.find_one(
+                    job_collection,
+                    ("title", title, "company", company),
+                    {"title": title, "company": company},
+                )
 
             if job_data:
-                job = cls()
-                job.set_title(job_data.get("title"))
-                job.set_industry(job_data.get("industry"))
-                job.set_company(job_data.get("company"))
-                job.set_description(job_data.get("description"))
-                job.set_requirements(job_data.get("requirements", []))
-                job.set_benefits(job_data.get("benefits", []))
-                job.set_rate_per_hour(job_data.get("rate_per_hour"))
-                job.set_hours_per_month(job_data.get("hours_per_mo"))
-                job.set_available(job_data.get("available"))
-                job.set_applications(job_data.get("applications", []))
-                staff_list = job_data.get("staff", [])
-                job.set_staff(staff_list)
-                job._id = job_data.get("_id")
-                job.experience = job_data.get("experience", 0)
-                job.experience_point = job_data.get("experience_point", 0)
-                return job
+                return cls.from_document(job_data)
             else:
                 return None
 
+    @classmethod
+    def from_document(cls, job_data):
+        """
+        Build a Job from a jobs-collection document without touching the db
+        (used by load_from_db and by joined reads such as the player profile).
+        """
+        job = cls()
+        job.set_title(job_data.get("title"))
+        job.set_industry(job_data.get("industry"))
+        job.set_company(job_data.get("company"))
+        job.set_description(job_data.get("description"))
+        job.set_requirements(job_data.get("requirements", []))
+        job.set_benefits(job_data.get("benefits", []))
+        job.set_rate_per_hour(job_data.get("rate_per_hour"))
+        job.set_hours_per_month(job_data.get("hours_per_mo"))
+        job.set_available(job_data.get("available"))
+        job.set_applications(job_data.get("applications", []))
+        staff_list = job_data.get("staff", [])
+        job.set_staff(staff_list)
+        job._id = job_data.get("_id")
+        job.experience = job_data.get("experience", 0)
+        job.experience_point = job_data.get("experience_point", 0)
+        return job
+
     def apply(self, player: "Player"):
         """
         Allows a player apply for this job, accounting for experience requirement.
@@ -227,14 +243,24 @@ class Job:
             }
         )
 
-        # Move the hiring logic to a background task and send a socket event when completed
-        # Use threading.Thread for background task execution
-        # This works with Flask-SocketIO in threading mode
-        thread = threading.Thread(target=async_apply_and_hire, args=(self, player))
-        thread.daemon = True
-        thread.start()
+        # Save the application first: a durable task may be picked up by the
+        # worker process right away and reloads the job from the db.
         self.save_to_db()
 
+        # Move the hiring logic to a background task and send a socket event when completed
+        try:
+            dispatch(
+                db,
+                "apply_and_hire",
+                {"job_id": str(self._id), "username": player.username},
+                async_apply_and_hire, self, player,
+            )
+        except Exception:
+            # Not queued (executor saturated): drop the application again
+            self.applications.pop()
+            self.save_to_db()
+            raise
+
     def hire(self, player: "Player"):
         """
         Allows a player to get hired for this job.
@@ -1,12 +1,26 @@
 from app import db
 from app.utils.db_guard import db_call_guard
 from bson import ObjectId
+from pymongo import ReturnDocument
+import os
 import random
 from datetime import datetime, timedelta
 import copy
 
 lotto_collection = db["lotto-collection"]
 
+# A ticket whose draw fails is retried after LOTTO_DRAW_RETRY_BACKOFF seconds,
+# doubled per failure up to LOTTO_DRAW_RETRY_BACKOFF_MAX, and marked "failed"
+# after LOTTO_MAX_DRAW_ATTEMPTS so it stops holding the head of the queue.
+LOTTO_DRAW_RETRY_BACKOFF = float(os.getenv("LOTTO_DRAW_RETRY_BACKOFF", 30))
+LOTTO_DRAW_RETRY_BACKOFF_MAX = float(os.getenv("LOTTO_DRAW_RETRY_BACKOFF_MAX", 3600))
+LOTTO_MAX_DRAW_ATTEMPTS = int(os.getenv("LOTTO_MAX_DRAW_ATTEMPTS", 5))
+
+# A ticket is claimed ("drawing") before it is drawn so that it is paid once.
+# A claim older than LOTTO_DRAW_CLAIM_TIMEOUT seconds was left by a worker that
+# stopped mid-draw; the ticket goes back to "pending" and is drawn again.
+LOTTO_DRAW_CLAIM_TIMEOUT = float(os.getenv("LOTTO_DRAW_CLAIM_TIMEOUT", 300))
+
 
 class Lotto:
     """
@@ -27,7 +41,7 @@ class Lotto:
         self.winning_numbers = []  # Winning numbers (drawn after delay)
         self.ticket_cost = 0  # Cost to purchase ticket
         self.prize_amount = 0  # Prize won (0 if lost)
-        self.status = "pending"  # pending, won, lost
+        self.status = "pending"  # pending, drawing, won, lost, failed (draw kept failing)
         self.submitted_at = None  # When ticket was submitted
         self.result_at = None  # When result should be available
         self.processed_at = None  # When result was actually processed
@@ -234,7 +248,7 @@ class Lotto:
     def save_to_db(self):
         """Save the ticket to the database (insert or update)"""
         try:
-            with db_call_guard("Lotto.save_to_db"):
+            with db_call_guard("Lotto.save_to_db", key=self.username or self._id):
                 data = self.to_dict()
                 # Remove id from data for MongoDB operations
                 ticket_id = data.pop("id", None)
@@ -271,7 +285,7 @@ class Lotto:
             Lotto instance or None if not found
         """
         try:
-            with db_call_guard("Lotto.load_from_db"):
+            with db_call_guard("Lotto.load_from_db", key=getattr(player, "username", None) or ticket_id):
                 if not isinstance(ticket_id, ObjectId):
                     try:
                         ticket_id = ObjectId(ticket_id)
@@ -301,7 +315,7 @@ class Lotto:
             List of Lotto ticket dictionaries
         """
         try:
-            with db_call_guard("Lotto.load_player_tickets"):
+            with db_call_guard("Lotto.load_player_tickets", key=username):
                 query = {"username": username}
                 if status:
                     query["status"] = status
@@ -319,10 +333,13 @@ class Lotto:
             return []
     
     @classmethod
-    def load_pending_tickets(cls):
+    def load_pending_tickets(cls, limit=None):
         """
         Load all pending tickets that are ready to be processed (result_at <= now).
         
+        Args:
+            limit: Optional maximum number of tickets (oldest result_at first)
+        
         Returns:
             List of Lotto instances
         """
@@ -330,6 +347,14 @@ class Lotto:
             with db_call_guard("Lotto.load_pending_tickets"):
                 now = datetime.utcnow()
                 now_str = now.isoformat()
+                # Give back the tickets of draws that were abandoned mid-way
+                lotto_collection.update_many(
+                    {
+                        "status": "drawing",
+                        "draw_claimed_at": {"$lte": now - timedelta(seconds=LOTTO_DRAW_CLAIM_TIMEOUT)},
+                    },
+                    {"$set": {"status": "pending"}},
+                )
                 # Query for pending tickets where result_at is less than or equal to now
                 # Handle both string and datetime formats
                 cursor = lotto_collection.find({
@@ -338,7 +363,9 @@ class Lotto:
                         {"result_at": {"$lte": now_str}},
                         {"result_at": {"$lte": now}}
                     ]
-                })
+                }).sort("result_at", 1)
+                if limit:
+                    cursor = cursor.limit(limit)
                 
                 tickets = []
                 for doc in cursor:
@@ -359,3 +386,100 @@ class Lotto:
             print(f"Exception occurred in Lotto.load_pending_tickets: {e}")
             return []
 
+    @classmethod
+    def claim_draw(cls, ticket_id, player=None):
+        """
+        Atomically move a pending ticket to "drawing", so that only one caller
+        draws it and pays its prize.
+
+        Args:
+            ticket_id: MongoDB _id of the ticket
+            player: Optional player instance
+
+        Returns:
+            Lotto instance of the claimed ticket, or None if it is not pending
+        """
+        with db_call_guard("Lotto.claim_draw", key=getattr(player, "username", None) or ticket_id):
+            doc = lotto_collection.find_one_and_update(
+                {"_id": ticket_id, "status": "pending"},
+                {"$set": {"status": "drawing", "draw_claimed_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER,
+            )
+        if not doc:
+            return None
+        instance = cls(player=player, ticket_id=None)
+        instance.from_dict(doc)
+        instance._id = doc.get("_id")
+        return instance
+
+    @classmethod
+    def release_draw(cls, ticket_id):
+        """
+        Put a claimed ticket whose draw failed before its result was saved back
+        to "pending", so defer_draw can schedule the retry.
+        """
+        try:
+            lotto_collection.update_one({"_id": ticket_id, "status": "drawing"}, {"$set": {"status": "pending"}})
+        except Exception as e:
+            print(f"Exception occurred in Lotto.release_draw: {e}")
+
+    @classmethod
+    def defer_draw(cls, ticket_id, error=None):
+        """
+        Push a pending ticket whose draw failed back in the draw queue.
+
+        Its result_at moves forward by an exponential backoff; after
+        LOTTO_MAX_DRAW_ATTEMPTS failures the ticket is marked "failed" instead.
+
+        Args:
+            ticket_id: MongoDB _id of the ticket
+            error: Optional description of the failure
+
+        Returns:
+            str or None: The ticket's new status, None if it is no longer pending
+        """
+        try:
+            doc = lotto_collection.find_one_and_update(
+                {"_id": ticket_id, "status": "pending"},
+                {"$inc": {"draw_attempts": 1}, "$set": {"last_draw_error": error}},
+                projection={"draw_attempts": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if not doc:
+                return None
+            attempts = doc["draw_attempts"]
+            now = datetime.utcnow()
+            if attempts >= LOTTO_MAX_DRAW_ATTEMPTS:
+                update = {"status": "failed", "processed_at": now.isoformat()}
+            else:
+                delay = min(LOTTO_DRAW_RETRY_BACKOFF * 2 ** (attempts - 1), LOTTO_DRAW_RETRY_BACKOFF_MAX)
+                update = {"result_at": (now + timedelta(seconds=delay)).isoformat()}
+            lotto_collection.update_one({"_id": ticket_id, "status": "pending"}, {"$set": update})
+            return update.get("status", "pending")
+        except Exception as e:
+            print(f"Exception occurred in Lotto.defer_draw: {e}")
+            return None
+
+    @classmethod
+    def next_pending_result_at(cls):
+        """
+        Earliest result_at among pending tickets, used by the draw scheduler to
+        decide when to wake up.
+        
+        Returns:
+            datetime or None if no ticket is pending
+        """
+        try:
+            doc = lotto_collection.find_one(
+                {"status": "pending"},
+                {"result_at": 1},
+                sort=[("result_at", 1)],
+            )
+            if not doc:
+                return None
+            ticket = cls()
+            ticket.from_dict(doc)
+            return ticket.result_at or datetime.utcnow()
+        except Exception as e:
+            print(f"Exception occurred in Lotto.next_pending_result_at: {e}")
+            return None
@@ -1,4 +1,6 @@
 from app import db
+from app.utils import identity_map
+from app.utils.change_tracking import ChangeTracker
 from app.utils.db_guard import db_call_guard
 from classes.BalanceSheet.index import BalanceSheet
 from classes.Property.index import Property
@@ -7,7 +9,7 @@ from classes.Property.index import Property
 BASE_TOTAL_TIME = 720
 
 
-class Player:
+class Player(ChangeTracker):
     def __init__(
         self,
         username=None,
@@ -163,6 +165,14 @@ class Player:
 
     def to_dict(self):
         # Adding all relevant properties for saving/loading, including experience, energy, bank, qualifications, and balancesheet as dict
+        return {
+            **self._base_dict(),
+            "balancesheet": self.balancesheet.to_dict()
+            if hasattr(self.balancesheet, "id")
+            else self.balancesheet,
+        }
+
+    def _base_dict(self):
         return {
             "id": str(self._id),
             "username": self.username,
@@ -180,22 +190,43 @@ class Player:
             "experience": self.experience,
             "energy": self.energy,
             "qualifications": self.qualifications,
-            "balancesheet": self.balancesheet.to_dict()
-            if hasattr(self.balancesheet, "id")
-            else self.balancesheet,
         }
 
+    def _to_document(self):
+        """
+        The users-collection document for this player. The balancesheet lives in
+        its own collection and is referenced by id.
+        """
+        data = self._base_dict()
+
+        # Always store balancesheet id as a string, or fallback to embedded id/val
+        balancesheet_id = getattr(self.balancesheet, "id", None)
+        if balancesheet_id is not None:
+            data["balancesheet"] = str(balancesheet_id)
+        elif hasattr(self.balancesheet, "id"):
+            data["balancesheet"] = None
+        elif isinstance(self.balancesheet, dict):
+            data["balancesheet"] = self.balancesheet.get("id")
+        else:
+            data["balancesheet"] = self.balancesheet
+
+        if hasattr(self.bank, "id"):
+            data["bank"] = self.bank.id
+        return data
+
     def save_to_db(self, skip_balancesheet=False):
         """
         Save the player to the users collection in the provided db.
-        If a user with the same username already exists, replace/overwrite it.
+        Only fields changed since the last load/save are written ($set/$push);
+        nothing is written when the player is unchanged. Players without a
+        persisted snapshot are upserted in full.
         Also saves the balancesheet to its own collection.
         """
         # INSERT_YOUR_CODE
         import inspect
 
         try:
-            with db_call_guard("Player.save_to_db"):
+            with db_call_guard("Player.save_to_db", key=self.username):
                 frame = inspect.currentframe()
                 caller_frame = frame.f_back
                 caller_name = caller_frame.f_code.co_name if caller_frame else None
@@ -204,25 +235,18 @@ class Player:
                
                 print(f" >> save_to_db was called by: {caller_name} -> ")
 
-                data = self.to_dict()
-
-                # Always store balancesheet id as a string, or fallback to embedded id/val
-                balancesheet_id = getattr(self.balancesheet, "id", None)
-                bs_value = data.get("balancesheet")
-                if balancesheet_id is not None:
-                    data["balancesheet"] = str(balancesheet_id)
-                elif isinstance(bs_value, dict):
-                    data["balancesheet"] = bs_value.get("id")
-                else:
-                    data["balancesheet"] = bs_value
-
-                if hasattr(self.bank, "id"):
-                    data["bank"] = self.bank.id
-                elif isinstance(data["bank"], str):
-                    data["bank"] = self.bank
+                data = self._to_document()
 
                 users_collection = db["users-collection"]
-                users_collection.replace_one({"username": self.username}, data, upsert=True)
+                update = self._tracked_update(data)
+                if update is None:
+                    users_collection.replace_one({"username": self.username}, data, upsert=True)
+                elif update:
+                    result = users_collection.update_one({"username": self.username}, update)
+                    if result.matched_count == 0:
+                        users_collection.replace_one({"username": self.username}, data, upsert=True)
+                self._mark_persisted(data)
+                identity_map.evict(users_collection.name, ("username", self.username))
                 # Save balancesheet in its own document/collection as well, under the username
                 if (
                     not skip_balancesheet
@@ -268,41 +292,53 @@ class Player:
         Loads a player from database by username.
         Returns a Player object or None if not found.
         """
-        with db_call_guard("Player.load_from_db"):
+        with db_call_guard("Player.load_from_db", key=username):
             users_collection = db["users-collection"]
-            player_data = users_collection.find_one({"username": username})
+            player_data = identity_map.find_one(
+                users_collection, ("username", username), {"username": username}
+            )
             if player_data:
                 print('FOUND PLAYER :', player_data.get("_id"))
                 # Always load the balancesheet with the player class.
                 balancesheet = BalanceSheet.load_from_db(username=username) or None
-
-                return cls(
-                    username=player_data.get("username"),
-                    score=player_data.get("score", 0),
-                    level=player_data.get("level", 1),
-                    total_time=player_data.get("total_time", BASE_TOTAL_TIME),
-                    time_slots=player_data.get("time_slots", {}),
-                    job=player_data.get(
-                        "job", {}
-                    ),  # Job object needs more context to reconstruct
-                    properties=player_data.get("properties", []),
-                    crypto=player_data.get("crypto", []),
-                    commodities=player_data.get("commodities", []),
-                    business=player_data.get("business", []),
-                    stock=player_data.get("stock", []),
-                    bank=player_data.get("bank", None),
-                    id=str(player_data.get("_id"))
-                    if player_data.get("_id") is not None
-                    else None,
-                    experience=player_data.get("experience", 0),
-                    energy=player_data.get("energy", 0),
-                    qualifications=player_data.get(
-                        "qualifications", []
-                    ),  # Load qualifications
-                    balancesheet=balancesheet,
-                )
+                return cls.from_document(player_data, balancesheet)
         return None
 
+    @classmethod
+    def from_document(cls, player_data, balancesheet):
+        """
+        Build a Player from a users-collection document and an already loaded
+        BalanceSheet, without touching the db (used by load_from_db and by
+        joined reads such as the player profile).
+        """
+        player = cls(
+            username=player_data.get("username"),
+            score=player_data.get("score", 0),
+            level=player_data.get("level", 1),
+            total_time=player_data.get("total_time", BASE_TOTAL_TIME),
+            time_slots=player_data.get("time_slots", {}),
+            job=player_data.get(
+                "job", {}
+            ),  # Job object needs more context to reconstruct
+            properties=player_data.get("properties", []),
+            crypto=player_data.get("crypto", []),
+            commodities=player_data.get("commodities", []),
+            business=player_data.get("business", []),
+            stock=player_data.get("stock", []),
+            bank=player_data.get("bank", None),
+            id=str(player_data.get("_id"))
+            if player_data.get("_id") is not None
+            else None,
+            experience=player_data.get("experience", 0),
+            energy=player_data.get("energy", 0),
+            qualifications=player_data.get(
+                "qualifications", []
+            ),  # Load qualifications
+            balancesheet=balancesheet,
+        )
+        player._mark_persisted(player._to_document())
+        return player
+
     # INSERT_YOUR_CODE
     @classmethod
     def from_json(cls, data):
@@ -3,6 +3,7 @@ from app.utils.db_guard import db_call_guard
  # Update existing document
 # Ensure _id is a valid ObjectId if it isn't already (can fix common 'not updating' MongoDB bug)
 from bson import ObjectId
+from pymongo import ReturnDocument
 
 property_collection = db["property-collection"]
 
@@ -218,7 +219,7 @@ class Property:
     def save_to_db(self):
         """Save the property to the database (insert or update)"""
         try:
-            with db_call_guard("Property.save_to_db"):
+            with db_call_guard("Property.save_to_db", key=getattr(self._player, "username", None) or self._id):
                 data = self.to_dict()
                
                 if self._id:
@@ -283,35 +284,60 @@ class Property:
             print("NEW PROPERTY VALUE :", self.price)
 
             # Update the player's balancesheet asset value if requested
-            if (
-                update_balancesheet
-                and hasattr(self, "_player")
-                and hasattr(self._player, "balancesheet")
-            ):
-                asset_name = self.title
-                balancesheet = self._player.balancesheet
-                updated = False
-                # Find the asset by name/title and update its value
-                for asset in getattr(balancesheet, "assets", []):
-                    if asset.get("name") == asset_name:
-                        asset["value"] = new_cost
-                        updated = True
-                        break
-                if updated:
-                    try:
-                        balancesheet.save_to_db(self._player.username)
-                    except Exception as e:
-                        print(
-                            f"Failed to save balancesheet with appreciated property value: {e}"
-                        )
-                else:
-                    # Optionally: add new asset if not present
-                    pass  # Do nothing if asset not found
+            if update_balancesheet:
+                self.update_balancesheet_asset(new_cost)
             return new_cost
         except Exception as e:
             print(f"Exception in apply_appreciation: {e}")
             return self.cost if self.cost is not None else self.price
 
+    def update_balancesheet_asset(self, value):
+        """
+        Set the value of this property's asset (matched by title) in the
+        player's balancesheet and save it. Does nothing if the player has no
+        balancesheet or the asset is not in it.
+        """
+        if not hasattr(self, "_player") or not hasattr(self._player, "balancesheet"):
+            return
+        balancesheet = self._player.balancesheet
+        # Update the asset value through the balancesheet so its totals stay in step
+        if balancesheet.set_asset_value(self.title, value):
+            try:
+                balancesheet.save_to_db(self._player.username)
+            except Exception as e:
+                print(f"Failed to save balancesheet with appreciated property value: {e}")
+
+    def save_appreciation(self, task_id):
+        """
+        Save the appreciated property once per task: the update is filtered on
+        lastAppreciationTask and sets it, so a retried task leaves the price it
+        already stored alone instead of compounding it.
+
+        Args:
+            task_id: Id of the task applying the appreciation.
+
+        Returns:
+            float: The stored price after the save.
+        """
+        with db_call_guard("Property.save_appreciation", key=getattr(self._player, "username", None) or self._id):
+            _id = self._id
+            if _id and not isinstance(_id, ObjectId):
+                try:
+                    _id = ObjectId(_id)
+                except Exception:
+                    pass
+            doc = property_collection.find_one_and_update(
+                {"_id": _id, "lastAppreciationTask": {"$ne": task_id}},
+                {"$set": {**self.to_dict(), "lastAppreciationTask": task_id}},
+                projection={"price": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if doc is None:
+                # Already applied by this task
+                doc = property_collection.find_one({"_id": _id}, {"price": 1}) or {}
+        self.price = doc.get("price", self.price)
+        return self.price
+
     def load_all_owned_properties(self):
         """
         Return a list of all properties owned by the player (_player).
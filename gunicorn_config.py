@@ -45,3 +45,12 @@ tmp_upload_dir = None
 # keyfile = None
 # certfile = None
 
+
+def worker_exit(server, worker):
+    """Let queued background tasks finish before the worker goes away."""
+    try:
+        from app.BackgroundThreads.executor import background_executor
+
+        background_executor.shutdown()
+    except Exception as e:
+        server.log.warning(f"Background executor drain failed: {e}")
@@ -0,0 +1,55 @@
+"""
+Run the app against an in-memory mongomock database.
+
+The app connects to MongoDB and starts its schedulers at import time, so the
+connection string, the index setup and the schedulers are switched off and
+pymongo.MongoClient is replaced before ``app`` is first imported.
+"""
+
+import os
+import sys
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+import pymongo  # noqa: E402
+import mongomock.collection  # noqa: E402
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["MONGO_DB_CONNECTION_STRING"] = "mongodb://localhost:27017"
+os.environ["AUTO_ENSURE_INDEXES"] = "false"
+os.environ["LOTTO_SCHEDULER_ENABLED"] = "false"
+os.environ["FARM_SCHEDULER_ENABLED"] = "false"
+
+
+class _MongoClient(mongomock.MongoClient):
+    def __init__(self, *args, **kwargs):
+        # mongomock does not support command listeners
+        kwargs.pop("event_listeners", None)
+        super().__init__(*args, **kwargs)
+
+
+pymongo.MongoClient = _MongoClient
+
+# Recent pymongo versions pass sort= to bulk updates, which mongomock does not
+# know about.
+for _name in ("add_update", "add_replace", "add_delete"):
+    _original = getattr(mongomock.collection.BulkOperationBuilder, _name)
+
+    def _without_sort(self, *args, _original=_original, **kwargs):
+        kwargs.pop("sort", None)
+        return _original(self, *args, **kwargs)
+
+    setattr(mongomock.collection.BulkOperationBuilder, _name, _without_sort)
+
+
+@pytest.fixture
+def db():
+    from app import db as database
+    from classes.GameBank import shards
+
+    for name in database.list_collection_names():
+        database.drop_collection(name)
+    shards._seeded.clear()
+    yield database
@@ -0,0 +1,48 @@
+from app.BackgroundThreads.payroll import run_payroll
+from classes.GameBank import shards
+
+
+def _add_player(db, username, balance=0):
+    user = db["users-collection"].insert_one({"username": username})
+    db["bank-collection"].insert_one(
+        {"customerId": str(user.inserted_id), "customer": username, "balance": balance, "Banklog": []}
+    )
+
+
+def _game_bank_total(db):
+    return shards.total_balance(db["game-bank"], refresh=True)
+
+
+def test_second_run_debits_the_new_staff_salary(db):
+    _add_player(db, "alice")
+    _add_player(db, "bob")
+    job_id = db["jobs-collection"].insert_one(
+        {"title": "Dev", "company": "Acme", "staff": ["alice"], "rate_per_hour": 20, "hours_per_mo": 160}
+    ).inserted_id
+
+    first = run_payroll(db, "2024-05", notify=False)
+    assert first["paid"] == 1
+    before = _game_bank_total(db)
+
+    db["jobs-collection"].update_one({"_id": job_id}, {"$push": {"staff": "bob"}})
+    second = run_payroll(db, "2024-05", notify=False)
+
+    assert second["paid"] == 1
+    assert second["total"] == 3200
+    assert _game_bank_total(db) == before - 3200
+    assert db["bank-collection"].find_one({"customer": "bob"})["balance"] == 3200
+    assert db["bank-collection"].find_one({"customer": "alice"})["balance"] == 3200
+
+
+def test_rerun_does_not_debit_twice(db):
+    _add_player(db, "alice")
+    db["jobs-collection"].insert_one(
+        {"title": "Dev", "company": "Acme", "staff": ["alice"], "rate_per_hour": 20, "hours_per_mo": 160}
+    )
+
+    run_payroll(db, "2024-05", notify=False)
+    after_first = _game_bank_total(db)
+    second = run_payroll(db, "2024-05", notify=False)
+
+    assert second["paid"] == 0
+    assert _game_bank_total(db) == after_first
@@ -0,0 +1,43 @@
+"""
+Task queue worker entry point (Procfile: ``worker: python worker.py``).
+
+Runs the durable background tasks that the web workers enqueue when
+TASK_QUEUE_ENABLED=true, so they survive web worker restarts and scale on
+their own. Scale throughput with TASK_WORKER_CONCURRENCY or more worker
+processes; SIGTERM lets the running tasks finish before exiting.
+"""
+import logging
+import os
+import signal
+import threading
+
+# Importing app starts the lotto and farm schedulers and the index build meant
+# for web workers; the worker leaves them to those unless WORKER_STARTUP_THREADS=true.
+if os.getenv("WORKER_STARTUP_THREADS", "false").lower() != "true":
+    for flag in ("LOTTO_SCHEDULER_ENABLED", "FARM_SCHEDULER_ENABLED", "AUTO_ENSURE_INDEXES"):
+        os.environ[flag] = "false"
+
+from app import db
+import app.BackgroundThreads.tasks  # registers the task handlers
+from app.BackgroundThreads.task_queue import TaskWorker
+
+logging.basicConfig(level=logging.INFO)
+
+
+def main():
+    worker = TaskWorker(db)
+    stopped = threading.Event()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    worker.start()
+    stopped.wait()
+    worker.stop()
+
+
+if __name__ == "__main__":
+    main()